@@ -3,234 +3,362 @@ import cv2
 import os
 import math
 import sys
+from collections import OrderedDict
 import mediapipe as mp
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_computer_vision', 'dev'))
+from frameAccess import FrameReader, open_reader
+from poseStore import find_pose_store, load_pose_columns, load_pose_index, build_pose_index
+
+# Set FRAME_FUNCTION_DEBUG=1 to write the intermediate images of each request to temp_images
+DEBUG_IMAGES = os.environ.get('FRAME_FUNCTION_DEBUG') == '1'
+
+# Number of frames, spread evenly over BACKGROUND_SPAN seconds from empty_time, whose per pixel
+# median is used as the empty court. The default 1 uses the single frame at empty_time. More frames
+# smooth out lighting flicker and drop anyone walking through the empty court for part of that time
+BACKGROUND_FRAMES = int(os.environ.get('FRAME_FUNCTION_BACKGROUND_FRAMES', '1'))
+BACKGROUND_SPAN = float(os.environ.get('FRAME_FUNCTION_BACKGROUND_SPAN', '2'))
+# How many matches keep their empty court in memory between requests
+BACKGROUND_CACHE_SIZE = 8
+# Set FRAME_FUNCTION_USE_POSE=0 to always locate players by background subtraction
+USE_POSE_DATA = os.environ.get('FRAME_FUNCTION_USE_POSE', '1') == '1'
+# Colour space the shirt colours are compared in, one of COLOUR_RANGES (bgr, hsv or lab)
+COLOUR_SPACE = os.environ.get('FRAME_FUNCTION_COLOUR_SPACE', 'bgr')
+# A pose record further than this from the annotation (seconds) is not used for it
+POSE_MAX_GAP = 0.5
+# How many matches keep their pose data in memory between requests, and how many track colours
+# each of them remembers
+POSE_CACHE_SIZE = 4
+TRACK_COLOUR_CACHE_SIZE = 1024
+# How many court layouts keep their ZoneClassifier between requests
+ZONE_CLASSIFIER_CACHE_SIZE = 16
+
+# Everything in a player mask that depends only on the match: the empty court image,
+# the court polygon mask and the court bounds converted to the video resolution
+class CourtBackground:
+    def __init__(self, frame, court, bounds):
+        self.frame = frame
+        self.court = court
+        self.bounds = bounds
+
+_backgrounds = OrderedDict()
+
+# The match's CourtBackground, built once and reused while the video file is unchanged.
+# In the analysis worker this carries over between annotation requests.
+def court_background(cap, fileName, courtBounds, empty_time, frames=BACKGROUND_FRAMES, span=BACKGROUND_SPAN):
+    video_path = f'./videos/{fileName}.mp4'
+    key = (fileName, os.path.getmtime(video_path), str(courtBounds), str(empty_time), frames, span)
+    if key in _backgrounds:
+        _backgrounds.move_to_end(key)
+        return _backgrounds[key]
+
+    bounds = boundsConverter(courtBounds, video_path, cap)
+    x = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+    y = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    frame = read_frame(cap, int(empty_time)*1000)
+    if frame is not None and frames > 1:
+        samples = [frame]
+        # Past the end of the video there are no frames, the samples found so far are used
+        for offset in np.linspace(0, span * 1000, frames)[1:]:
+            sample = read_frame(cap, int(empty_time)*1000 + int(offset))
+            if sample is None:
+                break
+            samples.append(sample)
+        frame = np.median(np.stack(samples), axis=0).astype(np.uint8)
+
+    court = np.zeros((int(y),int(x),1), dtype='uint8')
+    shape = np.array([bounds[0],bounds[1],bounds[3],bounds[2]])
+    cv2.fillPoly(court, pts=[shape],color=(255))
+
+    background = CourtBackground(frame, court, bounds)
+    _backgrounds[key] = background
+    if len(_backgrounds) > BACKGROUND_CACHE_SIZE:
+        _backgrounds.popitem(last=False)
+    return background
+
+# Decoded frame at timestamp (milliseconds) from an open capture or FrameReader, None if there is no frame there
+def read_frame(cap, timestamp):
+    if isinstance(cap, FrameReader):
+        return cap.get_frame(timestamp)
+    cap.set(cv2.CAP_PROP_POS_MSEC, timestamp)
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    return frame
+
 # This function saves a frame from a video with given timestamp
-# right now it uses a frame and not a timestamp
 def save_frame(video_path, timestamp, result_path):
-    # opens the video file
-    cap = cv2.VideoCapture(video_path)
+    # opens the video file, or reuses the reader already open for it
+    cap = open_reader(video_path)
     if not cap.isOpened():
         return
     
     # checks if the result path exists
     # creates directories if it doesn'e exist
     os.makedirs(os.path.dirname(result_path), exist_ok=True)
-    cap.set(cv2.CAP_PROP_POS_MSEC, timestamp)
-    ret, frame = cap.read()
+    frame = read_frame(cap, timestamp)
 
-    if ret:
+    if frame is not None:
         # if a valid timestamp is supplied the image will be saved
         cv2.imwrite(result_path, frame)
+
+# Debug dumps are named per match and timestamp so concurrent requests do not overwrite each other
+def save_debug_image(fileName, timestamp, name, image):
+    os.makedirs('./temp_images', exist_ok=True)
+    cv2.imwrite(f'./temp_images/{fileName}_{timestamp}_{name}.PNG', image)
         
 
-def player_mask(timestamp,fileName,bounds,empty_time):
-    # calls the function that saves frames as images
-    # saves the first frame in the video 
-    # and the frame at the supplied timestamp
+# subtracts the master image from the timestamped image, keeping only the court
+def court_difference(master_image, pos_image, court):
+    image_sub = cv2.subtract(master_image, pos_image)
+    return cv2.bitwise_and(image_sub, image_sub, mask=court)
 
-    millieseconds = int(timestamp)*1000
-    empty = int(empty_time)*1000
-    save_frame(f'./videos/{fileName}.mp4', empty,'./temp_images/master_image.PNG')
-    save_frame(f'./videos/{fileName}.mp4', millieseconds,'./temp_images/pos_image.PNG')
-    
-    cap = cv2.VideoCapture(f'./videos/{fileName}.mp4')
+# Returns the court masked difference between the empty court and the frame at timestamp,
+# along with that frame. Frames are decoded from cap and kept in memory, and a cached
+# CourtBackground skips decoding the empty court and drawing the court mask.
+def player_mask(timestamp,fileName,bounds,empty_time, cap=None, debug=DEBUG_IMAGES, background=None):
+    ownCapture = cap is None
+    if ownCapture:
+        cap = cv2.VideoCapture(f'./videos/{fileName}.mp4')
     if not cap.isOpened():
-        return
-    x = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-    y = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        return None, None
+
+    millieseconds = int(timestamp)*1000
+    if background is None:
+        empty = int(empty_time)*1000
+        master_image = read_frame(cap, empty)
+        x = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        y = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        court = np.zeros((int(y),int(x),1), dtype='uint8')
+        shape = np.array([bounds[0],bounds[1],bounds[3],bounds[2]])
+        cv2.fillPoly(court, pts=[shape],color=(255))
+    else:
+        master_image = background.frame
+        court = background.court
+    pos_image = read_frame(cap, millieseconds)
+    if ownCapture:
+        cap.release()
     #Carrara Court 2 Video.MP4
     
-    # loads the saved images into memory
-    master_image = cv2.imread('./temp_images/master_image.PNG')
-    pos_image = cv2.imread('./temp_images/pos_image.PNG')
-    # subtracts the master image from the timestamped image and saves the result as an image
-    image_sub = cv2.subtract(master_image, pos_image)
-    court = np.zeros((int(y),int(x),1), dtype='uint8')
-    shape = np.array([bounds[0],bounds[1],bounds[3],bounds[2]])
-    cv2.fillPoly(court, pts=[shape],color=(255))
-    court_mask = cv2.bitwise_and(image_sub, image_sub, mask=court)
-    cv2.imwrite('./temp_images/result_image.PNG', court_mask)
-    
+    court_mask = court_difference(master_image, pos_image, court)
+
+    if debug:
+        save_debug_image(fileName, timestamp, 'master_image', master_image)
+        save_debug_image(fileName, timestamp, 'pos_image', pos_image)
+        save_debug_image(fileName, timestamp, 'result_image', court_mask)
     
-    return court_mask
+    return court_mask, pos_image
     
     
-def pixel_coords(mask):
-    # Getting length and width of mask image
+# Columns closer than this to either edge of the frame are never searched
+EDGE_MARGIN = 200
+# A pixel of the subtracted image counts as movement when any channel is above this
+MOVEMENT_THRESHOLD = 50
+
+# Boolean (h, w) map of the pixels the location search looks at: movement pixels in the
+# columns between the edge margins, row 0 excluded as it always has been
+def movement_pixels(mask):
     h, w, _ = mask.shape
+    # Brightest channel per pixel, cv2 does this several times faster than numpy
+    b, g, r = cv2.split(mask)
+    hits = cv2.max(cv2.max(b, g), r) > MOVEMENT_THRESHOLD
+    left = EDGE_MARGIN + 1
+    right = max(w - EDGE_MARGIN + 1, left)
+    hits[0] = False
+    hits[:, :left] = False
+    hits[:, right:] = False
+    return hits
 
-    
-    # Find the lowest point and give it the colour of red
-    break_out_flag = False     
-    for x in range(h-1,0,-1):
-        for y in range(w-200,200,-1):
-            rgb = mask[x,y]
-            if rgb[0] > 50 or rgb[1] > 50 or rgb[2] > 50:
-                xcoord = y
-                ycoord = x
-                break_out_flag = True
-                break
-        if break_out_flag:
-            break
-    return (xcoord, ycoord)   
+# The lowest row with a hit and the rightmost hit in that row, as (x, y), or None
+def lowest_point(hits):
+    rows = np.flatnonzero(hits.any(axis=1))
+    if len(rows) == 0:
+        return None
+    row = rows[-1]
+    return (int(np.flatnonzero(hits[row])[-1]), int(row))
+
+def pixel_coords(mask):
+    # Find the lowest point of movement on the court
+    point = lowest_point(movement_pixels(mask))
+    if point is None:
+        raise ValueError("No movement found in the player mask")
+    return point
 
 def findSecondPlayerLocations(mask, a, b):
     # Create variables for the first player width
     f_width = a
     f_height = b
-    # Get our Original Mask
     
     # Getting length and width of mask image
     h, w, _ = mask.shape
 
-    # Create copy of Blue Mask called Second Player Position Mask for the lowest location after the first player's
+    # The lowest point outside of a window around the first player's column
     f_range = round(h*0.25)
-    # Find the lowest point and give it the colour of red
-    break_out_flag = False     
-    for x in range(h-1,0,-1):
-        for y in range(w-200,200,-1):
-            rgb = mask[x,y]
-            if rgb[0] > 50 or rgb[1] > 50 or rgb[2] > 50:
-                mask[x,y] = [0,0,255]
-                if not((f_width - f_range) < y < (f_width + f_range)):
-                    break_out_flag = True
-                    s_width = y
-                    s_height = x
-                    break
-        if break_out_flag:
-            break
-        
-    if (break_out_flag == False):
-        s_width=f_width
-        s_height=f_height
-    return (s_width,s_height)
+    hits = movement_pixels(mask)
+    columns = np.arange(w)
+    hits[:, (f_width - f_range < columns) & (columns < f_width + f_range)] = False
+    point = lowest_point(hits)
+
+    if point is None:
+        return (f_width, f_height)
+    return point
     
 
 
 
-def countColourMatches(location1, location2, colors, player_num):
-    try:
-        master_image = cv2.imread('./temp_images/pos_image.PNG')
-    except:
-        print("Unable to obtain original image.")  
-    
+# Half width of the column window around each candidate that is checked for the player's colour
+COLOUR_WINDOW = 50
+
+def player_colour(colors, player_num):
     splitColors = str(colors).split(',')
-    
-    
-    # Obtain Player 1 colours
-    if (int(player_num) == 1):
-        p1_r = int(splitColors[0])
-        p1_g = int(splitColors[1])
-        p1_b = int(splitColors[2])
-    else:
-        p1_r = int(splitColors[3])
-        p1_g = int(splitColors[4])
-        p1_b = int(splitColors[5])
+    # Obtain the player's colour, stored as r,g,b for player 1 then player 2
+    offset = 0 if int(player_num) == 1 else 3
+    r, g, b = (int(value) for value in splitColors[offset:offset + 3])
+    return np.array([b, g, r], dtype=np.uint8)
 
-    # Getting length and width of master image
-    h, w, _ = master_image.shape    
+# How close a pixel has to be to the player's colour in each colour space, in that space's own units.
+#   bgr  per channel difference, the original box of +-25 on each of B, G and R
+#   hsv  distance over OpenCV's H (0-179, wrapping around), S and V (0-255)
+#   lab  distance over OpenCV's 8 bit Lab, L is L* x 2.55 and a, b are a*, b* + 128
+COLOUR_RANGES = {
+    'bgr': 25,
+    'hsv': 30,
+    'lab': 20
+}
 
-    if(location1-50 > 0):
-        far_left1 = location1-50
-    else:
-        far_left1 = 0
+# Boolean map of the pixels close to colour (BGR).
+# 'bgr' is the original box of +-colour_range on every channel, 'hsv' and 'lab' use the
+# distance in that colour space (hue wraps around) so lighting changes matter less.
+# colour_range defaults to the colour space's entry in COLOUR_RANGES
+def colour_match_mask(image, colour, colour_space='bgr', colour_range=None):
+    if colour_range is None:
+        colour_range = COLOUR_RANGES[colour_space]
+    if colour_space == 'bgr':
+        diff = np.abs(image.astype(np.int16) - colour.astype(np.int16))
+        return np.all(diff < colour_range, axis=2)
 
-    if(location1+50 < w):
-        far_right1 = location1+50
-    else:
-        far_right1 = 0
-    
-    # Initialise count variable for seeing how many pixels match
-    match1 = 0
-
-    # Create range to check all pixels
-    colour_range = 25
-
-    # Count the matches
-    for x in range(0,h-1):
-        for y in range(far_left1,far_right1):
-            pixel = master_image[x,y]
-            if((p1_b-colour_range)<pixel[0]<(p1_b+colour_range)):
-                if((p1_g-colour_range)<pixel[1]<(p1_g+colour_range)):
-                    if((p1_r-colour_range)<pixel[2]<(p1_r+colour_range)):
-                        match1 = match1+1
-
-    if(location2-50 > 0):
-        far_left2 = location2-50
-    else:
-        far_left2 = 0
+    conversion = {'hsv': cv2.COLOR_BGR2HSV, 'lab': cv2.COLOR_BGR2LAB}[colour_space]
+    converted = cv2.cvtColor(np.ascontiguousarray(image), conversion).astype(np.float32)
+    target = cv2.cvtColor(colour.reshape(1, 1, 3), conversion).astype(np.float32)[0, 0]
+    diff = np.abs(converted - target)
+    if colour_space == 'hsv':
+        # OpenCV hue runs 0-179
+        diff[..., 0] = np.minimum(diff[..., 0], 180 - diff[..., 0])
+    return np.sum(diff * diff, axis=2) < colour_range * colour_range
 
-    if(location2+50 < w):
-        far_right2 = location2+50
-    else:
-        far_right2 = 0
-    
-    # Initialise count variable for seeing how many pixels match
-    match2 = 0
-
-    # Count the matches
-    for x in range(0,h-1):
-        for y in range(far_left2,far_right2):
-            pixel = master_image[x,y]
-            if((p1_b-colour_range)<pixel[0]<(p1_b+colour_range)):
-                if((p1_g-colour_range)<pixel[1]<(p1_g+colour_range)):
-                    if((p1_r-colour_range)<pixel[2]<(p1_r+colour_range)):
-                        match2 = match2+1
-    
-    return [match1,match2]   
+# frame is the decoded frame the candidates were found in
+def countColourMatches(location1, location2, colors, player_num, frame, colour_space='bgr', colour_range=None):
+    colour = player_colour(colors, player_num)
+
+    # Getting length and width of the frame
+    h, w, _ = frame.shape
+
+    # Column window of each candidate, clipped to the frame. A window at the right edge used to
+    # be emptied (far_right = 0) which always scored it 0
+    windows = [(max(location - COLOUR_WINDOW, 0), min(location + COLOUR_WINDOW, w)) for location in (location1, location2)]
+    widths = [max(right - left, 0) for left, right in windows]
 
+    # Both windows side by side so they are scored in one pass, the bottom row has never been counted
+    strips = np.concatenate([frame[:h-1, left:left + width] for (left, _), width in zip(windows, widths)], axis=1)
+    matches = colour_match_mask(strips, colour, colour_space, colour_range).sum(axis=0)
+    return [int(matches[:widths[0]].sum()), int(matches[widths[0]:].sum())]
 
 
+
+# Court zones for the court bounds picked by the coach, worked out once per court layout.
+#   1 | 2   front court, left and right of the half court line
+#   1 5 2   above the short line, 5 is the T
+#   3 5 4   below the short line
+#   3 | 4   back court
+#  -1       past the right side wall
+class ZoneClassifier:
+    def __init__(self, bounds):
+        # these points will be what the couch selects
+        shape = np.array([bounds[0],bounds[1],bounds[3],bounds[2],bounds[4],bounds[5]], dtype=float)
+        self.top = shape[0][1]
+        self.right = shape[2][0]
+        self.short_line_y = shape[4][1]
+        # top of the T-zone
+        self.sec_1_lower = self.short_line_y - (((shape[3][1]+shape[0][1])*0.5)-self.short_line_y)
+        self.half_line = (shape[2][0]+shape[3][0])/2
+        self.l_t_zone = (shape[5][0]- shape[4][0]) * 0.375 + shape[4][0]
+        self.r_t_zone = (shape[5][0]- shape[4][0]) * 0.625 + shape[4][0]
+        # bottom of the T-zone
+        self.sec_2_lower = self.sec_1_lower + abs(self.l_t_zone - self.r_t_zone)
+        self.zoneMap = None
+
+    # Zone of every (x, y) in points as an int array, NaN points are -1
+    def classify(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        # Checked in this order, the first band a point is in decides its zone
+        bands = [
+            (y >= self.top) & (y <= self.sec_1_lower),
+            (y >= self.sec_1_lower) & (y <= self.short_line_y),
+            (y >= self.short_line_y) & (y <= self.sec_2_lower)
+        ]
+        zones = [
+            np.where(x < self.half_line, 1, 2),
+            np.where(x < self.l_t_zone, 1, np.where(x < self.r_t_zone, 5, 2)),
+            np.where(x < self.l_t_zone, 3, np.where(x < self.r_t_zone, 5, 4))
+        ]
+        backCourt = np.where(x < self.half_line, 3, np.where(x < self.right, 4, -1))
+        return np.select(bands, zones, default=backCourt).astype(int)
+
+    # (height, width) image holding the zone of every pixel, built on first use
+    def rasterise(self, width, height):
+        if self.zoneMap is None or self.zoneMap.shape != (height, width):
+            ys, xs = np.mgrid[0:height, 0:width]
+            points = np.stack([xs.ravel(), ys.ravel()], axis=1)
+            self.zoneMap = self.classify(points).reshape(height, width).astype(np.int8)
+        return self.zoneMap
+
+    # Zones of integer pixel positions with one index into the raster, -1 outside the frame
+    def lookup(self, points, width, height):
+        zoneMap = self.rasterise(width, height)
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        known = ~np.isnan(points).any(axis=1)
+        x = np.zeros(len(points), dtype=int)
+        y = np.zeros(len(points), dtype=int)
+        x[known] = points[known, 0]
+        y[known] = points[known, 1]
+        inside = known & (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        zones = np.full(len(points), -1, dtype=int)
+        zones[inside] = zoneMap[y[inside], x[inside]]
+        return zones
+
+_zoneClassifiers = OrderedDict()
+
+# The ZoneClassifier of a court layout, the least recently used are dropped past ZONE_CLASSIFIER_CACHE_SIZE
+def zone_classifier(bounds):
+    bounds = np.asarray(bounds)
+    key = (bounds.shape, bounds.tobytes())
+    if key in _zoneClassifiers:
+        _zoneClassifiers.move_to_end(key)
+        return _zoneClassifiers[key]
+
+    _zoneClassifiers[key] = ZoneClassifier(bounds)
+    if len(_zoneClassifiers) > ZONE_CLASSIFIER_CACHE_SIZE:
+        _zoneClassifiers.popitem(last=False)
+    return _zoneClassifiers[key]
+
 def location(p_coords,bounds):
-    # these points will be what the couch selects
-    shape = np.array([bounds[0],bounds[1],bounds[3],bounds[2],bounds[4],bounds[5]])
-    short_line_y = shape[4][1]
-    # top of the T-zone
-    sec_1_lower = short_line_y - (((shape[3][1]+shape[0][1])*0.5)-short_line_y)
-    half_line = (shape[2][0]+shape[3][0])/2
-    
-    l_t_zone = (shape[5][0]- shape[4][0]) * 0.375 + shape[4][0]
-    
-    r_t_zone = (shape[5][0]- shape[4][0]) * 0.625 + shape[4][0]
-    # bottom of the T-zone
-    sec_2_lower = sec_1_lower + abs(l_t_zone - r_t_zone)
-    
-    if p_coords[1] >= shape[0][1] and p_coords[1] <= sec_1_lower:
-        if p_coords[0] < half_line:
-            return 1
-        return 2
-    
-    if p_coords[1] >= sec_1_lower and p_coords[1] <= short_line_y:
-        if p_coords[0] < l_t_zone:
-            return 1
-        if p_coords[0] < r_t_zone:
-            return 5
-        return 2
-    
-    if p_coords[1] >= short_line_y and p_coords[1] <= sec_2_lower:
-        if p_coords[0] < l_t_zone:
-            return 3
-        if p_coords[0] < r_t_zone:
-            return 5
-        return 4
-    
-    if p_coords[0] < half_line:
-        return 3
-    if p_coords[0] < shape[2][0]:
-        return 4
-    return -1
+    return int(zone_classifier(bounds).classify(p_coords)[0])
 
 
-def boundsConverter(bounds,video_path):
+def boundsConverter(bounds,video_path, cap=None):
     # JavaScript parses nested number arrays as a string seperating the values with commas
     fixed_bounds = str(bounds).split(',')
 
-    cap = cv2.VideoCapture(video_path)
+    ownCapture = cap is None
+    if ownCapture:
+        cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return
     x = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
     y = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    if ownCapture:
+        cap.release()
     
     # ratio to convert the court bounds to fit the resolution of the video
     ratio_x = x/1280
@@ -246,9 +374,130 @@ def boundsConverter(bounds,video_path):
     return new_bounds
 
 
-def playerLocations(timeStamp,fileName,courtBounds,color,player_num, empty_court): 
+# Pose data for a match, from poseEstimation.py
+class MatchPose:
+    def __init__(self, columns, index=None):
+        self.columns = columns
+        self.index = index if index is not None else build_pose_index(columns)
+        ankles = [columns.keypointIndex('LEFT_ANKLE'), columns.keypointIndex('RIGHT_ANKLE')]
+        valid = np.asarray(columns.valid)[:, ankles]
+        points = np.asarray(columns.keypoints)[:, ankles].astype(float)
+        # Midpoint of the detected ankles, NaN when neither was detected
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.ankles = np.sum(points * valid[..., None], axis=1) / valid.sum(axis=1)[:, None]
+        self.times = np.asarray(columns.times)
+        self.track_ids = np.asarray(columns.track_ids)
+        # (track_id, colours) -> how well the track matches each player's colour, measured once per
+        # track, the least recently used are dropped past TRACK_COLOUR_CACHE_SIZE
+        self.trackColours = OrderedDict()
+
+    # Rows of the (at most) two tracks with an ankle position closest in time to seconds
+    def nearestTracks(self, seconds, maxGap=POSE_MAX_GAP):
+        rows = self.index.window(seconds - maxGap, seconds + maxGap)
+        rows = rows[~np.isnan(self.ankles[rows, 0])]
+        rows = rows[np.argsort(np.abs(self.times[rows] - seconds), kind='stable')]
+        nearest = {}
+        for row in rows:
+            nearest.setdefault(int(self.track_ids[row]), int(row))
+            if len(nearest) == 2:
+                break
+        return list(nearest.values())
+
+_matchPoses = OrderedDict()
+
+# Size and modification time, changes when the file is written again
+def file_signature(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+# The match's MatchPose while its pose data and video are unchanged, None when poseEstimation has
+# not run for it. The track colours it keeps are measured on the video, so a new upload under the
+# same name starts a new MatchPose.
+def match_pose(fileName):
+    dataPath = f'./poseEstimationData/{fileName}.msgpack'
+    sourcePath = find_pose_store(dataPath) or (dataPath if os.path.exists(dataPath) else None)
+    if sourcePath is None:
+        return None
+    key = (fileName, file_signature(sourcePath), file_signature(f'./videos/{fileName}.mp4'))
+    if key in _matchPoses:
+        _matchPoses.move_to_end(key)
+        return _matchPoses[key]
+
+    for oldKey in [oldKey for oldKey in _matchPoses if oldKey[0] == fileName]:
+        del _matchPoses[oldKey]
+    columns = load_pose_columns(dataPath)
+    _matchPoses[key] = MatchPose(columns, load_pose_index(dataPath, columns))
+    if len(_matchPoses) > POSE_CACHE_SIZE:
+        _matchPoses.popitem(last=False)
+    return _matchPoses[key]
+
+# Colour match counts of the column window around the track's ankles, for player 1 and player 2.
+# Worked out on the first frame the track is used in and reused for the rest of the track.
+def track_colours(pose, row, cap, color, colour_space=COLOUR_SPACE):
+    track_id = int(pose.track_ids[row])
+    key = (track_id, str(color), colour_space)
+    if key in pose.trackColours:
+        pose.trackColours.move_to_end(key)
+        return pose.trackColours[key]
+
+    frame = read_frame(cap, pose.times[row]*1000)
+    if frame is None:
+        return None
+    x = int(pose.ankles[row, 0])
+    pose.trackColours[key] = [countColourMatches(x, x, color, player, frame=frame, colour_space=colour_space)[0]
+                                for player in (1, 2)]
+    if len(pose.trackColours) > TRACK_COLOUR_CACHE_SIZE:
+        pose.trackColours.popitem(last=False)
+    return pose.trackColours[key]
+
+# "<player zone> <opponent zone>" from the pose data, None when there are not two players near the time
+def pose_player_locations(pose, timeStamp, current_bounds, color, player_num, cap, colour_space=COLOUR_SPACE):
+    rows = pose.nearestTracks(int(timeStamp))
+    if len(rows) < 2:
+        return None
+    colours = [track_colours(pose, row, cap, color, colour_space) for row in rows]
+    if colours[0] is None or colours[1] is None:
+        return None
+    # The track that looks more like player_num than the other player is the annotated player
+    player = int(player_num) - 1
+    scores = [colour[player] - colour[1 - player] for colour in colours]
+    if scores[1] > scores[0]:
+        rows.reverse()
+    zones = zone_classifier(current_bounds).classify(pose.ankles[rows])
+    return f"{zones[0]} {zones[1]}"
+
+# Zone of every pose record in the match in one call, None when the match has no pose data
+def zoneTimeline(fileName, courtBounds):
+    pose = match_pose(fileName)
+    if pose is None:
+        return None
     current_bounds = boundsConverter(courtBounds, f'./videos/{fileName}.mp4')
-    playerMask = player_mask(timeStamp, fileName, current_bounds, empty_court)
+    zones = zone_classifier(current_bounds).classify(pose.ankles)
+    return {'times': pose.times.tolist(), 'track_ids': pose.track_ids.tolist(), 'zones': zones.tolist()}
+
+def playerLocations(timeStamp,fileName,courtBounds,color,player_num, empty_court, debug=DEBUG_IMAGES, colour_space=COLOUR_SPACE): 
+    # One reader for the match, kept open between requests, every frame stays in memory
+    video_path = f'./videos/{fileName}.mp4'
+    cap = open_reader(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video {video_path}")
+
+    # Pose data is an index lookup, the frame is only decoded the first time a track is seen
+    pose = match_pose(fileName) if USE_POSE_DATA else None
+    if pose is not None:
+        located = pose_player_locations(pose, timeStamp, boundsConverter(courtBounds, video_path, cap), color, player_num, cap, colour_space)
+        if located is not None:
+            return located
+
+    background = court_background(cap, fileName, courtBounds, empty_court)
+    current_bounds = background.bounds
+    playerMask, pos_image = player_mask(timeStamp, fileName, current_bounds, empty_court, cap, debug, background)
+    return locate_players(playerMask, pos_image, current_bounds, color, player_num, colour_space)
+
+# "<player zone> <opponent zone>" from the court mask and frame at one timestamp
+def locate_players(playerMask, pos_image, current_bounds, color, player_num, colour_space=COLOUR_SPACE):
     pixelLocation = pixel_coords(playerMask)
     second_player = findSecondPlayerLocations(playerMask, pixelLocation[0], pixelLocation[1])
     if (pixelLocation[0]==second_player[0] and pixelLocation[1]==second_player[1]): 
@@ -256,7 +505,7 @@ def playerLocations(timeStamp,fileName,courtBounds,color,player_num, empty_court
         player2 = location(second_player,current_bounds)
         return f"{player1} {player2}"
     else:
-        order = countColourMatches(pixelLocation[0], second_player[0], color,player_num)
+        order = countColourMatches(pixelLocation[0], second_player[0], color,player_num, frame=pos_image, colour_space=colour_space)
         if (order[0]>order[1]):
             player1 = location(pixelLocation,current_bounds)
             player2 = location(second_player,current_bounds)
@@ -266,8 +515,53 @@ def playerLocations(timeStamp,fileName,courtBounds,color,player_num, empty_court
             player2 = location(second_player,current_bounds)
             return f"{player2} {player1}"
 
+# playerLocations for many timestamps (comma separated seconds, any order) in one pass over the video.
+# Frames are decoded in time order, so the reader runs forward through each GOP and only seeks
+# when the next timestamp is past the next keyframe. player_num is one number for every timestamp
+# or one per timestamp. Returns the locations in the order the timestamps were given, None where
+# there was no frame or no player could be found.
+def batchPlayerLocations(timeStamps,fileName,courtBounds,color,player_num, empty_court, debug=DEBUG_IMAGES, colour_space=COLOUR_SPACE):
+    timeStamps = [value for value in str(timeStamps).split(',') if value != '']
+    player_nums = str(player_num).split(',')
+    if len(player_nums) == 1:
+        player_nums = player_nums * len(timeStamps)
+
+    video_path = f'./videos/{fileName}.mp4'
+    cap = open_reader(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video {video_path}")
+    results = [None] * len(timeStamps)
+    order = sorted(range(len(timeStamps)), key=lambda i: int(timeStamps[i]))
+
+    pose = match_pose(fileName) if USE_POSE_DATA else None
+    if pose is not None:
+        current_bounds = boundsConverter(courtBounds, video_path, cap)
+        for i in order:
+            results[i] = pose_player_locations(pose, timeStamps[i], current_bounds, color, player_nums[i], cap, colour_space)
+        # Only the timestamps without pose data go through background subtraction
+        order = [i for i in order if results[i] is None]
+        if not order:
+            return results
+
+    background = court_background(cap, fileName, courtBounds, empty_court)
+    # Each frame is used as soon as it is decoded instead of holding the whole batch in memory
+    for i in order:
+        pos_image = read_frame(cap, int(timeStamps[i])*1000)
+        if pos_image is None:
+            continue
+        playerMask = court_difference(background.frame, pos_image, background.court)
+        if debug:
+            save_debug_image(fileName, timeStamps[i], 'result_image', playerMask)
+        try:
+            results[i] = locate_players(playerMask, pos_image, background.bounds, color, player_nums[i], colour_space)
+        except ValueError:
+            # Nobody moving on court at this timestamp, the rest of the batch still gets located
+            pass
+    return results
+
 
-print(playerLocations(sys.argv[1], sys.argv[2], sys.argv[3], 
-                      sys.argv[4], sys.argv[5], sys.argv[6]))
+if __name__ == "__main__":
+    print(playerLocations(sys.argv[1], sys.argv[2], sys.argv[3], 
+                          sys.argv[4], sys.argv[5], sys.argv[6]))
 
-sys.stdout.flush()
+    sys.stdout.flush()
@@ -1,6 +1,6 @@
 const util = require('../lib/util');
 
-const { spawnSync } = require('child_process');
+const pythonWorker = require('../lib/pythonWorker');
 
 const { Match } = require('../models/Match');
 const { Annotation } = require('../models/Annotation');
@@ -11,12 +11,14 @@ const axios = require('axios').default;
 const create = async (req, res, next) => {
   const new_body = req.body;
   const [rst, error] = await util.handle(Match.findById(req.params.match_id));
-  const python_test = spawnSync('python', ['./controllers/Frame_function.py', req.body.timestamp, req.params.match_id, rst.courtBounds, rst.playerRGB, req.body.playerNumber, rst.duration]);
-  const positions = python_test.stdout.toString().split(" ");
-  console.log(python_test.stdout.toString());
+  // Arrays are passed as comma separated strings, the same way they reached the script on argv
+  const [python_test, pythonErr] = await util.handle(pythonWorker.run('playerLocations', [req.body.timestamp, req.params.match_id, String(rst.courtBounds), String(rst.playerRGB), req.body.playerNumber, rst.duration]));
+  if (pythonErr) console.log(pythonErr.message);
+  const positions = String(python_test ? python_test.result : '').split(" ");
+  console.log(python_test && python_test.result);
   new_body['playerPos'] = parseInt(positions[0]);
   new_body['opponentPos'] = parseInt(positions[1]);
-  console.log(python_test.stderr.toString());
+  console.log(python_test && python_test.stderr);
 
 
   const _new = new Annotation(new_body);
@@ -32,6 +34,72 @@ const create = async (req, res, next) => {
   return res.status(200).json({ annotation_id: _new._id });
 };
 
+// Player and opponent zones for many annotations with one pass over the match video.
+// Resolves with null when the run failed, and with null for an annotation whose players were not found.
+const locatePlayers = async (match, annotations) => {
+  const [located, err] = await util.handle(pythonWorker.run('batchPlayerLocations', [
+    annotations.map((annotation) => annotation.timestamp).join(','),
+    String(match._id),
+    String(match.courtBounds),
+    String(match.playerRGB),
+    annotations.map((annotation) => annotation.playerNumber).join(','),
+    match.duration
+  ]));
+  if (err || located.code !== 0 || !Array.isArray(located.result) || located.result.length !== annotations.length) {
+    console.log(err ? err.message : located.stderr);
+    return null;
+  }
+  return located.result.map((positions) => {
+    if (positions === null) return null;
+    const [playerPos, opponentPos] = String(positions).split(' ').map((position) => parseInt(position));
+    return isNaN(playerPos) || isNaN(opponentPos) ? null : [playerPos, opponentPos];
+  });
+};
+
+// create many annotations at once
+const createBatch = async (req, res, next) => {
+  const [match, error] = await util.handle(Match.findById(req.params.match_id));
+  if (error || !match) return res.status(400).json('Failed to get match.');
+
+  const positions = await locatePlayers(match, req.body.annotations);
+  if (!positions) return res.status(500).json('Failed to locate players.');
+  // Annotations whose players were not found are saved without positions
+  const created = req.body.annotations.map((annotation, i) => new Annotation({
+    ...annotation,
+    ...(positions[i] && { playerPos: positions[i][0], opponentPos: positions[i][1] })
+  }));
+
+  const [result, err] = await util.handle(Match.updateOne(
+    { _id: req.params.match_id },
+    { $push: { annotations: { $each: created } } })
+  );
+
+  if (err || result.nModified === 0) return res.status(400).json('Failed to create annotations.');
+
+  return res.status(200).json({ annotation_ids: created.map((annotation) => annotation._id) });
+};
+
+// recalculate player positions for every annotation of a match
+const relocateAll = async (req, res, next) => {
+  const [match, error] = await util.handle(Match.findById(req.params.match_id));
+  if (error || !match) return res.status(400).json('Failed to get match.');
+  if (match.annotations.length === 0) return res.status(200).json('No annotations to update.');
+
+  // A failed run leaves every stored position as it was
+  const positions = await locatePlayers(match, match.annotations);
+  if (!positions) return res.status(500).json('Failed to locate players.');
+  match.annotations.forEach((annotation, i) => {
+    if (!positions[i]) return;
+    annotation.playerPos = positions[i][0];
+    annotation.opponentPos = positions[i][1];
+  });
+
+  const [result, err] = await util.handle(match.save());
+  if (err || !result) return res.status(400).json('Failed to update annotations.');
+
+  return res.status(200).json('Successfully updated annotations.');
+};
+
 // get annotation
 const get = async (req, res, next) => {
   const [result, err] = await util.handle(Match.findById(
@@ -113,6 +181,8 @@ const clearAll = async (req, res, next) => {
 
 module.exports = {
   create,
+  createBatch,
+  relocateAll,
   get,
   getAll,
   edit,
@@ -2,47 +2,28 @@ const path = require('path');
 const fs = require("fs");
 const util = require('../lib/util');
 const videoFileFormats = ['mp4', 'mov', 'avi'];
-const { spawn } = require('child_process');
+const pythonWorker = require('../lib/pythonWorker');
 const {Match} = require('../models/Match')
 
 
 
+// Runs a python_computer_vision/dev script on a warm analysis worker instead of spawning python
 const runPythonScript = (res, scriptName, args = [], inn = null) => {
-  const pythonScriptPath = path.join(__dirname, `../python_computer_vision/dev/${scriptName}`);
-  
-  // Spawn the Python process
-  const pythonProcess = spawn('python', [pythonScriptPath, ...args]);
-  
-  if (inn) {
-    pythonProcess.stdin.write(inn, 'utf-8', (err) => {
-      if (err) {
-    
-        res.status(500).json({ message: 'Error writing to Python process', error: err.message });
-      }      
-      pythonProcess.stdin.end();
-    });
-  }
-  let stdoutData = '';
-  let stderrData = '';
-  pythonProcess.stdout.on('data', (data) => {
-      const output = data.toString();
-      stdoutData += output;
-      console.log('Python STDOUT:', output);
-      //res.write(`data: ${output}\n\n`);
-  });
-  pythonProcess.on('close', (code) => {
+  return pythonWorker.run(scriptName, args, inn)
+    .then(({ code, stdout, stderr }) => {
+      if (stdout) console.log('Python STDOUT:', stdout);
       if (code === 0) {
           console.log(`Script ${scriptName} executed successfully.`);
           return res.status(200).json({ message: 'Finished' });
       } else {
 
-          return res.status(500).json({ message: 'Process failed', code: code, error: stderrData });
+          return res.status(500).json({ message: 'Process failed', code: code, error: stderr });
       }
-  });  
-  pythonProcess.on('error', (err) => {
+    })
+    .catch((err) => {
 
       return res.status(500).json({ message: 'Failed to start process', error: err.message });
-  });
+    });
 };
 
 const findVideoFileMatchID = async (match_id) => {
@@ -0,0 +1,142 @@
+const path = require('path');
+const readline = require('readline');
+const { spawn } = require('child_process');
+
+// Pools of long lived python analysis workers (python_computer_vision/dev/analysisWorker.py).
+// Each worker keeps ultralytics, cv2, matplotlib and sklearn imported between requests, so a
+// request no longer pays for a fresh interpreter. Jobs and replies are one JSON object per line.
+//
+// Jobs are split over separate pools so an hour of pose estimation never holds up the quick
+// calls the annotation screen waits on:
+//   pose         poseEstimation, one video at a time by default
+//   analysis     velocity, jointangles and 2dMaps over stored pose data
+//   interactive  player locations, court zones and shirt colours
+// A job that runs past its pool's timeout is rejected and its worker is killed, the next job
+// starts a fresh worker in its place.
+const workerScriptPath = path.join(__dirname, '../python_computer_vision/dev/analysisWorker.py');
+
+const MINUTE = 60 * 1000;
+const pools = {
+  pose: {
+    size: parseInt(process.env.PYTHON_POSE_WORKERS, 10) || 1,
+    timeout: parseInt(process.env.PYTHON_POSE_TIMEOUT, 10) || 180 * MINUTE
+  },
+  analysis: {
+    size: parseInt(process.env.PYTHON_ANALYSIS_WORKERS, 10) || 1,
+    timeout: parseInt(process.env.PYTHON_ANALYSIS_TIMEOUT, 10) || 15 * MINUTE
+  },
+  interactive: {
+    size: parseInt(process.env.PYTHON_WORKERS, 10) || 2,
+    timeout: parseInt(process.env.PYTHON_TIMEOUT, 10) || 5 * MINUTE
+  }
+};
+for (const pool of Object.values(pools)) {
+  pool.workers = [];
+  pool.waiting = [];
+}
+
+// op -> pool, anything not listed is interactive
+const poolForOp = {
+  poseEstimation: 'pose',
+  velocity: 'analysis',
+  jointangles: 'analysis',
+  '2dMaps': 'analysis'
+};
+
+let nextJobId = 1;
+
+const startWorker = (pool) => {
+  const worker = {
+    process: spawn('python', [workerScriptPath], { cwd: path.join(__dirname, '..') }),
+    job: null,
+    timer: null
+  };
+
+  worker.process.stderr.on('data', (data) => {
+    console.log('Python STDERR:', data.toString());
+  });
+
+  readline.createInterface({ input: worker.process.stdout }).on('line', (line) => {
+    let reply;
+    try {
+      reply = JSON.parse(line);
+    } catch (err) {
+      console.log('Invalid reply from python worker:', line);
+      return;
+    }
+    const job = worker.job;
+    worker.job = null;
+    clearTimeout(worker.timer);
+    if (job && job.id === reply.id) job.resolve(reply);
+    dispatch(pool);
+  });
+
+  // 'error', 'exit' and a timeout can all fire for the same process
+  const fail = (err) => {
+    const index = pool.workers.indexOf(worker);
+    if (index === -1) return;
+    pool.workers.splice(index, 1);
+    clearTimeout(worker.timer);
+    if (worker.job) worker.job.reject(err);
+    worker.job = null;
+    dispatch(pool);
+  };
+  worker.process.on('error', fail);
+  worker.process.on('exit', (code) => fail(new Error(`Python worker exited with code ${code}`)));
+  worker.fail = fail;
+
+  pool.workers.push(worker);
+  return worker;
+};
+
+const dispatch = (pool) => {
+  while (pool.waiting.length > 0) {
+    let worker = pool.workers.find((w) => w.job === null);
+    if (!worker && pool.workers.length < pool.size) worker = startWorker(pool);
+    if (!worker) return;
+
+    const job = pool.waiting.shift();
+    worker.job = job;
+    worker.timer = setTimeout(() => {
+      worker.fail(new Error(`Python job ${job.op} timed out after ${job.timeout / 1000}s`));
+      worker.process.kill('SIGKILL');
+    }, job.timeout);
+    worker.process.stdin.write(JSON.stringify({
+      id: job.id,
+      op: job.op,
+      args: job.args,
+      input: job.input
+    }) + '\n');
+  }
+};
+
+// Resolves with { code, stdout, stderr, result } once the worker has finished the job.
+// op is one of the worker OPERATIONS, a script name such as 'velocity.py' also works.
+// timeout (ms) overrides the pool's timeout for this job.
+const run = (op, args = [], input = null, timeout = null) => {
+  const pool = pools[poolForOp[path.parse(op).name] || 'interactive'];
+  return new Promise((resolve, reject) => {
+    pool.waiting.push({ id: nextJobId++, op, args, input, timeout: timeout || pool.timeout, resolve, reject });
+    dispatch(pool);
+  });
+};
+
+// Lets idle workers finish on end of input and kills the ones still busy
+const shutdown = () => {
+  for (const pool of Object.values(pools)) {
+    for (const job of pool.waiting.splice(0)) {
+      job.reject(new Error('Python workers are shutting down'));
+    }
+    for (const worker of pool.workers.slice()) {
+      const busy = worker.job !== null;
+      worker.fail(new Error('Python workers are shutting down'));
+      worker.process.stdin.end();
+      if (busy) worker.process.kill();
+    }
+  }
+};
+
+module.exports = {
+  run,
+  shutdown
+};
@@ -5,8 +5,8 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import mapsController as maps
 import json
-import msgpack
 from poseEstimation import getMatchIDFromVideo
+from poseStore import load_pose_columns, load_pose_window
 import os
 
 width,height = 640, 975  # 6.4m x 9.75m
@@ -56,20 +56,11 @@ def visualizeHeatmap(heatmap,match_id):
 # Image
 def display2dMap(movements, H,match_id):
     fig,ax = plotLines()    
-    players = {}  
-    for movement in movements:
-        track_id = movement['track_id']
-        midpoint = np.array([movement['mid_point']], dtype=float) 
-        
-        transformed_midpoint = maps.apply_homography(H, midpoint).flatten()  # Flatten to [x, y]        
-        if track_id in players:            
-            players[track_id]['points'].append(transformed_midpoint)            
-            players[track_id]['line'].set_data(np.array(players[track_id]['points']).T)
-        else:           
-            players[track_id] = {
-                'points': [transformed_midpoint],
-                'line': ax.plot(transformed_midpoint[0], transformed_midpoint[1], 'o-', label=f'Player {track_id}')[0]  
-            }
+    transformed = maps.movement_homography(movements, H)
+    # One line per player through all of their positions, in the order the players first appear
+    for track_id in transformed.trackOrder():
+        points = transformed.points[transformed.track_ids == track_id]
+        ax.plot(points[:, 0], points[:, 1], 'o-', label=f'Player {track_id}')
     ax.legend(loc='upper right')
     ax.set_title('2D Movement Map')
 
@@ -85,22 +76,21 @@ def display2dMap(movements, H,match_id):
 def animate2dMap(transformed_movements,match_id ,speedup_factor=1.0, buffer_factor=1.01):
     fig, ax = plotLines() 
 
-    timestamps = [float(ts.rstrip('s')) for ts in sorted(transformed_movements.keys())]
+    # Row of each movement in the timeline of distinct times, sorted by time rather than as text
+    timestamps, frameOfRow = np.unique(transformed_movements.times, return_inverse=True)
+    timestamps = timestamps.tolist()
    
     time_intervals = [(timestamps[i+1] - timestamps[i]) / speedup_factor * buffer_factor for i in range(len(timestamps) - 1)]
     time_intervals.append(0.1 / speedup_factor * buffer_factor)  # Add a small delay for the last frame   
 
-    all_track_ids = set()
-    for movement_data in transformed_movements.values():
-        all_track_ids.update(movement_data.keys())
+    all_track_ids = set(transformed_movements.track_ids.tolist())
     
     lines = {track_id: ax.plot([], [], 'o-', label=f'Player {track_id}')[0] for track_id in all_track_ids}
 
-    # Precompute data for each frame to optimize update speed
-    precomputed_data = [
-        {track_id: transformed_movements[f'{timestamp:.2f}s'].get(track_id, None) for track_id in all_track_ids}
-        for timestamp in timestamps
-    ]
+    # Precompute data for each frame to optimize update speed, a later movement at the same time wins
+    precomputed_data = [dict.fromkeys(all_track_ids) for _ in timestamps]
+    for frame, track_id, point in zip(frameOfRow.tolist(), transformed_movements.track_ids.tolist(), transformed_movements.points.tolist()):
+        precomputed_data[frame][track_id] = point
     
     total_time_in_quadrant = {
         track_id: {'Q1': 0.0, 'Q2': 0.0, 'Q3': 0.0, 'Q4': 0.0} for track_id in all_track_ids
@@ -199,6 +189,10 @@ def main():
     posedataPath = sys.argv[2]
     videoPath = sys.argv[3]    
     courtdataPath = sys.argv[4]
+    # Optional start and end time in seconds ('-' leaves that end open), only that part of the match
+    # is read through the pose index
+    start_time = float(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] != '-' else None
+    end_time = float(sys.argv[6]) if len(sys.argv) > 6 and sys.argv[6] != '-' else None
     try:
         courtBounds = json.loads(sys.stdin.read())  # Read courtBounds from stdin and parse as JSON        
     except json.JSONDecodeError as e:
@@ -206,9 +200,10 @@ def main():
         sys.exit(1)
 
     try:
-        # Open the file in binary mode
-        with open(posedataPath, 'rb') as f:
-            data = msgpack.unpack(f, raw=False)
+        if start_time is not None or end_time is not None:
+            columns = load_pose_window(posedataPath, start_time, end_time)
+        else:
+            columns = load_pose_columns(posedataPath)
     except Exception as e:
         print(f"Failed to load file: {e}", file=sys.stderr)
         sys.exit(1)
@@ -233,8 +228,8 @@ def main():
     
     # 3d to flatmap tranformation
     H = maps.homography(sorted_points)   
-    track_id = maps.assign_track_ids(data)
-    movements = maps.extract_significant_movements(track_id)    
+    player_ids = maps.assign_player_ids_columns(columns)
+    movements = maps.extract_significant_movements_columns(columns, player_ids)    
 
     #  3 routes
     if(mapType == "display2dMap"): 
@@ -0,0 +1,137 @@
+import sys
+import os
+import io
+import json
+import importlib
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+# Long lived worker the Node server keeps running instead of spawning python for every request.
+# Heavy modules (ultralytics, cv2, matplotlib, sklearn) are imported once, by the first job that
+# needs them, and stay loaded for every job after that.
+#
+# Protocol: one JSON object per line in each direction.
+#   job    {"id": 1, "op": "velocity", "args": ["<dataPath>", "left"], "input": null}
+#   reply  {"id": 1, "code": 0, "stdout": "...", "stderr": "...", "result": null}
+# code and stdout/stderr match what running the script directly would have given, so callers
+# can keep their existing handling. Jobs run one at a time, the Node side runs several workers
+# when it wants jobs in parallel.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+server_dir = os.path.abspath(os.path.join(script_dir, '..', '..'))
+MODULE_DIRS = [
+    script_dir,
+    os.path.join(script_dir, '..', 'kmeans'),
+    os.path.join(server_dir, 'controllers')
+]
+
+# op -> (module, function, how it is called)
+#   argv  the module's main() with sys.argv set to the job args, as if it was run as a script
+#   call  the function called with the job args, its return value is sent back as result
+OPERATIONS = {
+    'poseEstimation': ('poseEstimation', 'main', 'argv'),
+    'velocity': ('velocity', 'main', 'argv'),
+    'jointangles': ('jointangles', 'main', 'argv'),
+    '2dMaps': ('2dMaps', 'main', 'argv'),
+    'kmeansplayerselection': ('kmeansplayerselection', 'main', 'argv'),
+    'playerLocations': ('Frame_function', 'playerLocations', 'call'),
+    'batchPlayerLocations': ('Frame_function', 'batchPlayerLocations', 'call'),
+    'zoneTimeline': ('Frame_function', 'zoneTimeline', 'call')
+}
+
+
+class UnknownOperationError(Exception):
+    """Exception raised when a job asks for an operation the worker does not have."""
+    def __init__(self, op, message="Unknown operation"):
+        self.op = op
+        self.message = message
+        super().__init__(f"{message}: {op}")
+
+
+def getOperation(op):
+    # Script names are accepted too so callers can pass what they used to spawn
+    op = os.path.splitext(op)[0]
+    if op not in OPERATIONS:
+        raise UnknownOperationError(op)
+    moduleName, functionName, style = OPERATIONS[op]
+    for moduleDir in MODULE_DIRS:
+        if moduleDir not in sys.path:
+            sys.path.insert(0, moduleDir)
+    module = importlib.import_module(moduleName)
+    return getattr(module, functionName), style, op
+
+
+def exitCode(exit):
+    if exit.code is None:
+        return 0
+    if isinstance(exit.code, int):
+        return exit.code
+    print(exit.code, file=sys.stderr)
+    return 1
+
+
+def runJob(job):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    result = None
+    code = 0
+    savedArgv, savedStdin = sys.argv, sys.stdin
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                function, style, op = getOperation(job.get('op', ''))
+                args = [str(arg) for arg in job.get('args', [])]
+                sys.stdin = io.StringIO(job.get('input') or '')
+                if style == 'argv':
+                    sys.argv = [f'{op}.py'] + args
+                    function()
+                else:
+                    result = function(*args)
+            except SystemExit as exit:
+                code = exitCode(exit)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    finally:
+        sys.argv, sys.stdin = savedArgv, savedStdin
+        # Scripts leave their figures open, which would pile up in a process that never exits
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+    return {
+        'id': job.get('id'),
+        'code': code,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'result': result
+    }
+
+
+def serve(jobs, replies):
+    for line in jobs:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            job = None
+            reply = {'id': None, 'code': 1, 'stdout': '', 'stderr': f"Invalid job: {e}", 'result': None}
+        if job is not None:
+            reply = runJob(job)
+        replies.write(json.dumps(reply, default=str) + '\n')
+        replies.flush()
+
+
+def main():
+    # Keep a private copy of stdout for replies and point fd 1 at stderr, so anything a
+    # library prints straight to the file descriptor cannot end up inside the protocol
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    os.chdir(server_dir)
+    # Readers stay open between jobs here, so a missing frame index is worth building
+    import frameAccess
+    frameAccess.BUILD_INDEX_IN_BACKGROUND = True
+    serve(sys.stdin, replies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+import os
+import time
+import json
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import cv2
+from modelRegistry import get_model, reset_tracking
+from poseEstimation import initialiseVideoCapture, videoWriter
+
+# Compares frames/sec of the frame by frame loop (batch size 1) against batched inference,
+# each batch size is run sequentially and as the threaded pipeline
+# usage: python batchInferenceBenchmark.py [videoPath] [batchSize ...]
+DEFAULT_VIDEO = os.path.join(parent_dir, '..', '..', '__tests__', 'test_videos', 'test_video.mp4')
+DEFAULT_BATCH_SIZES = [1, 4, 8, 16]
+
+def benchmarkBatchSize(videoPath, model_path, batchSize, pipelined=False):
+    # Same model for every run, with the tracker emptied so every run starts from no tracks
+    model = get_model(model_path)
+    reset_tracking(model)
+    cap = initialiseVideoCapture(videoPath)
+    if not cap:
+        return None
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    start = time.perf_counter()
+    frameData = videoWriter(cap, videoPath, model, 0.80, [0], batchSize=batchSize, pipelined=pipelined)
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return {
+        'batchSize': batchSize,
+        'pipelined': pipelined,
+        'frames': frameCount,
+        'seconds': round(elapsed, 3),
+        'fps': round(frameCount / elapsed, 2),
+        'detections': len(frameData)
+    }
+
+def main():
+    videoPath = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_VIDEO
+    batchSizes = [int(size) for size in sys.argv[2:]] or DEFAULT_BATCH_SIZES
+    model_path = os.path.join(parent_dir, '..', 'models', 'yolov8s-pose.pt')
+
+    results = [benchmarkBatchSize(videoPath, model_path, batchSize, pipelined)
+               for batchSize in batchSizes for pipelined in (False, True)]
+    baseline = results[0]
+    for result in results:
+        result['speedup'] = round(result['fps'] / baseline['fps'], 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# Random access to video frames by timestamp.
+#
+# A FrameIndex holds the presentation time of every frame and which frames are keyframes. It is
+# built once per video by reading packets without decoding them and cached next to the video as
+# <video>.frameindex.json. A FrameReader keeps one decoder open and serves get_frame(t) by decoding
+# forward from where it is when the frame is in the same GOP, otherwise by seeking to the frame.
+# Frames are picked by their real timestamp. Decoding forward counts frames exactly, but OpenCV
+# works out where a seek lands from the average frame rate, so on a variable frame rate recording
+# a seek can land a frame or two off.
+#
+# Building the index reads every packet of the video, so a FrameReader never waits for it: until
+# the index is there (built on a background thread, see BUILD_INDEX_IN_BACKGROUND) frames are found
+# by OpenCV's own timestamp seek.
+# Reading a single frame does not need any of this, a plain cv2.VideoCapture is cheaper.
+FRAME_INDEX_EXTENSION = '.frameindex.json'
+FRAME_INDEX_VERSION = 1
+# How many videos keep an open decoder between requests
+READER_CACHE_SIZE = 4
+# Whether open_reader builds a missing index in the background. Only worth it in a process that
+# stays around for later requests (the analysis worker turns it on), a one shot script would scan
+# every packet of the video and exit before using the index. Off, it uses a cached index if there is one
+BUILD_INDEX_IN_BACKGROUND = False
+
+
+class FrameIndex:
+    def __init__(self, times, keyframes, fps):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.times)
+
+    # Index of the frame whose timestamp is closest to timestamp (milliseconds), None past the end
+    def frameAt(self, timestamp):
+        if len(self.times) == 0:
+            return None
+        i = int(np.searchsorted(self.times, timestamp))
+        if i >= len(self.times):
+            frameTime = 1000 / self.fps if self.fps else 0
+            return len(self.times) - 1 if timestamp - self.times[-1] <= frameTime / 2 else None
+        if i > 0 and timestamp - self.times[i - 1] <= self.times[i] - timestamp:
+            return i - 1
+        return i
+
+    # Last keyframe at or before frame
+    def keyframeBefore(self, frame):
+        i = int(np.searchsorted(self.keyframes, frame, side='right')) - 1
+        return int(self.keyframes[max(i, 0)]) if len(self.keyframes) else 0
+
+
+def getFrameIndexPath(videoPath):
+    return videoPath + FRAME_INDEX_EXTENSION
+
+
+def videoSignature(videoPath):
+    stat = os.stat(videoPath)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+# Reads every packet's timestamp and keyframe flag without decoding any frames
+def build_frame_index(videoPath):
+    cap = cv2.VideoCapture(videoPath, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        cap = cv2.VideoCapture(videoPath)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    times = []
+    keyframeTimes = []
+    raw = cap.get(cv2.CAP_PROP_FORMAT) == -1
+    if raw:
+        while cap.grab():
+            frameTime = cap.get(cv2.CAP_PROP_POS_MSEC)
+            times.append(frameTime)
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframeTimes.append(frameTime)
+    cap.release()
+
+    if not raw:
+        # Backend cannot hand out packets, assume a constant frame rate and let it seek every time
+        cap = cv2.VideoCapture(videoPath)
+        frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        times = [i * 1000 / fps for i in range(frameCount)] if fps else []
+        keyframeTimes = times
+
+    # Packets arrive in decode order, frames come out of the decoder in presentation order
+    times = np.sort(np.array(times, dtype=np.float64))
+    keyframes = np.searchsorted(times, np.array(keyframeTimes, dtype=np.float64))
+    return FrameIndex(times, np.unique(keyframes), fps)
+
+
+def save_frame_index(indexPath, index, signature):
+    data = dict(signature, version=FRAME_INDEX_VERSION, fps=index.fps,
+                times=index.times.tolist(), keyframes=index.keyframes.tolist())
+    with open(indexPath, 'w') as f:
+        json.dump(data, f)
+
+
+# The cached index when it was built from this exact file, None when there is none
+def cached_frame_index(videoPath):
+    signature = videoSignature(videoPath)
+    try:
+        with open(getFrameIndexPath(videoPath), 'r') as f:
+            data = json.load(f)
+        if data.get('version') == FRAME_INDEX_VERSION and all(data.get(key) == value for key, value in signature.items()):
+            return FrameIndex(data['times'], data['keyframes'], data['fps'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+# The cached index when it was built from this exact file, otherwise a new one which is cached
+def load_frame_index(videoPath):
+    index = cached_frame_index(videoPath)
+    if index is not None:
+        return index
+
+    indexPath = getFrameIndexPath(videoPath)
+    signature = videoSignature(videoPath)
+    index = build_frame_index(videoPath)
+    try:
+        save_frame_index(indexPath, index, signature)
+    except OSError:
+        # Read only video folder, the index is rebuilt next time
+        pass
+    return index
+
+
+class FrameReader:
+    def __init__(self, videoPath, index=None, build_index=True):
+        self.videoPath = videoPath
+        self.index = index if index is not None else cached_frame_index(videoPath)
+        self.cap = cv2.VideoCapture(videoPath)
+        # Index of the frame the next grab() returns, None when it is not known exactly
+        self.position = 0
+        # The index position was counted against, a position from before the index arrived
+        # is not trusted once it is there
+        self.positionIndex = self.index
+        self.indexing = None
+        if self.index is None and build_index:
+            self.indexing = threading.Thread(target=self._build_index, daemon=True)
+            self.indexing.start()
+
+    def _build_index(self):
+        try:
+            self.index = load_frame_index(self.videoPath)
+        except (OSError, cv2.error):
+            # Stays on timestamp seeks
+            pass
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    # Decoded frame closest to timestamp (milliseconds), None if there is no frame there
+    def get_frame(self, timestamp):
+        index = self.index
+        if index is None:
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, timestamp)
+            ret, image = self.cap.read()
+            # OpenCV's frame count after a timestamp seek is worked out from the average frame rate,
+            # so the next read_index seeks instead of carrying on from here
+            self.position = None
+            return image if ret else None
+        frame = index.frameAt(timestamp)
+        if frame is None:
+            return None
+        return self.read_index(frame)
+
+    def read_index(self, frame):
+        index = self.index
+        if frame < 0 or (index is not None and frame >= len(index)):
+            return None
+        keyframe = index.keyframeBefore(frame) if index is not None else frame
+        # Decoding forward from here is never more work than seeking when there is no keyframe between.
+        # A seek asks OpenCV for the frame itself, which decodes forward from the keyframe before it
+        if self.position is None or self.positionIndex is not index or not (keyframe <= self.position <= frame):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            self.position = frame
+            self.positionIndex = index
+        while self.position < frame:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+        ret, image = self.cap.read()
+        if not ret:
+            return None
+        self.position = frame + 1
+        return image
+
+    # Next frame, like VideoCapture.read
+    def read(self):
+        if self.position is None:
+            # After a timestamp seek, the decoder still knows where it is
+            return self.cap.read()
+        image = self.read_index(self.position)
+        return image is not None, image
+
+    def release(self):
+        self.cap.release()
+
+
+_readers = OrderedDict()
+
+# Shared reader for a video, the open decoder and its index are reused by later requests in the
+# same process (the analysis worker) until the file changes
+def open_reader(videoPath):
+    videoPath = os.path.abspath(videoPath)
+    signature = tuple(videoSignature(videoPath).values())
+    cached = _readers.get(videoPath)
+    if cached is not None and cached[0] == signature:
+        _readers.move_to_end(videoPath)
+        return cached[1]
+    if cached is not None:
+        cached[1].release()
+
+    reader = FrameReader(videoPath, build_index=BUILD_INDEX_IN_BACKGROUND)
+    _readers[videoPath] = (signature, reader)
+    if len(_readers) > READER_CACHE_SIZE:
+        _readers.popitem(last=False)[1][1].release()
+    return reader
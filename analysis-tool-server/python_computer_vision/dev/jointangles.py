@@ -7,6 +7,7 @@ import os
 import cv2
 import msgpack
 from poseEstimation import getMatchIDFromVideo
+from poseStore import load_pose_columns, load_pose_window
 
 #from velocity import getVideoPathFromDataPath
 
@@ -70,6 +71,72 @@ def calculateAngleJoints(keypointData, p1String, p2String, p3string, specifcJoin
         angle = calculateAngle(p1, p2, p3)
         keypointData[specifcJoint] = angle 
 
+# Angle name -> (first point, vertex, third point), the angle is measured at the vertex.
+# A point is a keypoint name or a list of keypoint names whose midpoint is used. These are the
+# angles every consumer of the saved JSON expects, more can be asked for with a JSON file of
+# triplets passed as the second argument, such as hipJointAngles.json which adds the hip angles.
+JOINT_TRIPLETS = {
+    'LEFT_ARM_ANGLE': ('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'),
+    'RIGHT_ARM_ANGLE': ('RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST'),
+    'LEFT_LEG_ANGLE': ('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'),
+    'RIGHT_LEG_ANGLE': ('RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE')
+}
+
+onlyDataToExtract = [
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW', 
+    'LEFT_WRIST', 'RIGHT_WRIST', 'LEFT_HIP', 'RIGHT_HIP', 
+    'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE'
+]
+
+# (N, K, 2) float keypoints with NaN wherever the keypoint was not detected
+def keypointsWithNaN(columns):
+    keypoints = np.asarray(columns.keypoints, dtype=float)
+    keypoints[~np.asarray(columns.valid)] = np.nan
+    return keypoints
+
+def selectPoints(keypoints, keypointNames, point):
+    if isinstance(point, str):
+        return keypoints[:, keypointNames.index(point)]
+    # Midpoint of several keypoints, NaN if any of them is missing
+    return keypoints[:, [keypointNames.index(name) for name in point]].mean(axis=1)
+
+# Every configured angle for every frame at once, in degrees, NaN where a point is missing
+# or two points coincide
+def calculateJointAngles(keypoints, keypointNames, triplets=JOINT_TRIPLETS):
+    keypointNames = list(keypointNames)
+    angles = {}
+    for angleName, (first, vertex, third) in triplets.items():
+        p2 = selectPoints(keypoints, keypointNames, vertex)
+        v1 = selectPoints(keypoints, keypointNames, first) - p2
+        v2 = selectPoints(keypoints, keypointNames, third) - p2
+        norms = np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_theta = np.einsum('ij,ij->i', v1, v2) / norms
+        cos_theta[norms == 0] = np.nan
+        angles[angleName] = np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
+    return angles
+
+def loadTriplets(tripletPath):
+    with open(tripletPath, 'r') as f:
+        return {name: tuple(points) for name, points in json.load(f).items()}
+
+# Same per record layout as before, missing angles are written as null since JSON has no NaN
+def buildAngleDataList(columns, angles):
+    keypointIndexes = [columns.keypointIndex(name) for name in onlyDataToExtract]
+    keypoints = np.asarray(columns.keypoints)[:, keypointIndexes].tolist()
+    angleValues = {name: np.where(np.isnan(values), None, values).tolist() for name, values in angles.items()}
+    angleDataList = []
+    for i, (track_id, time) in enumerate(zip(np.asarray(columns.track_ids).tolist(), np.asarray(columns.times).tolist())):
+        extractedData = dict(zip(onlyDataToExtract, keypoints[i]))
+        for name, values in angleValues.items():
+            extractedData[name] = values[i]
+        angleDataList.append({
+            "track_id": track_id,
+            "timestamp": f"{time:.2f}s",
+            'angles': extractedData
+        })
+    return angleDataList
+
 def saveData(dataPath, angleDataList):
     match_id = getMatchIDFromVideo(dataPath)
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -81,36 +148,20 @@ def saveData(dataPath, angleDataList):
 
 def main():
     dataPath = sys.argv[1]
-    
-    with open(dataPath, 'rb') as f:
-        data = msgpack.unpack(f, raw=False)
-
-    onlyDataToExtract = [
-        'LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW', 
-        'LEFT_WRIST', 'RIGHT_WRIST', 'LEFT_HIP', 'RIGHT_HIP', 
-        'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE'
-    ]
-    
-    angleDataList = []
-
-    for entry in data:
-        extractedData = {}
-        for keypoint in onlyDataToExtract:
-            if keypoint in entry['keypoints']:
-                keypointData = entry['keypoints'][keypoint]
-            extractedData[keypoint] = keypointData
-        
-        if extractedData:  
-            calculateAngleJoints(extractedData, 'LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST', 'LEFT_ARM_ANGLE')
-            calculateAngleJoints(extractedData, 'RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST', 'RIGHT_ARM_ANGLE')
-            calculateAngleJoints(extractedData, 'LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE', 'LEFT_LEG_ANGLE')
-            calculateAngleJoints(extractedData, 'RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE', 'RIGHT_LEG_ANGLE')
-            
-            angleDataList.append({
-                "track_id": entry['track_id'],
-                "timestamp": entry['timestamp'], 
-                'angles': extractedData
-            })
+    # '-' keeps the default angles when a time window follows
+    triplets = loadTriplets(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != '-' else JOINT_TRIPLETS
+    # Optional start and end time in seconds ('-' leaves that end open), only that part of the match
+    # is read through the pose index
+    start_time = float(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != '-' else None
+    end_time = float(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] != '-' else None
+
+    # Memory mapped from the .pose store when it exists, otherwise decoded once from the msgpack
+    if start_time is not None or end_time is not None:
+        columns = load_pose_window(dataPath, start_time, end_time)
+    else:
+        columns = load_pose_columns(dataPath)
+    angles = calculateJointAngles(keypointsWithNaN(columns), columns.keypointNames, triplets)
+    angleDataList = buildAngleDataList(columns, angles)
 
     saveData(dataPath, angleDataList)
     
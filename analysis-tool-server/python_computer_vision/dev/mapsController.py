@@ -9,65 +9,112 @@ def apply_gaussian_blur(heatmap, kernel_size=21):
         kernel_size += 1  # Make kernel size odd if it is not
     blurred_heatmap = cv2.GaussianBlur(heatmap, (kernel_size, kernel_size), 0)
     return blurred_heatmap
+
+KEYPOINTS_TO_COMPARE = [
+    'LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_SHOULDER', 'RIGHT_SHOULDER',
+    'LEFT_WRIST','RIGHT_WRIST', 'LEFT_ELBOW','RIGHT_ELBOW', 'LEFT_KNEE','RIGHT_KNEE'
+]
+# Records a detection with no usable keypoints may look ahead for one that has them
+LOOK_AHEAD = 10
+# Stands in for "no keypoint in common" so a pair with one known distance beats a pair with none
+NO_MATCH_COST = 1e9
+
 #  Set track_ids to only 1 or 2
 def assign_track_ids(data):        
-    track_id_1_keypoints = None
-    track_id_2_keypoints = None
-    keypoints_to_compare = [
-        'LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_SHOULDER', 'RIGHT_SHOULDER',
-        'LEFT_WRIST','RIGHT_WRIST', 'LEFT_ELBOW','RIGHT_ELBOW', 'LEFT_KNEE','RIGHT_KNEE'
-    ]
-    
+    times = []
+    keypoints = np.zeros((len(data), len(KEYPOINTS_TO_COMPARE), 2))
+    # A keypoint is usable when the record has it and it is not the [0, 0] left for a keypoint that
+    # was not found. A single coordinate of 0 is a real position at the edge of the frame
+    present = np.zeros((len(data), len(KEYPOINTS_TO_COMPARE)), dtype=bool)
     for i, getKeyPoints in enumerate(data):
-        keypoints = getKeyPoints['keypoints']
-
-        # Collect valid keypoints for comparison
-        valid_points = {name: (x, y) for name, (x, y) in keypoints.items() if name in keypoints_to_compare and x != 0 and y != 0}
-
-        # cases where there are no valid keypoints
-        if len(valid_points) == 0:            
-            future_track_id = None
-            for j in range(1, 10 + 1):
-                if i + j >= len(data):
-                    break  # Avoid index out of range
-                future_frame = data[i + j]
-                future_keypoints = future_frame['keypoints']
-                valid_future_points = {name: (x, y) for name, (x, y) in future_keypoints.items() if name in keypoints_to_compare and x != 0 and y != 0}
-
-                if len(valid_future_points) > 0:                    
-                    closest_to_1_future = compute_closest_keypoint(valid_future_points, track_id_1_keypoints, keypoints_to_compare) if track_id_1_keypoints else float('inf')
-                    closest_to_2_future = compute_closest_keypoint(valid_future_points, track_id_2_keypoints, keypoints_to_compare) if track_id_2_keypoints else float('inf')
-                    
-                    if closest_to_1_future < closest_to_2_future:
-                        future_track_id = 1
-                    else:
-                        future_track_id = 2
-                    break 
-
-            if future_track_id == 1:
-                getKeyPoints['track_id'] = 1
-            elif future_track_id == 2:
-                getKeyPoints['track_id'] = 2
+        times.append(getKeyPoints.get('timestamp'))
+        for k, name in enumerate(KEYPOINTS_TO_COMPARE):
+            if name in getKeyPoints['keypoints']:
+                keypoints[i, k] = getKeyPoints['keypoints'][name]
+                present[i, k] = True
+
+    # Same frame means the same timestamp in consecutive records
+    frameStarts = [i for i in range(len(times)) if i == 0 or times[i] != times[i - 1]]
+    player_ids = assign_player_ids(keypoints, present & (keypoints != 0).any(axis=2), frameStarts)
+    for getKeyPoints, player_id in zip(data, player_ids.tolist()):
+        # Detections that could not be matched to either player are left out of the player data
+        getKeyPoints['track_id'] = player_id or None
+    return data
+
+# Player ids from a PoseColumns, see assign_player_ids
+def assign_player_ids_columns(columns):
+    indexes = [columns.keypointIndex(name) for name in KEYPOINTS_TO_COMPARE]
+    keypoints = columns.keypoints[:, indexes].astype(np.float64)
+    valid = columns.valid[:, indexes] & (keypoints != 0).any(axis=2)
+    frameStarts = np.flatnonzero(np.r_[True, np.diff(columns.times) != 0])
+    return assign_player_ids(keypoints, valid, frameStarts)
+
+# Player 1 or 2 for every detection, 0 when it cannot be matched to either.
+#   keypoints    (N, K, 2) keypoint positions of each detection, in time order
+#   valid        (N, K) which of those keypoints were found
+#   frameStarts  first row of each frame, rows of one frame are consecutive
+# Each player is remembered by their latest detection with usable keypoints. The distance from a
+# detection to a player is the smallest distance over the keypoints both have. Within a frame the
+# detections are matched to the two players together, so two detections can never both be player 1.
+# A detection without usable keypoints is matched using the next detection (within LOOK_AHEAD rows)
+# that has some. The first two detections with keypoints start players 1 and 2.
+def assign_player_ids(keypoints, valid, frameStarts):
+    count = len(keypoints)
+    player_ids = np.zeros(count, dtype=int)
+    if count == 0:
+        return player_ids
+    hasPoints = valid.any(axis=1)
+    points = np.where(valid[..., None], keypoints, np.nan)
+
+    # Row each detection is compared with, itself or the next row with usable keypoints
+    rows = np.arange(count)
+    nextValid = np.minimum.accumulate(np.where(hasPoints, rows, count)[::-1])[::-1]
+    source = np.where(nextValid - rows <= LOOK_AHEAD, nextValid, count)
+    matchable = source < count
+
+    players = [None, None]
+    frameEnds = np.append(np.asarray(frameStarts)[1:], count)
+    for start, end in zip(frameStarts, frameEnds):
+        frameRows = start + np.flatnonzero(matchable[start:end])
+        # Until both players are known, the first detections with keypoints start them
+        started = []
+        while None in players and len(started) < len(frameRows) and hasPoints[frameRows[len(started)]]:
+            row = frameRows[len(started)]
+            player = players.index(None)
+            players[player] = row
+            player_ids[row] = player + 1
+            started.append(player)
+        frameRows = frameRows[len(started):]
+        free = [player for player in range(2) if player not in started]
+        if len(frameRows) == 0 or not free:
             continue
 
-        if track_id_1_keypoints is None:
-            track_id_1_keypoints = valid_points
-            getKeyPoints['track_id'] = 1
-        elif track_id_2_keypoints is None:
-            track_id_2_keypoints = valid_points
-            getKeyPoints['track_id'] = 2
-        else:            
-            closest_to_1 = compute_closest_keypoint(valid_points, track_id_1_keypoints, keypoints_to_compare)
-            closest_to_2 = compute_closest_keypoint(valid_points, track_id_2_keypoints, keypoints_to_compare)
-
-            # Assign track ID based on closest individual keypoint
-            if closest_to_1 < closest_to_2:
-                getKeyPoints['track_id'] = 1
-                track_id_1_keypoints = valid_points  
-            else:
-                getKeyPoints['track_id'] = 2
-                track_id_2_keypoints = valid_points 
-    return data
+        # (detections, players) smallest keypoint distance, inf for a player not known yet
+        costs = np.full((len(frameRows), 2), np.inf)
+        known = [player for player in range(2) if players[player] is not None]
+        if known:
+            differences = points[source[frameRows]][:, None] - points[[players[player] for player in known]][None]
+            distances = np.sqrt((differences ** 2).sum(axis=3))
+            costs[:, known] = np.fmin.reduce(distances, axis=2, initial=np.inf)
+
+        if len(free) == 1:
+            assignment = [(frameRows[np.argmin(costs[:, free[0]])], free[0])]
+        elif len(frameRows) == 1:
+            assignment = [(frameRows[0], 0 if costs[0, 0] < costs[0, 1] else 1)]
+        else:
+            # Best pair of detections for players 1 and 2: cost of detection i as player 1 plus
+            # detection j as player 2, a detection cannot be both. Any others in the frame are left out
+            capped = np.minimum(costs, NO_MATCH_COST)
+            pairCosts = capped[:, 0, None] + capped[None, :, 1]
+            np.fill_diagonal(pairCosts, np.inf)
+            first, second = np.unravel_index(np.argmin(pairCosts), pairCosts.shape)
+            assignment = [(frameRows[first], 0), (frameRows[second], 1)]
+
+        for row, player in assignment:
+            player_ids[row] = player + 1
+            if hasPoints[row]:
+                players[player] = row
+    return player_ids
 
 def compute_closest_keypoint(points1, points2, keypoints_to_compare):    
     closest_distance = float('inf')    
@@ -219,46 +266,90 @@ def calculate_ankle(ankles):
         return ankles['right_ankle']
     return None
 
-def extract_significant_movements(pose_estimation_data, movement_threshold=5.0, start_time=None, end_time=None):
-    onlyDataToExtract = ['LEFT_ANKLE', 'RIGHT_ANKLE']
-    previous_ankle_positions = {}
-    significant_movements = []    
+ANKLES = ['LEFT_ANKLE', 'RIGHT_ANKLE']
 
-    for entry in pose_estimation_data:
+# Movements where a player's ankles moved more than movement_threshold pixels since that player's
+# previous record, as MovementColumns in record order. start_time and end_time (seconds) keep
+# only the records inside that window
+def extract_significant_movements(pose_estimation_data, movement_threshold=5.0, start_time=None, end_time=None):
+    count = len(pose_estimation_data)
+    times = np.full(count, np.nan)
+    track_ids = np.zeros(count, dtype=int)
+    ankles = np.zeros((count, 2, 2))
+    present = np.zeros((count, 2), dtype=bool)
+    timestamps = []
+    for i, entry in enumerate(pose_estimation_data):
         track_id = entry.get('track_id')
         timestamp = entry.get('timestamp')
-
+        timestamps.append(timestamp)
         if not track_id or not timestamp:
             continue
         try:
-            timestamp_seconds = float(timestamp.rstrip('s'))
+            times[i] = float(timestamp.rstrip('s'))
         except ValueError:
             continue
-
-        if (start_time is not None and timestamp_seconds < start_time) or (end_time is not None and timestamp_seconds > end_time):
-            continue
-
-        total_movement = 0
-        ankles = {}
-        for keypoint in onlyDataToExtract:
+        track_ids[i] = track_id
+        for k, keypoint in enumerate(ANKLES):
             if keypoint in entry['keypoints']:
-                x, y = entry['keypoints'][keypoint]
-                if keypoint in previous_ankle_positions:
-                    prev_x, prev_y = previous_ankle_positions[keypoint]
-                    movement_distance = np.linalg.norm([x - prev_x, y - prev_y])
-                    total_movement += movement_distance
-                previous_ankle_positions[keypoint] = (x, y)
-                ankles[keypoint.lower()] = [x, y]
-
-        if total_movement > movement_threshold:
-            midpoint = calculate_ankle(ankles)
-            if midpoint:  # Only append if a midpoint exists
-                significant_movements.append({
-                    'track_id': track_id,
-                    'timestamp': timestamp,
-                    'mid_point': midpoint
-                })
-    return significant_movements
+                ankles[i, k] = entry['keypoints'][keypoint]
+                present[i, k] = True
+    return significant_movements(times, track_ids, ankles, present, movement_threshold, start_time, end_time, timestamps)
+
+# Same as extract_significant_movements straight from a PoseColumns, player_ids replaces the
+# tracker's ids when given (see assign_player_ids_columns), rows with id 0 are left out. With the
+# PoseIndex of the columns (see poseStore.load_pose_index) a window is found by binary search
+def extract_significant_movements_columns(columns, player_ids=None, movement_threshold=5.0, start_time=None, end_time=None, index=None):
+    indexes = [columns.keypointIndex(keypoint) for keypoint in ANKLES]
+    track_ids = columns.track_ids if player_ids is None else player_ids
+    rows = None
+    if index is not None and (start_time is not None or end_time is not None):
+        rows = index.window(start_time, end_time)
+    return significant_movements(columns.times, track_ids, columns.keypoints[:, indexes].astype(np.float64),
+                                 columns.valid[:, indexes], movement_threshold, start_time, end_time, rows=rows)
+
+#   times      (N,) seconds, NaN for records to leave out
+#   track_ids  (N,) player of each record, 0 for records to leave out
+#   ankles     (N, 2, 2) left and right ankle positions
+#   present    (N, 2) which ankles were found
+#   rows       the records of the window in time order when they are already known, such as
+#              PoseIndex.window(start_time, end_time), start_time and end_time are not applied again
+def significant_movements(times, track_ids, ankles, present, movement_threshold=5.0, start_time=None, end_time=None, timestamps=None, rows=None):
+    times = np.asarray(times, dtype=np.float64)
+    track_ids = np.asarray(track_ids)
+    if rows is None:
+        # One pass over the records is cheaper than sorting them to binary search a single window
+        inWindow = (track_ids != 0) & ~np.isnan(times)
+        if start_time is not None:
+            inWindow &= times >= start_time
+        if end_time is not None:
+            inWindow &= times <= end_time
+        rows = np.flatnonzero(inWindow)
+    else:
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[(track_ids[rows] != 0) & ~np.isnan(times[rows])]
+
+    # Each player's records in the order they came, an ankle is compared with the same player's last
+    # sighting of it. Records are stored in time order, so only the player ids need a (stable) sort
+    rows = rows[np.argsort(track_ids[rows], kind='stable')]
+    movement = np.zeros(len(rows))
+    for k in range(2):
+        seen = np.flatnonzero(present[rows, k])
+        seenRows = rows[seen]
+        distances = np.linalg.norm(np.diff(ankles[seenRows, k], axis=0), axis=1)
+        samePlayer = track_ids[seenRows][1:] == track_ids[seenRows][:-1]
+        movement[seen[1:]] += np.where(samePlayer, distances, 0)
+
+    moved = np.sort(rows[movement > movement_threshold])
+    # Mid point of both ankles, or the one ankle that was found
+    left, right = present[moved, 0], present[moved, 1]
+    mid_points = np.where(left[:, None], ankles[moved, 0], ankles[moved, 1])
+    mid_points[left & right] = ankles[moved[left & right]].mean(axis=1)
+
+    if timestamps is None:
+        movementTimestamps = [f"{time:.2f}s" for time in times[moved]]
+    else:
+        movementTimestamps = [timestamps[row] for row in moved]
+    return MovementColumns(times[moved], movementTimestamps, track_ids[moved], mid_points)
 
 
 def homography(sortedcourtBounds):
@@ -293,52 +384,74 @@ def homography(sortedcourtBounds):
     # print("flatmap",flatmap)
     return homography_matrix
 
-# Transform coords
+# Transform coords, points is (N, 2) and the result (2, N)
 def apply_homography(H, points):
-    ones = np.ones((points.shape[0], 1))
-    points_homogeneous = np.hstack([points, ones])
-    transformed_points_homogeneous = np.dot(H, points_homogeneous.T)
-    return transformed_points_homogeneous[:2, :] / transformed_points_homogeneous[2, :]
-
-# updated movements with new coords, timestamps as key
+    return transform_points(H, points).T
+
+# Every (N, 2) point through the homography in one call, returns (N, 2)
+def transform_points(H, points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return np.empty((0, 2))
+    return cv2.perspectiveTransform(points[:, None, :], np.asarray(H, dtype=np.float64))[:, 0, :]
+
+# Movements as parallel arrays, row i is one player's position at one time
+class MovementColumns:
+    def __init__(self, times, timestamps, track_ids, points):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.timestamps = list(timestamps)
+        self.track_ids = np.asarray(track_ids)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.times)
+
+    # Track ids in the order they first appear
+    def trackOrder(self):
+        _, first = np.unique(self.track_ids, return_index=True)
+        return self.track_ids[np.sort(first)]
+
+def movement_columns(movements):
+    timestamps = [movement['timestamp'] for movement in movements]
+    return MovementColumns(
+        [float(timestamp.rstrip('s')) for timestamp in timestamps],
+        timestamps,
+        [movement['track_id'] for movement in movements],
+        [movement['mid_point'] for movement in movements]
+    )
+
+# Same movements with their mid points on the flat court, all transformed together
 def movement_homography(movements, H):
-    transformed_movements = {}
-
-    for movement in movements:
-        track_id = movement['track_id']
-        timestamp = movement['timestamp']
-        
-        if timestamp not in transformed_movements:
-            transformed_movements[timestamp] = {}
-       
-        midpoint = np.array([movement['mid_point']], dtype=float)
-        transformed_midpoint = apply_homography(H, midpoint).flatten().tolist()
-
-        # Store the track_id and its transformed midpoint under the corresponding timestamp
-        transformed_movements[timestamp][track_id] = transformed_midpoint
-
-    return transformed_movements
+    if not isinstance(movements, MovementColumns):
+        movements = movement_columns(movements)
+    return MovementColumns(movements.times, movements.timestamps, movements.track_ids,
+                           transform_points(H, movements.points))
 
+# (N, 2) court positions of the movements' mid points
 def map_movements_to_court(movements, homography_matrix):
-    court_positions = []
-    for movement in movements:
-        midpoint = np.array([movement['mid_point']], dtype=float)  
-        transformed_midpoint = apply_homography(homography_matrix, midpoint).flatten()  # Apply homography
-        court_positions.append(transformed_midpoint)
-    return court_positions
-
-# Function to accumulate significant movements into a heatmap
-def accumulate_heatmap(court_positions, court_width, court_height, radius=5, weights=None):
-    heatmap = np.zeros((court_height, court_width), dtype=np.float32)
-    for i, pos in enumerate(court_positions):
-        x, y = int(pos[0]), int(pos[1])
-        weight = weights[i] if weights else 1 
-        
-        # Ensure the indices are within bounds
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < court_width and 0 <= ny < court_height:
-                    heatmap[ny, nx] += weight  # Increment by weight within the radius
-    return heatmap
+    return movement_homography(movements, homography_matrix).points
 
+# Function to accumulate significant movements into a heatmap. Every position adds its weight to the
+# (2 * radius + 1) square of cells around it, cells outside the court are dropped
+def accumulate_heatmap(court_positions, court_width, court_height, radius=5, weights=None):
+    positions = np.asarray(court_positions, dtype=np.float64).reshape(-1, 2)
+    weights = np.ones(len(positions)) if weights is None else np.asarray(weights, dtype=np.float64)
+    # int() of the position, towards zero
+    x = np.trunc(positions[:, 0])
+    y = np.trunc(positions[:, 1])
+    # Positions up to radius off the court still reach cells on it
+    keep = (x >= -radius) & (x < court_width + radius) & (y >= -radius) & (y < court_height + radius)
+    x = x[keep].astype(int) + radius
+    y = y[keep].astype(int) + radius
+
+    # Weight landing on each cell of the court padded by radius on every side
+    padded_width, padded_height = court_width + 2 * radius, court_height + 2 * radius
+    counts = np.bincount(y * padded_width + x, weights=weights[keep], minlength=padded_width * padded_height)
+    counts = counts.reshape(padded_height, padded_width)
+
+    # Sum of each (2 * radius + 1) window from the summed area table
+    table = np.zeros((padded_height + 1, padded_width + 1))
+    table[1:, 1:] = counts.cumsum(axis=0).cumsum(axis=1)
+    size = 2 * radius + 1
+    heatmap = table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+    return heatmap.astype(np.float32)
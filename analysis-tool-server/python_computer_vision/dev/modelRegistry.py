@@ -0,0 +1,85 @@
+import os
+import sys
+from ultralytics import YOLO
+
+# One place that finds, loads and keeps the YOLO models. A model is loaded once per process, so in the
+# analysis worker only the first request pays for it. Missing official weights are downloaded into
+# the models folder the caller asked for.
+#
+# MODEL_FORMAT picks the runtime the models run on:
+#   pytorch   the .pt weights as they are (default)
+#   onnx      exported once to <weights>.onnx next to the weights, run with onnxruntime
+#   openvino  exported once to <weights>_openvino_model/, fastest on Intel CPUs
+# The export is kept and reused until the .pt weights change. When the export cannot be made (for
+# example the onnx or openvino packages are not installed) the .pt weights are used.
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'pytorch')
+EXPORT_SUFFIXES = {
+    'onnx': '.onnx',
+    'openvino': '_openvino_model'
+}
+
+_models = {}
+
+
+class UnknownModelFormatError(Exception):
+    """Exception raised when a model is asked for in a format the registry cannot export to."""
+    def __init__(self, modelFormat, message="Unknown model format"):
+        self.modelFormat = modelFormat
+        self.message = message
+        super().__init__(f"{message}: {modelFormat}, expected pytorch, {', '.join(EXPORT_SUFFIXES)}")
+
+
+# The weights path, downloading official ultralytics weights there when the file is missing
+def resolve_model_path(modelPath):
+    if os.path.isfile(modelPath):
+        return modelPath
+    os.makedirs(os.path.dirname(os.path.abspath(modelPath)), exist_ok=True)
+    from ultralytics.utils.downloads import attempt_download_asset
+    attempt_download_asset(modelPath)
+    if not os.path.isfile(modelPath):
+        raise FileNotFoundError(f"Model weights not found and could not be downloaded: {modelPath}")
+    return modelPath
+
+
+def getExportPath(modelPath, modelFormat):
+    return os.path.splitext(modelPath)[0] + EXPORT_SUFFIXES[modelFormat]
+
+
+# Path of the exported model, exported from model (loaded from modelPath) unless an export at
+# least as new as the weights is already there
+def export_model(model, modelPath, modelFormat):
+    exportPath = getExportPath(modelPath, modelFormat)
+    if os.path.exists(exportPath) and os.path.getmtime(exportPath) >= os.path.getmtime(modelPath):
+        return exportPath
+    # dynamic keeps the batch size open, the pose pipeline sends several frames per forward pass
+    return model.export(format=modelFormat, dynamic=True)
+
+
+def load_model(modelPath, modelFormat):
+    model = YOLO(resolve_model_path(modelPath))
+    if modelFormat == 'pytorch':
+        return model
+    try:
+        # Exported files do not say what task they were trained for
+        return YOLO(export_model(model, modelPath, modelFormat), task=model.task)
+    except Exception as e:
+        print(f"Could not run {modelPath} with {modelFormat}, using the PyTorch weights: {e}", file=sys.stderr)
+        return model
+
+
+# The loaded model for modelPath, shared by every caller in this process
+def get_model(modelPath, modelFormat=None):
+    modelFormat = modelFormat or MODEL_FORMAT
+    if modelFormat != 'pytorch' and modelFormat not in EXPORT_SUFFIXES:
+        raise UnknownModelFormatError(modelFormat)
+    key = (os.path.abspath(modelPath), modelFormat)
+    if key not in _models:
+        _models[key] = load_model(modelPath, modelFormat)
+    return _models[key]
+
+
+# A shared model keeps its tracker between videos when tracking with persist=True, this starts the
+# next video with no tracks and track ids from 1 again
+def reset_tracking(model):
+    for tracker in getattr(getattr(model, 'predictor', None), 'trackers', None) or []:
+        tracker.reset()
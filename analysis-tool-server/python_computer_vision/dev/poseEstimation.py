@@ -1,11 +1,23 @@
 import sys
 import os
+import argparse
+import queue
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import cv2
-from ultralytics import YOLO
 from enum import Enum
 import numpy as np
 import json
 import msgpack
+from poseStore import (framesToColumns, write_pose_store, getPoseStorePath, load_pose_columns,
+                       load_pose_index, PoseDataWriter, iter_pose_records)
+from modelRegistry import get_model, reset_tracking
+
+# Most decoded frames one batch holds. Skipped frames wait in the batch with the inferred ones, so
+# with a large stride a batch would otherwise hold batchSize * stride frames before it is run
+MAX_BATCH_FRAMES = 32
 
 
 class GetKeypoint(Enum):
@@ -27,7 +39,8 @@ class GetKeypoint(Enum):
     LEFT_ANKLE:     int = 15
     RIGHT_ANKLE:    int = 16
 
-def process_video(videoPath):
+# stream=True appends records to poseEstimationData as frames are processed and returns the data path
+def process_video(videoPath, workers=1, overlapSeconds=1.0, stream=False, flushEvery=250, **options):
     # Initialize model
     script_dir = os.path.dirname(os.path.abspath(__file__))
     models_dir = os.path.join(script_dir, '..','models')
@@ -36,33 +49,230 @@ def process_video(videoPath):
     if not os.path.exists(models_dir):
         os.makedirs(models_dir)
     model_path = os.path.join(models_dir, 'yolov8s-pose.pt')
+    if workers > 1:
+        frameData = processVideoChunked(videoPath, model_path, workers, overlapSeconds, **options)
+        if stream and frameData is not None:
+            # Chunks only come back once every worker is done, so they are written in one go
+            with openPoseDataSink(videoPath, flushEvery) as sink:
+                sink.extend(frameData)
+            return finishPoseDataSink(sink, videoPath)
+        return frameData
+    # Loaded once per process, only the tracker starts over for each video
+    model = get_model(model_path)
+    reset_tracking(model)
+    confThresh = 0.80
+    modelClass = [0]
     
     cap = initialiseVideoCapture(videoPath)
     if not cap:
         return None 
-    frameData = videoWriter(cap, videoPath, model_path)        
+    if stream:
+        with openPoseDataSink(videoPath, flushEvery) as sink:
+            videoWriter(cap, videoPath, model, confThresh, modelClass, sink=sink, **options)
+        cap.release()
+        return finishPoseDataSink(sink, videoPath)
+    frameData = videoWriter(cap, videoPath, model, confThresh, modelClass, **options)        
     cap.release()   
      
     return frameData
 
-def store_pose_estimation_data(frameData, videoPath):
+# Splits the video into one frame range per worker process, each with its own YOLO instance.
+# Workers start overlapSeconds before their range so the tracker is warmed up, those overlap
+# records are only used to line up track ids with the previous chunk and are then dropped
+def processVideoChunked(videoPath, model_path, workers, overlapSeconds=1.0, **options):
+    cap = initialiseVideoCapture(videoPath)
+    if not cap:
+        return None
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    overlapFrames = int(round(overlapSeconds * fps))
+    chunks = getChunkRanges(frameCount, workers, overlapFrames)
+    match_id = getMatchIDFromVideo(videoPath)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_dir = os.path.join(script_dir, '..', '..', 'poseOutputVideo')
+    os.makedirs(output_dir, exist_ok=True)
+    segmentPaths = [os.path.join(output_dir, f'{match_id}_part{index}.mp4') for index in range(len(chunks))]
+
+    # spawn so every worker gets a clean torch runtime
+    context = multiprocessing.get_context('spawn')
+    threadsPerWorker = max(1, (os.cpu_count() or 1) // len(chunks))
+    with ProcessPoolExecutor(max_workers=len(chunks), mp_context=context) as executor:
+        futures = [
+            executor.submit(processChunk, videoPath, model_path, startFrame, endFrame, overlapFrames,
+                            segmentPath, threadsPerWorker, options)
+            for (startFrame, endFrame), segmentPath in zip(chunks, segmentPaths)
+        ]
+        chunkResults = [future.result() for future in futures]
+
+    frameData = mergeChunks(chunkResults)
+    concatenateSegments(segmentPaths, os.path.join(output_dir, f'{match_id}.mp4'))
+    return frameData
+
+# Frame ranges [start, end) of roughly equal length, fewer chunks for short videos.
+# Containers that do not report a frame count are read in one chunk to the end
+def getChunkRanges(frameCount, workers, overlapFrames):
+    if frameCount <= 0:
+        return [(0, None)]
+    workers = max(1, min(workers, frameCount // max(1, 2 * overlapFrames)))
+    chunkSize = -(-frameCount // workers)
+    return [(start, min(start + chunkSize, frameCount)) for start in range(0, frameCount, chunkSize)]
+
+def processChunk(videoPath, model_path, startFrame, endFrame, overlapFrames, segmentPath, threads, options):
+    import torch
+    torch.set_num_threads(threads)
+    # A pool process can be handed a second chunk, which must not continue the first chunk's tracks
+    model = get_model(model_path)
+    reset_tracking(model)
+    confThresh = 0.80
+    modelClass = [0]
+    cap = initialiseVideoCapture(videoPath)
+    if not cap:
+        return [], []
+    warmupStart = max(0, startFrame - overlapFrames)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, warmupStart)
+    overlapData = warmupTracker(cap, model, confThresh, modelClass, startFrame - warmupStart)
+    # persist=True keeps the warmed up tracker for the frames this chunk owns
+    frameData = videoWriter(cap, videoPath, model, confThresh, modelClass,
+                            outputPath=segmentPath, maxFrames=None if endFrame is None else endFrame - startFrame, **options)
+    cap.release()
+    return overlapData, frameData
+
+# Runs the tracker over the overlap frames without writing them to the video
+def warmupTracker(cap, model, confThresh, modelClass, frameCount):
+    overlapData = []
+    for _ in range(frameCount):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frameTimestamp = getFrameTimestamp(cap)
+        detection = getDetection(model, frame, confThresh, modelClass)
+        if detection is None:
+            continue
+        processDetection(detection, frameTimestamp, overlapData, frame)
+    return overlapData
+
+# Joins the chunk records in order, renaming each chunk's track ids to match the chunk before it
+def mergeChunks(chunkResults, maxDistance=100.0):
+    frameData = []
+    nextTrackID = 1
+    for index, (overlapData, chunkData) in enumerate(chunkResults):
+        mapping = {}
+        if index == 0:
+            # The first chunk keeps the ids ByteTrack gave it
+            mapping = {record['track_id']: record['track_id'] for record in chunkData}
+        elif overlapData:
+            overlapStart = timestampToSeconds(overlapData[0]['timestamp'])
+            previousRecords = [record for record in frameData if timestampToSeconds(record['timestamp']) >= overlapStart]
+            mapping = matchOverlapTracks(previousRecords, overlapData, maxDistance)
+        # Tracks that were not seen in the overlap get ids no earlier chunk has used
+        for record in chunkData:
+            track_id = record['track_id']
+            if track_id not in mapping:
+                mapping[track_id] = nextTrackID
+                nextTrackID += 1
+            record['track_id'] = mapping[track_id]
+            frameData.append(record)
+        nextTrackID = max([nextTrackID] + [track_id + 1 for track_id in mapping.values()])
+    return frameData
+
+# Pairs overlap track ids with the previous chunk's ids by mean keypoint distance on shared frames
+def matchOverlapTracks(previousRecords, overlapRecords, maxDistance=100.0):
+    previousByTime = {}
+    for record in previousRecords:
+        previousByTime.setdefault(record['timestamp'], []).append(record)
+
+    distances = {}
+    for record in overlapRecords:
+        for previous in previousByTime.get(record['timestamp'], []):
+            shared = [name for name in record['keypoints'] if name in previous['keypoints']]
+            if not shared:
+                continue
+            current = np.array([record['keypoints'][name] for name in shared], dtype=float)
+            before = np.array([previous['keypoints'][name] for name in shared], dtype=float)
+            distance = np.linalg.norm(current - before, axis=1).mean()
+            distances.setdefault((previous['track_id'], record['track_id']), []).append(distance)
+
+    # Greedy assignment from the closest pair up
+    costs = sorted((np.mean(values), previousID, overlapID) for (previousID, overlapID), values in distances.items())
+    mapping = {}
+    used = set()
+    for cost, previousID, overlapID in costs:
+        if cost > maxDistance:
+            break
+        if overlapID in mapping or previousID in used:
+            continue
+        mapping[overlapID] = previousID
+        used.add(previousID)
+    return mapping
+
+# Joins the chunk videos with ffmpeg's concat demuxer, streams are copied not re-encoded
+def concatenateSegments(segmentPaths, outputPath):
+    listPath = os.path.splitext(outputPath)[0] + '_segments.txt'
+    with open(listPath, 'w') as f:
+        for segmentPath in segmentPaths:
+            f.write(f"file '{os.path.abspath(segmentPath)}'\n")
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                        '-i', listPath, '-c', 'copy', outputPath], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        # Segments are left in place so the video can still be joined by hand
+        print(json.dumps(f"Error: Could not join pose video segments: {e}", indent=2))
+        return False
+    finally:
+        os.remove(listPath)
+    for segmentPath in segmentPaths:
+        os.remove(segmentPath)
+    return True
+
+def getPoseDataPath(videoPath):
     match_id = getMatchIDFromVideo(videoPath)    
-    # Store frame data as msgpack
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_dir = os.path.join(script_dir, '..', '..', 'poseEstimationData')
     os.makedirs(output_dir, exist_ok=True)
-    filesave = os.path.join(output_dir, f'{match_id}.msgpack')
+    return os.path.join(output_dir, f'{match_id}.msgpack')
+
+# Streams to a .part file so the server only sees <match_id>.msgpack once it is complete,
+# a crashed run keeps everything up to the last flush in the .part file
+def openPoseDataSink(videoPath, flushEvery):
+    return PoseDataWriter(getPoseDataPath(videoPath) + '.part', flushEvery)
+
+def finishPoseDataSink(sink, videoPath):
+    dataPath = getPoseDataPath(videoPath)
+    columns = framesToColumns(iter_pose_records(sink.file_path), count=sink.count)
+    write_pose_store(getPoseStorePath(dataPath), columns)
+    load_pose_index(dataPath, columns)
+    os.replace(sink.file_path, dataPath)
+    return dataPath
+
+# Moves finished records from frameData into the sink, frameData is left empty
+def drainFrameData(frameData, sink, frameCount):
+    if sink is None:
+        return
+    sink.extend(frameData)
+    frameData.clear()
+    sink.framesDone(frameCount)
+
+def store_pose_estimation_data(frameData, videoPath):
+    match_id = getMatchIDFromVideo(videoPath)    
+    # Store frame data as msgpack
+    filesave = getPoseDataPath(videoPath)
+    # Columnar copy for the analytics scripts, written first so the msgpack the server
+    # checks for only appears once both files are there
+    columns = framesToColumns(frameData)
+    write_pose_store(getPoseStorePath(filesave), columns)
+    load_pose_index(filesave, columns)
           
     with open(filesave, 'wb') as f:
         packed_data = msgpack.packb(frameData, use_bin_type=True)
         f.write(packed_data)
     return match_id
 
-def videoWriter(cap,videoPath,model_path):
+def videoWriter(cap, videoPath, model, confThresh, modelClass, batchSize=1, pipelined=False, queueSize=32,
+                stride=1, targetFps=None, adaptive=False, maxStride=8, motionThreshold=0.2,
+                outputPath=None, maxFrames=None, sink=None):
     match_id = getMatchIDFromVideo(videoPath)
-    model = YOLO(model_path)    
-    confThresh = 0.80
-    modelClass = [0]
     # Capture video properties
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -70,31 +280,309 @@ def videoWriter(cap,videoPath,model_path):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_dir = os.path.join(script_dir, '..', '..', 'poseOutputVideo')
     os.makedirs(output_dir, exist_ok=True)
-    filesave = os.path.join(output_dir, f'{match_id}.mp4')
+    filesave = outputPath or os.path.join(output_dir, f'{match_id}.mp4')
     # Initialise VideoWriter
     fourcc = cv2.VideoWriter_fourcc(*'H264')    # Use MJPG for speed
     out = cv2.VideoWriter(filesave, fourcc, fps, (frame_width, frame_height))
     frameData = []    
 
-    while True:
+    # A target fps is turned into a fixed stride for this video
+    if targetFps:
+        stride = max(1, round(fps / targetFps))
+    sampler = FrameSampler(stride, adaptive, maxStride, motionThreshold)
+    interpolator = KeypointInterpolator()
+
+    if pipelined:
+        runPipeline(cap, model, confThresh, modelClass, batchSize, queueSize, frameData, out, sampler, interpolator, maxFrames, sink)
+        # Release VideoWriter
+        out.release()
+        return frameData
+
+    # Frames are buffered and sent to the model together, batchSize=1 is the old frame by frame loop.
+    # batchSize counts inferred frames, skipped frames wait in the buffer to keep output order.
+    # The buffer is run early once it holds batchFrames frames
+    batchFrames = max(batchSize, MAX_BATCH_FRAMES)
+    batchItems = []
+    inferCount = 0
+    framesRead = 0
+
+    # maxFrames stops early when only part of the video is processed
+    while maxFrames is None or framesRead < maxFrames:
         ret, frame = cap.read()
         if not ret:
             break        
         #resized_frame = cv2.resize(frame, (320, 320))        
         
-        frameTimestamp = getFrameTimestamp(cap)        
-        detection = getDetection(model, frame, confThresh, modelClass)
-        if detection is None:
-            continue        
-        # Process the detection and store it in frameData
-        processDetection(detection, frameTimestamp, frameData, frame)        
-        out.write(frame)   
+        framesRead += 1
+        infer = sampler.shouldInfer()
+        batchItems.append((frame, getFrameTimestamp(cap), infer))
+        inferCount += infer
+        if inferCount < batchSize and len(batchItems) < batchFrames:
+            continue
+        processBatch(model, batchItems, confThresh, modelClass, frameData, out, sampler, interpolator)
+        drainFrameData(frameData, sink, len(batchItems))
+        batchItems = []
+        inferCount = 0
+    # Flush the last partial batch
+    if batchItems:
+        processBatch(model, batchItems, confThresh, modelClass, frameData, out, sampler, interpolator)
+    interpolator.finish(out)
+    drainFrameData(frameData, sink, len(batchItems))
     # Release VideoWriter
     out.release()
     return frameData
 
+def processBatch(model, batchItems, confThresh, modelClass, frameData, out, sampler, interpolator):
+    inferred = inferBatch(model, batchItems, confThresh, modelClass, sampler)
+    if inferred is None:
+        return
+    for frame, frameTimestamp, result in inferred:
+        writeFrame(frame, frameTimestamp, result, frameData, out, interpolator)
+
+# Runs one forward pass over the frames of a batch that are due for inference, results come back
+# in frame order so ByteTrack still associates one frame at a time. Skipped frames get a None result
+def inferBatch(model, batchItems, confThresh, modelClass, sampler):
+    frames = [frame for frame, _, infer in batchItems if infer]
+    if not frames:
+        return [(frame, frameTimestamp, None) for frame, frameTimestamp, _ in batchItems]
+    detections = getDetection(model, frames, confThresh, modelClass)
+    if detections is None:
+        return None
+    results = iter(detections)
+    inferred = []
+    for frame, frameTimestamp, infer in batchItems:
+        result = next(results) if infer else None
+        if infer:
+            sampler.update(result, frameTimestamp)
+        inferred.append((frame, frameTimestamp, result))
+    return inferred
+
+def writeFrame(frame, frameTimestamp, result, frameData, out, interpolator):
+    if result is None:
+        # Held back until the next inferred frame so its keypoints can be interpolated
+        interpolator.skip(frame, frameTimestamp)
+        return
+    start = len(frameData)
+    # Process the detection and store it in frameData
+    processDetection([result], frameTimestamp, frameData, frame)
+    # Writes the skipped frames before this one and slots their records in ahead of this frame's
+    interpolator.flush(frameData, start, frameTimestamp, out)
+    out.write(frame)
+
+# Three stage pipeline: decoder thread -> inference (this thread) -> annotate and encode thread.
+# OpenCV releases the GIL while decoding and encoding so both overlap with inference.
+# Each stage is a single thread reading a FIFO queue so frame and frameData order match the sequential loop.
+def runPipeline(cap, model, confThresh, modelClass, batchSize, queueSize, frameData, out, sampler, interpolator,
+                maxFrames=None, sink=None):
+    # Bounded queues give backpressure, a full queue blocks the stage feeding it
+    decodeQueue = queue.Queue(maxsize=queueSize)
+    encodeQueue = queue.Queue(maxsize=queueSize)
+    stop = threading.Event()
+    errors = []
+
+    decoder = threading.Thread(target=decodeFrames, args=(cap, decodeQueue, stop, errors, maxFrames), daemon=True)
+    writer = threading.Thread(target=encodeFrames, args=(encodeQueue, frameData, out, interpolator, sink, stop, errors), daemon=True)
+    decoder.start()
+    writer.start()
+    try:
+        finished = False
+        batchFrames = max(batchSize, MAX_BATCH_FRAMES)
+        while not finished and not stop.is_set():
+            batchItems = []
+            inferCount = 0
+            while inferCount < batchSize and len(batchItems) < batchFrames:
+                item = getUnlessStopped(decodeQueue, stop)
+                if item is None:
+                    finished = True
+                    break
+                infer = sampler.shouldInfer()
+                batchItems.append((item[0], item[1], infer))
+                inferCount += infer
+            if not batchItems:
+                break
+            inferred = inferBatch(model, batchItems, confThresh, modelClass, sampler)
+            if inferred is None:
+                continue
+            for item in inferred:
+                putUnlessStopped(encodeQueue, item, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        # End of stream marker for the writer
+        putUnlessStopped(encodeQueue, None, stop)
+        writer.join()
+        stop.set()
+        decoder.join()
+    if errors:
+        raise errors[0]
+
+def decodeFrames(cap, decodeQueue, stop, errors, maxFrames=None):
+    try:
+        framesRead = 0
+        while not stop.is_set() and (maxFrames is None or framesRead < maxFrames):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            framesRead += 1
+            # Timestamp is read here so it belongs to the frame just decoded
+            putUnlessStopped(decodeQueue, (frame, getFrameTimestamp(cap)), stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        putUnlessStopped(decodeQueue, None, stop)
+
+def encodeFrames(encodeQueue, frameData, out, interpolator, sink, stop, errors):
+    try:
+        while True:
+            item = getUnlessStopped(encodeQueue, stop)
+            if item is None:
+                break
+            frame, frameTimestamp, result = item
+            writeFrame(frame, frameTimestamp, result, frameData, out, interpolator)
+            drainFrameData(frameData, sink, 1)
+        interpolator.finish(out)
+        drainFrameData(frameData, sink, 0)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
 
+# Queue helpers that give up once another stage has failed, so no thread waits forever
+def putUnlessStopped(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
+def getUnlessStopped(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+
+
+# Decides which frames go to the model. A fixed stride infers every Nth frame,
+# adaptive mode starts at stride and doubles up to maxStride while the players' boxes
+# move slower than motionThreshold (frame heights per second), dropping straight back when they speed up
+class FrameSampler:
+    def __init__(self, stride=1, adaptive=False, maxStride=8, motionThreshold=0.2):
+        self.minStride = max(1, stride)
+        self.maxStride = max(self.minStride, maxStride)
+        self.adaptive = adaptive
+        self.motionThreshold = motionThreshold
+        self.stride = self.minStride
+        self.framesSinceInference = None
+        self.previousCentres = None
+        self.previousTime = None
+
+    def shouldInfer(self):
+        if self.framesSinceInference is None or self.framesSinceInference + 1 >= self.stride:
+            self.framesSinceInference = 0
+            return True
+        self.framesSinceInference += 1
+        return False
+
+    def update(self, result, frameTimestamp):
+        if not self.adaptive:
+            return
+        frameTime = timestampToSeconds(frameTimestamp)
+        centres = getBoxCentres(result)
+        motion = None
+        if self.previousCentres is not None and frameTime > self.previousTime:
+            shared = [track_id for track_id in centres if track_id in self.previousCentres]
+            if shared:
+                motion = max(np.hypot(*(centres[track_id] - self.previousCentres[track_id])) for track_id in shared)
+                motion /= frameTime - self.previousTime
+        # Lost or new tracks are treated as fast movement so the tracker can reacquire them
+        if motion is None or motion > self.motionThreshold:
+            self.stride = self.minStride
+        elif motion < self.motionThreshold / 2:
+            self.stride = min(self.maxStride, self.stride * 2)
+        self.previousCentres = centres
+        self.previousTime = frameTime
+
+# Normalised box centres keyed by track id
+def getBoxCentres(result):
+    if result.boxes is None or result.boxes.id is None:
+        return {}
+    track_ids = result.boxes.id.cpu().numpy()
+    centres = result.boxes.xywhn.cpu().numpy()[:, :2]
+    return {int(track_id): centre for track_id, centre in zip(track_ids, centres)}
+
+# Holds skipped frames until the next inferred frame, then fills them with keypoints
+# interpolated between the inferred frames either side so the timeline stays uniform
+class KeypointInterpolator:
+    def __init__(self):
+        self.pending = []
+        self.previousRecords = []
+        self.previousTime = None
+
+    def skip(self, frame, frameTimestamp):
+        self.pending.append((frame, frameTimestamp))
+
+    def flush(self, frameData, start, frameTimestamp, out):
+        records = frameData[start:]
+        frameTime = timestampToSeconds(frameTimestamp)
+        interpolated = []
+        for frame, skippedTimestamp in self.pending:
+            if self.previousTime is not None:
+                skippedRecords = interpolateRecords(self.previousRecords, records, self.previousTime, frameTime, skippedTimestamp)
+                for record in skippedRecords:
+                    drawKeypointData(frame, record['keypoints'])
+                interpolated.extend(skippedRecords)
+            out.write(frame)
+        frameData[start:start] = interpolated
+        self.pending = []
+        self.previousRecords = records
+        self.previousTime = frameTime
+
+    # Frames after the last inferred frame have nothing to interpolate towards
+    def finish(self, out):
+        for frame, _ in self.pending:
+            out.write(frame)
+        self.pending = []
+
+def interpolateRecords(previousRecords, nextRecords, previousTime, nextTime, frameTimestamp):
+    frameTime = timestampToSeconds(frameTimestamp)
+    weight = (frameTime - previousTime) / (nextTime - previousTime) if nextTime > previousTime else 0.0
+    nextByTrack = {record['track_id']: record for record in nextRecords}
+    interpolated = []
+    for previous in previousRecords:
+        following = nextByTrack.get(previous['track_id'])
+        if following is None:
+            continue
+        keypointData = {}
+        for keypointName, (x0, y0) in previous['keypoints'].items():
+            if keypointName not in following['keypoints']:
+                continue
+            x1, y1 = following['keypoints'][keypointName]
+            keypointData[keypointName] = [int(round(x0 + (x1 - x0) * weight)), int(round(y0 + (y1 - y0) * weight))]
+        interpolated.append({
+            'track_id': previous['track_id'],
+            'timestamp': frameTimestamp,
+            'keypoints': keypointData,
+            'interpolated': True
+        })
+    return interpolated
+
+# Same colours as extractKeypointData
+def drawKeypointData(frame, keypointData):
+    for keypointName, point in keypointData.items():
+        if keypointName == 'HIP':
+            colour = (255, 0, 0)
+        elif keypointName == 'HEAD':
+            colour = (0, 0, 255)
+        else:
+            colour = (0, 255, 0)
+        cv2.circle(frame, tuple(point), 3, colour, -1)
 
 def initialiseVideoCapture(videoPath):
     cap = cv2.VideoCapture(videoPath)
@@ -103,13 +591,17 @@ def initialiseVideoCapture(videoPath):
         return None
     return cap
 
+def timestampToSeconds(frameTimestamp):
+    return float(frameTimestamp.rstrip('s'))
+
 def getFrameTimestamp(cap):
     frameTimestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000  
     return f"{frameTimestamp:.2f}s"
 
-def getDetection(model, frame, confThresh, modelClass):
+# frames can be a single frame or a list of frames, a list is inferred as one batch
+def getDetection(model, frames, confThresh, modelClass):
 
-    return model.track(frame,
+    return model.track(frames,
                         classes=modelClass,
                         conf=confThresh,
                         show=False,
@@ -183,16 +675,51 @@ def getMatchIDFromVideo(video_path):
     return match_id   
  
 
-def load_pose_estimation_data(file_path):
+# columnar=True returns PoseColumns, memory mapped from the .pose store when it exists
+def load_pose_estimation_data(file_path, columnar=False):
+    if columnar:
+        return load_pose_columns(file_path)
     with open(file_path, 'rb') as f:
         packed_data = f.read()
         data = msgpack.unpackb(packed_data, raw=False)
     return data
 
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description='Run YOLO pose estimation over a match video.')
+    parser.add_argument('videoPath')
+    # Options are only passed on when given so the defaults live in videoWriter
+    parser.add_argument('--batch', dest='batchSize', type=int, default=argparse.SUPPRESS,
+                        help='Number of frames sent to the model per forward pass')
+    parser.add_argument('--pipeline', dest='pipelined', action='store_true', default=argparse.SUPPRESS,
+                        help='Overlap decoding, inference and encoding on separate threads')
+    parser.add_argument('--stride', type=int, default=argparse.SUPPRESS,
+                        help='Only infer every Nth frame, skipped frames get interpolated keypoints')
+    parser.add_argument('--target-fps', dest='targetFps', type=float, default=argparse.SUPPRESS,
+                        help='Infer at roughly this many frames per second, overrides --stride')
+    parser.add_argument('--adaptive', action='store_true', default=argparse.SUPPRESS,
+                        help='Raise the stride while players move slowly and drop it when they move fast')
+    parser.add_argument('--max-stride', dest='maxStride', type=int, default=argparse.SUPPRESS,
+                        help='Largest stride adaptive mode will use')
+    parser.add_argument('--workers', type=int, default=argparse.SUPPRESS,
+                        help='Split the video into this many chunks processed in parallel')
+    parser.add_argument('--overlap', dest='overlapSeconds', type=float, default=argparse.SUPPRESS,
+                        help='Seconds each chunk re-reads before its start to line up track ids')
+    parser.add_argument('--stream', action='store_true', default=argparse.SUPPRESS,
+                        help='Write pose records to disk while processing instead of holding them all in memory')
+    parser.add_argument('--flush-every', dest='flushEvery', type=int, default=argparse.SUPPRESS,
+                        help='Frames between flushes of the streamed pose data')
+    parser.add_argument('--queue-size', dest='queueSize', type=int, default=argparse.SUPPRESS,
+                        help='Frames each pipeline queue can hold before the stage feeding it waits')
+    return vars(parser.parse_args(argv))
+
 def main():
-    videoPath = sys.argv[1]  
+    options = parseArguments(sys.argv[1:])
+    videoPath = options.pop('videoPath')
     
-    frameData = process_video(videoPath)    
+    frameData = process_video(videoPath, **options)    
+    if options.get('stream'):
+        # Already written to poseEstimationData while the video was processed
+        return
     
     store_data = store_pose_estimation_data(frameData,videoPath)
     
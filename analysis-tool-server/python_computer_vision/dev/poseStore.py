@@ -0,0 +1,344 @@
+import os
+import json
+import struct
+import numpy as np
+import msgpack
+
+# Columnar pose store written next to <match_id>.msgpack as <match_id>.pose
+#
+# Layout: 8 byte magic, uint64 header length, JSON header, then one raw array per column.
+# Every array starts on a 64 byte boundary so it can be memory mapped straight from the file.
+#   times        float64 (N,)      seconds from the start of the video
+#   track_ids    int32   (N,)
+#   keypoints    int16   (N, K, 2) pixel coordinates, (0, 0) where missing
+#   valid        bool    (N, K)    keypoint was detected
+#   interpolated bool    (N,)      record was filled in between inferred frames
+POSE_STORE_EXTENSION = '.pose'
+POSE_STORE_MAGIC = b'SQPOSE01'
+POSE_STORE_VERSION = 1
+ALIGNMENT = 64
+
+# Every keypoint name poseEstimation.extractKeypointData can write, in tensor order
+KEYPOINT_NAMES = [
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW',
+    'LEFT_WRIST', 'RIGHT_WRIST', 'LEFT_HIP', 'RIGHT_HIP',
+    'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE',
+    'HIP', 'HEAD'
+]
+
+COLUMNS = ['times', 'track_ids', 'keypoints', 'valid', 'interpolated']
+
+# Time index written next to the pose data as <match_id>.poseindex.npz, see PoseIndex
+POSE_INDEX_EXTENSION = '.poseindex.npz'
+POSE_INDEX_VERSION = 1
+POSE_INDEX_ARRAYS = ['timeOrder', 'sortedTimes', 'trackOrder', 'trackTimes', 'tracks', 'trackStarts']
+
+
+class PoseStoreError(Exception):
+    """Exception raised when a pose store file is not in the expected format."""
+    def __init__(self, file, message="Not a pose store file"):
+        self.file = file
+        self.message = message
+        super().__init__(f"{message}: {file}")
+
+
+class PoseColumns:
+    def __init__(self, times, track_ids, keypoints, valid, interpolated, keypointNames=KEYPOINT_NAMES):
+        self.times = times
+        self.track_ids = track_ids
+        self.keypoints = keypoints
+        self.valid = valid
+        self.interpolated = interpolated
+        self.keypointNames = list(keypointNames)
+
+    def __len__(self):
+        return len(self.times)
+
+    def keypointIndex(self, keypointName):
+        return self.keypointNames.index(keypointName)
+
+    # Rebuilds the msgpack style dicts for code that still works record by record
+    def records(self):
+        for i in range(len(self.times)):
+            keypointData = {
+                self.keypointNames[k]: self.keypoints[i, k].tolist()
+                for k in np.flatnonzero(self.valid[i])
+            }
+            record = {
+                'track_id': int(self.track_ids[i]),
+                'timestamp': f"{self.times[i]:.2f}s",
+                'keypoints': keypointData
+            }
+            if self.interpolated[i]:
+                record['interpolated'] = True
+            yield record
+
+    # The given rows (a PoseIndex query result) as their own columns, read into memory
+    def take(self, rows):
+        return PoseColumns(*(np.asarray(getattr(self, name))[rows] for name in COLUMNS), self.keypointNames)
+
+
+# frameData can be any iterable of records, such as iter_pose_records, when count is given
+def framesToColumns(frameData, keypointNames=KEYPOINT_NAMES, count=None):
+    if count is None:
+        count = len(frameData)
+    nameIndex = {name: k for k, name in enumerate(keypointNames)}
+    times = np.empty(count, dtype=np.float64)
+    track_ids = np.empty(count, dtype=np.int32)
+    keypoints = np.zeros((count, len(keypointNames), 2), dtype=np.int16)
+    interpolated = np.zeros(count, dtype=bool)
+
+    for i, entry in enumerate(frameData):
+        times[i] = float(entry['timestamp'].rstrip('s'))
+        track_ids[i] = entry['track_id']
+        interpolated[i] = entry.get('interpolated', False)
+        for keypointName, point in entry['keypoints'].items():
+            k = nameIndex.get(keypointName)
+            if k is not None:
+                keypoints[i, k] = point
+
+    # (0, 0) is how the pose data marks a keypoint that was not found
+    valid = np.any(keypoints != 0, axis=2)
+    return PoseColumns(times, track_ids, keypoints, valid, interpolated, keypointNames)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_pose_store(file_path, columns):
+    arrays = {name: np.ascontiguousarray(getattr(columns, name)) for name in COLUMNS}
+    # Array offsets depend on the header length, so lay the arrays out relative to the data start first
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = {
+        'version': POSE_STORE_VERSION,
+        'count': len(columns),
+        'keypoints': columns.keypointNames,
+        'arrays': layout
+    }
+    headerBytes = json.dumps(header).encode('utf-8')
+    dataStart = _align(len(POSE_STORE_MAGIC) + 8 + len(headerBytes))
+
+    with open(file_path, 'wb') as f:
+        f.write(POSE_STORE_MAGIC)
+        f.write(np.uint64(len(headerBytes)).tobytes())
+        f.write(headerBytes)
+        position = len(POSE_STORE_MAGIC) + 8 + len(headerBytes)
+        for name, array in arrays.items():
+            start = dataStart + layout[name]['offset']
+            f.write(b'\0' * (start - position))
+            f.write(array.tobytes())
+            position = start + array.nbytes
+
+
+def load_pose_store(file_path):
+    with open(file_path, 'rb') as f:
+        if f.read(len(POSE_STORE_MAGIC)) != POSE_STORE_MAGIC:
+            raise PoseStoreError(file_path)
+        headerLength = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(headerLength).decode('utf-8'))
+    if header['version'] != POSE_STORE_VERSION:
+        raise PoseStoreError(file_path, f"Unsupported pose store version {header['version']}")
+
+    dataStart = _align(len(POSE_STORE_MAGIC) + 8 + headerLength)
+    arrays = {}
+    for name in COLUMNS:
+        spec = header['arrays'][name]
+        shape = tuple(spec['shape'])
+        if np.prod(shape) == 0:
+            # numpy cannot map a zero length region
+            arrays[name] = np.zeros(shape, dtype=spec['dtype'])
+        else:
+            arrays[name] = np.memmap(file_path, dtype=spec['dtype'], mode='r',
+                                     offset=dataStart + spec['offset'], shape=shape)
+    return PoseColumns(keypointNames=header['keypoints'], **arrays)
+
+
+def getPoseStorePath(dataPath):
+    return os.path.splitext(dataPath)[0] + POSE_STORE_EXTENSION
+
+
+# The columnar store for a pose data path if one has been written
+def find_pose_store(dataPath):
+    storePath = dataPath if dataPath.endswith(POSE_STORE_EXTENSION) else getPoseStorePath(dataPath)
+    if os.path.exists(storePath):
+        return storePath
+    return None
+
+
+# Columns for a match, memory mapped when the store exists, otherwise built from the legacy msgpack
+def load_pose_columns(dataPath):
+    storePath = find_pose_store(dataPath)
+    if storePath:
+        return load_pose_store(storePath)
+    return framesToColumns(iter_pose_records(dataPath), count=count_pose_records(dataPath))
+
+
+# Row numbers of a match's pose columns sorted by time, overall and per track, so a time window or
+# the record nearest a time is two binary searches instead of a pass over the whole match.
+#   timeOrder, sortedTimes    every row in time order and its time
+#   trackOrder, trackTimes    rows grouped by track, each track in time order
+#   tracks, trackStarts       track ids, the rows of tracks[i] are trackOrder[trackStarts[i]:trackStarts[i + 1]]
+class PoseIndex:
+    def __init__(self, timeOrder, sortedTimes, trackOrder, trackTimes, tracks, trackStarts):
+        self.timeOrder = np.asarray(timeOrder, dtype=np.int64)
+        self.sortedTimes = np.asarray(sortedTimes, dtype=np.float64)
+        self.trackOrder = np.asarray(trackOrder, dtype=np.int64)
+        self.trackTimes = np.asarray(trackTimes, dtype=np.float64)
+        self.tracks = np.asarray(tracks)
+        self.trackStarts = np.asarray(trackStarts, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.timeOrder)
+
+    # (rows, times) in time order, of one track or of every track when track is None
+    def _rows(self, track):
+        if track is None:
+            return self.timeOrder, self.sortedTimes
+        i = int(np.searchsorted(self.tracks, track))
+        if i == len(self.tracks) or self.tracks[i] != track:
+            return self.timeOrder[:0], self.sortedTimes[:0]
+        section = slice(self.trackStarts[i], self.trackStarts[i + 1])
+        return self.trackOrder[section], self.trackTimes[section]
+
+    # Rows with start <= time <= end in time order, an open end when start or end is None
+    def window(self, start=None, end=None, track=None):
+        rows, times = self._rows(track)
+        lo = 0 if start is None else np.searchsorted(times, start, side='left')
+        hi = len(times) if end is None else np.searchsorted(times, end, side='right')
+        return rows[lo:hi]
+
+    # Row whose time is closest to time, None when there are no rows
+    def nearest(self, time, track=None):
+        rows, times = self._rows(track)
+        if len(rows) == 0:
+            return None
+        i = int(np.searchsorted(times, time))
+        if i == len(times) or (i > 0 and time - times[i - 1] <= times[i] - time):
+            i -= 1
+        return int(rows[i])
+
+
+def build_pose_index(columns):
+    times = np.asarray(columns.times, dtype=np.float64)
+    track_ids = np.asarray(columns.track_ids)
+    timeOrder = np.argsort(times, kind='stable')
+    trackOrder = np.lexsort((times, track_ids))
+    tracks, trackStarts = np.unique(track_ids[trackOrder], return_index=True)
+    return PoseIndex(timeOrder, times[timeOrder], trackOrder, times[trackOrder],
+                     tracks, np.append(trackStarts, len(trackOrder)))
+
+
+def getPoseIndexPath(dataPath):
+    return os.path.splitext(dataPath)[0] + POSE_INDEX_EXTENSION
+
+
+def _signature(file_path):
+    stat = os.stat(file_path)
+    return [float(stat.st_size), stat.st_mtime]
+
+
+def save_pose_index(indexPath, index, signature):
+    with open(indexPath, 'wb') as f:
+        np.savez(f, version=POSE_INDEX_VERSION, signature=signature,
+                 **{name: getattr(index, name) for name in POSE_INDEX_ARRAYS})
+
+
+# The saved index when it was built from the pose data as it is now, otherwise a new one which is
+# saved. Pass the columns when they are already loaded so they are not read a second time
+def load_pose_index(dataPath, columns=None):
+    indexPath = getPoseIndexPath(dataPath)
+    try:
+        signature = _signature(find_pose_store(dataPath) or dataPath)
+    except OSError:
+        # No pose data on disk to tie a saved index to
+        return build_pose_index(columns if columns is not None else load_pose_columns(dataPath))
+    try:
+        with np.load(indexPath) as saved:
+            if int(saved['version']) == POSE_INDEX_VERSION and saved['signature'].tolist() == signature:
+                return PoseIndex(*(saved[name] for name in POSE_INDEX_ARRAYS))
+    except (OSError, KeyError, ValueError):
+        pass
+
+    index = build_pose_index(columns if columns is not None else load_pose_columns(dataPath))
+    try:
+        save_pose_index(indexPath, index, signature)
+    except OSError:
+        # Read only data folder, the index is rebuilt next time
+        pass
+    return index
+
+
+# Only the records of one time window (seconds, ends included) and optionally one track
+def load_pose_window(dataPath, start_time=None, end_time=None, track=None):
+    columns = load_pose_columns(dataPath)
+    return columns.take(load_pose_index(dataPath, columns).window(start_time, end_time, track))
+
+
+# Appends pose records to a msgpack file as they are produced instead of packing one list at the end.
+# The file is a single msgpack array (the legacy layout) whose array32 length is rewritten on every
+# flush, so after each flush it is a complete file any msgpack reader can load. Records are held in
+# memory only until the next flush, which happens every flushEvery frames.
+class PoseDataWriter:
+    def __init__(self, file_path, flushEvery=250):
+        self.file_path = file_path
+        self.flushEvery = flushEvery
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.pending = []
+        self.count = 0
+        self.framesSinceFlush = 0
+        self.file = open(file_path, 'wb')
+        self.file.write(b'\xdd' + struct.pack('>I', 0))
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def extend(self, records):
+        for record in records:
+            self.pending.append(self.packer.pack(record))
+
+    def framesDone(self, frameCount=1):
+        self.framesSinceFlush += frameCount
+        if self.framesSinceFlush >= self.flushEvery:
+            self.flush()
+
+    def flush(self):
+        self.file.write(b''.join(self.pending))
+        self.count += len(self.pending)
+        self.pending = []
+        self.framesSinceFlush = 0
+        # Length goes in last, a crash mid write leaves the old length so every counted record is still complete
+        self.file.seek(1)
+        self.file.write(struct.pack('>I', self.count))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+# Yields pose records one at a time from a msgpack array file, streamed or legacy, in constant memory
+def iter_pose_records(file_path):
+    with open(file_path, 'rb') as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        count = unpacker.read_array_header()
+        for _ in range(count):
+            yield unpacker.unpack()
+
+
+def count_pose_records(file_path):
+    with open(file_path, 'rb') as f:
+        return msgpack.Unpacker(f, raw=False).read_array_header()
@@ -0,0 +1,70 @@
+import sys
+import os
+import io
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from analysisWorker import (
+    getOperation,
+    runJob,
+    serve,
+    UnknownOperationError
+)
+
+# 1. Test if getOperation accepts both operation and script names.
+def test_getOperation_names():
+    fake_module = MagicMock()
+    with patch('analysisWorker.importlib.import_module', return_value=fake_module) as mock_import:
+        function, style, op = getOperation('velocity.py')
+    mock_import.assert_called_once_with('velocity')
+    assert function is fake_module.main
+    assert (style, op) == ('argv', 'velocity')
+    with pytest.raises(UnknownOperationError):
+        getOperation('not_a_script')
+
+# 2. Test if runJob runs an argv operation like a script and captures its output and stdin.
+def test_runJob_argv_operation():
+    def fake_main():
+        print(f"{sys.argv[1:]} {sys.stdin.read()}")
+
+    saved_argv = sys.argv
+    with patch('analysisWorker.getOperation', return_value=(fake_main, 'argv', 'velocity')):
+        reply = runJob({'id': 7, 'op': 'velocity', 'args': ['data.msgpack', 'left'], 'input': '[1, 2]'})
+    assert reply == {'id': 7, 'code': 0, 'stdout': "['data.msgpack', 'left'] [1, 2]\n", 'stderr': '', 'result': None}
+    assert sys.argv is saved_argv
+
+# 3. Test if runJob turns sys.exit and exceptions into exit codes instead of stopping the worker.
+@pytest.mark.parametrize("side_effect, expected_code", [
+    (SystemExit(0), 0),
+    (SystemExit(2), 2),
+    (SystemExit("Failed"), 1),
+    (ValueError("Bad data"), 1),
+])
+def test_runJob_failures(side_effect, expected_code):
+    with patch('analysisWorker.getOperation', return_value=(MagicMock(side_effect=side_effect), 'argv', 'velocity')):
+        reply = runJob({'id': 1, 'op': 'velocity', 'args': []})
+    assert reply['code'] == expected_code
+    if isinstance(side_effect, ValueError):
+        assert 'Bad data' in reply['stderr']
+
+# 4. Test if serve answers every job line, including call operations and invalid lines, in order.
+def test_serve_replies_in_order():
+    playerLocations = MagicMock(return_value='1 5')
+    jobs = io.StringIO(
+        json.dumps({'id': 1, 'op': 'playerLocations', 'args': [12, 'match']}) + '\n'
+        + '\n'
+        + 'not json\n'
+    )
+    replies = io.StringIO()
+    with patch('analysisWorker.getOperation', return_value=(playerLocations, 'call', 'playerLocations')):
+        serve(jobs, replies)
+    lines = [json.loads(line) for line in replies.getvalue().splitlines()]
+    assert len(lines) == 2
+    assert lines[0]['id'] == 1 and lines[0]['result'] == '1 5'
+    playerLocations.assert_called_once_with('12', 'match')
+    assert lines[1]['id'] is None and lines[1]['code'] == 1
@@ -21,7 +21,10 @@ from jointangles import (
     calculateAngleJoints,
     saveData,
     main,
-    getMatchIDFromVideo 
+    getMatchIDFromVideo,
+    calculateJointAngles,
+    loadTriplets,
+    JOINT_TRIPLETS
 )
 #1
 def test_extract_numeric_time():
@@ -231,4 +234,70 @@ def test_calculateAngleJoints_missing_keypoints():
         # 'LEFT_WRIST' is missing
     }
     with pytest.raises(KeyError):
-        calculateAngleJoints(keypointData, 'LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST', 'LEFT_ARM_ANGLE')
\ No newline at end of file
+        calculateAngleJoints(keypointData, 'LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST', 'LEFT_ARM_ANGLE')
+#13
+def test_calculateJointAngles_matches_calculateAngle():
+    keypointNames = ['SHOULDER', 'ELBOW', 'WRIST']
+    keypoints = np.array([
+        [[2, 0], [1, 0], [1, 1]],
+        [[3, 7], [5, 2], [9, 4]],
+        [[1, 1], [1, 1], [2, 2]],
+        [[2, 0], [1, 0], [np.nan, np.nan]],
+    ], dtype=float)
+    triplets = {'ARM': ('SHOULDER', 'ELBOW', 'WRIST')}
+    angles = calculateJointAngles(keypoints, keypointNames, triplets)['ARM']
+    assert angles[0] == pytest.approx(90.0)
+    assert angles[1] == pytest.approx(calculateAngle([3, 7], [5, 2], [9, 4]))
+    assert np.isnan(angles[2])
+    assert np.isnan(angles[3])
+#14
+def test_calculateJointAngles_midpoints():
+    keypointNames = ['LEFT', 'RIGHT', 'MIDDLE', 'END']
+    keypoints = np.array([[[0, 2], [2, 2], [1, 0], [1, -2]]], dtype=float)
+    triplets = {'LEAN': (['LEFT', 'RIGHT'], 'MIDDLE', 'END')}
+    angles = calculateJointAngles(keypoints, keypointNames, triplets)
+    assert angles['LEAN'][0] == pytest.approx(180.0)
+#15
+def test_main_missing_keypoints_are_null():
+    dataPath = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.msgpack')
+    sample_data = [{
+        'track_id': 1,
+        'timestamp': '0.50s',
+        'keypoints': {
+            'LEFT_SHOULDER': [2, 0],
+            'LEFT_ELBOW': [1, 0],
+            'LEFT_WRIST': [0, 0],
+        }
+    }]
+    mock_file = mock_open(read_data=msgpack.packb(sample_data, use_bin_type=True))
+    with patch('builtins.open', mock_file), \
+         patch('sys.argv', ['jointangles.py', dataPath]), \
+         patch('json.dump') as mock_json_dump, \
+         patch('os.makedirs'):
+        main()
+    angleDataList = mock_json_dump.call_args[0][0]
+    assert angleDataList[0]['timestamp'] == '0.50s'
+    assert angleDataList[0]['angles']['LEFT_ARM_ANGLE'] is None
+    assert angleDataList[0]['angles']['LEFT_ELBOW'] == [1, 0]
+#16
+def test_hip_angles_are_opt_in():
+    assert list(JOINT_TRIPLETS) == ['LEFT_ARM_ANGLE', 'RIGHT_ARM_ANGLE', 'LEFT_LEG_ANGLE', 'RIGHT_LEG_ANGLE']
+    triplets = loadTriplets(os.path.join(parent_dir, 'hipJointAngles.json'))
+    assert {name: triplets[name] for name in JOINT_TRIPLETS} == JOINT_TRIPLETS
+    keypointNames = ['LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE']
+    # Upright trunk over a thigh held out level, a right angle at the hips
+    keypoints = np.array([[[0, 0], [2, 0], [0, 4], [2, 4], [4, 4], [6, 4]]], dtype=float)
+    hipFlexion = {'HIP_FLEXION_ANGLE': triplets['HIP_FLEXION_ANGLE']}
+    assert calculateJointAngles(keypoints, keypointNames, hipFlexion)['HIP_FLEXION_ANGLE'][0] == pytest.approx(90.0)
+#17
+def test_main_dash_time_window():
+    for args, window in [(['-', '-', '12'], (None, 12.0)), (['-', '4.5', '-'], (4.5, None))]:
+        with patch('sys.argv', ['jointangles.py', 'path/to/data.msgpack'] + args), \
+             patch('jointangles.load_pose_window') as mock_window, \
+             patch('jointangles.keypointsWithNaN'), \
+             patch('jointangles.calculateJointAngles'), \
+             patch('jointangles.buildAngleDataList', return_value=[]), \
+             patch('jointangles.saveData') as mock_save:
+            main()
+        mock_window.assert_called_once_with('path/to/data.msgpack', *window)
+        mock_save.assert_called_once_with('path/to/data.msgpack', [])
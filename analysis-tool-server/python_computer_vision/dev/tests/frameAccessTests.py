@@ -0,0 +1,130 @@
+import sys
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+import numpy as np
+import cv2
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from frameAccess import (
+    FrameIndex,
+    FrameReader,
+    load_frame_index,
+    cached_frame_index,
+    open_reader,
+    getFrameIndexPath
+)
+
+
+# Short clip where frame i has a white band starting at column 8 * i, so a decoded frame tells which frame it is
+@pytest.fixture
+def numbered_video(tmp_path):
+    video_path = str(tmp_path / 'numbered.mp4')
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (320, 48))
+    for i in range(40):
+        frame = np.zeros((48, 320, 3), dtype=np.uint8)
+        frame[:, 8 * i:8 * i + 8] = 255
+        writer.write(frame)
+    writer.release()
+    if not os.path.exists(video_path) or os.path.getsize(video_path) == 0:
+        pytest.skip("No mp4v encoder available")
+    return video_path
+
+def frameNumber(frame):
+    return int(np.argmax(frame.mean(axis=(0, 2)).reshape(40, 8).mean(axis=1)))
+
+# 1. Test if FrameIndex picks the frame closest to a timestamp and the keyframe at or before a frame.
+def test_FrameIndex_lookups():
+    index = FrameIndex([0, 100, 200, 300], [0, 2], 10)
+    assert index.frameAt(0) == 0
+    assert index.frameAt(140) == 1
+    assert index.frameAt(160) == 2
+    assert index.frameAt(340) == 3
+    assert index.frameAt(400) is None
+    assert index.keyframeBefore(1) == 0
+    assert index.keyframeBefore(2) == 2
+    assert index.keyframeBefore(3) == 2
+    assert FrameIndex([], [], 10).frameAt(0) is None
+
+# 2. Test if the frame index is written next to the video and reused while the video is unchanged.
+def test_load_frame_index_is_cached(numbered_video):
+    index = load_frame_index(numbered_video)
+    assert len(index) == 40
+    assert index.keyframes[0] == 0
+    assert os.path.exists(getFrameIndexPath(numbered_video))
+
+    with patch('frameAccess.build_frame_index') as mock_build:
+        cached = load_frame_index(numbered_video)
+    mock_build.assert_not_called()
+    assert cached.times.tolist() == index.times.tolist()
+
+# 3. Test if FrameReader returns the right frame for timestamps in any order.
+def test_FrameReader_get_frame(numbered_video):
+    reader = FrameReader(numbered_video)
+    for timestamp in [0, 1500, 1210, 3900, 100, 2000, 2100, 2300]:
+        frame = reader.get_frame(timestamp)
+        assert frameNumber(frame) == round(timestamp / 100)
+    assert reader.get_frame(10000) is None
+    reader.release()
+
+# 4. Test if FrameReader.read continues from the last frame like VideoCapture.read.
+def test_FrameReader_read(numbered_video):
+    reader = FrameReader(numbered_video)
+    reader.get_frame(3700)
+    frames = []
+    while True:
+        ret, frame = reader.read()
+        if not ret:
+            break
+        frames.append(frameNumber(frame))
+    assert frames == [38, 39]
+    reader.release()
+
+# 5. Test if FrameReader answers by timestamp seeks before the index exists, and builds the index in the background.
+def test_FrameReader_without_index(numbered_video):
+    with patch('frameAccess.threading.Thread') as mock_thread:
+        reader = FrameReader(numbered_video)
+    mock_thread.return_value.start.assert_called_once()
+    assert reader.index is None
+    assert cached_frame_index(numbered_video) is None
+    for timestamp in [1500, 200, 3000]:
+        assert frameNumber(reader.get_frame(timestamp)) == round(timestamp / 100)
+    ret, frame = reader.read()
+    assert ret and frameNumber(frame) == 31
+
+    reader._build_index()
+    assert len(reader.index) == 40
+    assert cached_frame_index(numbered_video) is not None
+    assert frameNumber(reader.get_frame(1200)) == 12
+    reader.release()
+
+# 6. Test if the first read after the index arrives seeks instead of trusting the position from a timestamp seek.
+def test_FrameReader_index_arrives(numbered_video):
+    reader = FrameReader(numbered_video, build_index=False)
+    assert reader.indexing is None
+    assert frameNumber(reader.get_frame(1000)) == 10
+    assert reader.position is None
+    reader.index = load_frame_index(numbered_video)
+    reader.position = 11
+    reader.cap = MagicMock(wraps=reader.cap)
+    assert frameNumber(reader.get_frame(1100)) == 11
+    reader.cap.set.assert_called_once_with(cv2.CAP_PROP_POS_FRAMES, 11)
+    reader.cap.set.reset_mock()
+    assert frameNumber(reader.get_frame(1300)) == 13
+    reader.cap.set.assert_not_called()
+    reader.release()
+
+# 7. Test if open_reader only builds a missing index in the background when it is turned on.
+def test_open_reader_background_index(numbered_video):
+    with patch('frameAccess.threading.Thread') as mock_thread:
+        reader = open_reader(numbered_video)
+        mock_thread.assert_not_called()
+        reader.release()
+        os.utime(numbered_video, ns=(0, 0))
+        with patch('frameAccess.BUILD_INDEX_IN_BACKGROUND', True):
+            reader = open_reader(numbered_video)
+        mock_thread.return_value.start.assert_called_once()
+    assert frameNumber(reader.get_frame(500)) == 5
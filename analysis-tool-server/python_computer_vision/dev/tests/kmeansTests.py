@@ -0,0 +1,196 @@
+import sys
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+import json
+import numpy as np
+import cv2
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, '..', 'kmeans'))
+
+from kmeansplayerselection import (
+    Clustering,
+    twoMeans,
+    nearestCentre,
+    shirtCluster,
+    samplePixels,
+    pairColours,
+    sampleFrames,
+    colourHistogram,
+    HISTOGRAM_BINS,
+    TimeBudgetExceededError,
+    main
+)
+
+RED = (200, 30, 30)
+GREEN = (30, 160, 40)
+
+
+@pytest.fixture
+def clustering():
+    with patch('kmeansplayerselection.get_model'):
+        return Clustering('yolov8n.pt')
+
+def blob(colour, count, seed):
+    noise = np.random.default_rng(seed).integers(-8, 9, (count, 3))
+    return np.clip(np.array(colour) + noise, 0, 255).astype(np.uint8)
+
+# Crop of a player: background in the corners, shirt in the middle of the top half
+def playerCrop(shirt, background, height=40, width=20):
+    crop = np.empty((height, width, 3), dtype=np.uint8)
+    crop[:] = background
+    crop[4:height // 2 - 4, 4:width - 4] = shirt
+    return crop
+
+# 1. Test if twoMeans finds the centres of two well separated colour blobs and nearestCentre labels each blob.
+def test_twoMeans_two_blobs():
+    pixels = np.concatenate([blob(RED, 300, 0), blob(GREEN, 200, 1)])
+    centres = twoMeans(pixels)
+    order = np.argsort(centres[:, 0])[::-1]
+    assert np.allclose(centres[order], [pixels[:300].mean(axis=0), pixels[300:].mean(axis=0)])
+    labels = nearestCentre(pixels, centres)
+    assert len(set(labels[:300].tolist())) == 1
+    assert len(set(labels[300:].tolist())) == 1
+    assert labels[0] != labels[-1]
+
+# 2. Test if twoMeans on identical pixels gives that colour for both centres.
+def test_twoMeans_identical_pixels():
+    pixels = np.tile(np.array(RED, dtype=np.uint8), (50, 1))
+    centres = twoMeans(pixels)
+    assert not np.isnan(centres).any()
+    assert np.allclose(centres, [RED, RED])
+    assert twoMeans(pixels[:1]).tolist() == [list(RED), list(RED)]
+
+# 3. Test if the shirt cluster is the one most of the corners are not in, and sampling keeps at most maxPixels.
+def test_shirtCluster_and_samplePixels():
+    assert shirtCluster([0, 0, 0, 1]) == 1
+    assert shirtCluster([1, 1, 0, 1]) == 0
+    pixels = np.arange(30000).reshape(10000, 3)
+    assert len(samplePixels(pixels, 4096)) <= 4096
+    assert len(samplePixels(pixels[:10], 4096)) == 10
+
+# 4. Test if shirtColour picks the shirt over the background and returns only the shirt pixels.
+def test_shirtColour(clustering):
+    colour, pixels = clustering.shirtColour(playerCrop(RED, GREEN))
+    enhancedRed = clustering.enhanceImageColours(np.array([[RED]], dtype=np.uint8))[0, 0]
+    assert np.allclose(colour, enhancedRed, atol=1)
+    assert len(pixels) == 12 * 12
+    assert np.allclose(pixels, enhancedRed, atol=1)
+
+# 5. Test if tiny and single colour crops still give a colour and pixels.
+@pytest.mark.parametrize("shape", [(1, 1), (1, 3), (2, 2), (3, 1), (10, 10)])
+def test_shirtColour_tiny_crops(clustering, shape):
+    crop = np.empty(shape + (3,), dtype=np.uint8)
+    crop[:] = RED
+    colour, pixels = clustering.shirtColour(crop)
+    enhancedRed = clustering.enhanceImageColours(crop[:1, :1])[0, 0]
+    assert np.allclose(colour, enhancedRed)
+    assert len(pixels) > 0
+
+# 6. Test if an empty crop raises instead of clustering nothing.
+def test_shirtColour_empty_crop(clustering):
+    with pytest.raises(ValueError):
+        clustering.shirtColour(np.zeros((0, 5, 3), dtype=np.uint8))
+
+# Frame (BGR) with a red shirted player and a green shirted player, and a result whose first box is
+# the red one unless swapped
+def twoPlayerFrame(swapped=False):
+    frame = np.full((80, 100, 3), 128, dtype=np.uint8)
+    boxes = []
+    for left, (r, g, b) in [(10, RED), (60, GREEN)]:
+        frame[10:70, left:left + 20] = playerCrop((b, g, r), (128, 128, 128), 60, 20)
+        boxes.append([left, 10, left + 20, 70])
+    result = MagicMock()
+    result.boxes.xyxy = np.array(boxes[::-1] if swapped else boxes, dtype=float)
+    return frame, result
+
+# 7. Test if pairColours matches up players whose boxes come in swapped order and drops a frame that fits neither.
+def test_pairColours_swapped_players():
+    red, green, blue = np.array(RED), np.array(GREEN), np.array([20, 20, 220])
+    colours = np.array([
+        [red, green],
+        [green + 3, red - 2],
+        [red + 1, green + 1],
+        [green - 1, red + 2],
+        [blue, blue]
+    ], dtype=float)
+    keep, swapped, centres = pairColours(colours)
+    assert keep.tolist() == [0, 1, 2, 3]
+    assert swapped[:4].tolist() == [False, True, False, True]
+    assert np.allclose(centres, [red, green], atol=2)
+
+# 8. Test if colourHistogram is normalised and puts each pixel in its RGB bin.
+def test_colourHistogram():
+    pixels = np.array([[0, 0, 0], [255, 255, 255], [255, 255, 255], [40, 0, 200]], dtype=np.uint8)
+    histogram = colourHistogram(pixels)
+    assert histogram.shape == (HISTOGRAM_BINS ** 3,)
+    assert histogram.sum() == pytest.approx(1.0)
+    assert histogram[0] == pytest.approx(0.25)
+    assert histogram[-1] == pytest.approx(0.5)
+    binned = np.array([40, 0, 200]) * HISTOGRAM_BINS // 256
+    assert histogram[(binned[0] * HISTOGRAM_BINS + binned[1]) * HISTOGRAM_BINS + binned[2]] == pytest.approx(0.25)
+    assert colourHistogram(np.zeros((0, 3), dtype=np.uint8)).sum() == 0
+
+# 9. Test if colourSignatures keeps each player's colour and histogram together when the boxes swap between frames.
+def test_colourSignatures_swapped_boxes(clustering):
+    found = [twoPlayerFrame(), twoPlayerFrame(swapped=True), twoPlayerFrame()]
+    with patch('kmeansplayerselection.sampleFrames', return_value=[frame for frame, _ in found]), \
+         patch('kmeansplayerselection.framesWithTwoPlayers', return_value=found):
+        (redColour, redHistogram), (greenColour, greenHistogram) = clustering.colourSignatures('video.mp4', [0], 0.6)
+    enhance = lambda colour: clustering.enhanceImageColours(np.array([[colour]], dtype=np.uint8))[0, 0]
+    assert np.allclose(redColour, enhance(RED), atol=1)
+    assert np.allclose(greenColour, enhance(GREEN), atol=1)
+    for histogram, colour in [(redHistogram, redColour), (greenHistogram, greenColour)]:
+        assert histogram.sum() == pytest.approx(1.0)
+        assert np.argmax(histogram) == np.argmax(colourHistogram(colour.astype(np.uint8)[None]))
+
+# 10. Test if the signature mode prints both colours and normalised histograms as JSON.
+def test_main_signature_mode(tmp_path, capsys):
+    videoPath = str(tmp_path / 'match.mp4')
+    open(videoPath, 'wb').close()
+    histogram = np.zeros(HISTOGRAM_BINS ** 3)
+    histogram[[3, 7]] = 0.5
+    signatures = [(np.array([250.2, 0, 0]), histogram), (np.array([0, 200, 10.7]), histogram[::-1])]
+    with patch('sys.argv', ['kmeansplayerselection.py', videoPath, 'signature']), \
+         patch('kmeansplayerselection.get_model'), \
+         patch('os.makedirs'), \
+         patch.object(Clustering, 'colourSignatures', return_value=signatures) as mock_signatures:
+        main()
+    mock_signatures.assert_called_once()
+    players = json.loads(capsys.readouterr().out)
+    assert players['PlayerOne'] == [250, 0, 0]
+    assert players['PlayerTwo'] == [0, 200, 10]
+    assert players['HistogramBins'] == HISTOGRAM_BINS
+    assert sum(players['PlayerOneHistogram']) == pytest.approx(1.0)
+    assert sum(players['PlayerTwoHistogram']) == pytest.approx(1.0)
+
+# Short video whose frame i is filled with the value 10 * i, so a sampled frame tells its index
+def numberedVideo(tmp_path, count=20):
+    videoPath = str(tmp_path / 'match.avi')
+    writer = cv2.VideoWriter(videoPath, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(count):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    if not os.path.exists(videoPath) or os.path.getsize(videoPath) == 0:
+        pytest.skip("No MJPG encoder available")
+    return videoPath
+
+# 11. Test if the fallback search stops with TimeBudgetExceededError once the time budget has run out.
+def test_colourSignatures_time_budget(clustering, tmp_path):
+    videoPath = numberedVideo(tmp_path)
+    noPlayers = MagicMock()
+    noPlayers.boxes.xyxy = np.zeros((0, 4))
+    clustering.model.predict.return_value = [noPlayers]
+    with pytest.raises(TimeBudgetExceededError):
+        clustering.colourSignatures(videoPath, [0], 0.6, timeBudget=0)
+
+# 12. Test if sampleFrames reads the centre frame of each slice in order, and stops after one frame past the deadline.
+def test_sampleFrames(tmp_path):
+    videoPath = numberedVideo(tmp_path)
+    frames = sampleFrames(videoPath, 4)
+    assert [int(round(frame.mean() / 10)) for frame in frames] == [2, 7, 12, 17]
+    assert len(sampleFrames(videoPath, 4, deadline=0)) == 1
+    assert sampleFrames(str(tmp_path / 'missing.avi'), 4) == []
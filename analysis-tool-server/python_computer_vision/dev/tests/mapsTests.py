@@ -0,0 +1,189 @@
+import sys
+import os
+import pytest
+import numpy as np
+import cv2
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from mapsController import (
+    apply_homography,
+    transform_points,
+    movement_homography,
+    map_movements_to_court,
+    accumulate_heatmap,
+    assign_track_ids,
+    assign_player_ids_columns,
+    extract_significant_movements,
+    extract_significant_movements_columns,
+    MovementColumns
+)
+from poseStore import load_pose_columns, build_pose_index, load_pose_window
+import msgpack
+
+TEST_DATA = os.path.join(current_dir, 'testData', '66f93f9c728b890c58714882.msgpack')
+
+# Court corners on screen (top left, top right, bottom right, bottom left) and on the flat map
+SCREEN_CORNERS = [[402, 180], [880, 182], [1105, 650], [170, 646]]
+FLATMAP_CORNERS = [[0, 0], [640, 0], [640, 975], [0, 975]]
+
+@pytest.fixture
+def H():
+    return cv2.getPerspectiveTransform(np.float32(SCREEN_CORNERS), np.float32(FLATMAP_CORNERS))
+
+def homogeneous(H, point):
+    x, y, w = H @ np.array([point[0], point[1], 1.0])
+    return [x / w, y / w]
+
+# 1. Test if transform_points maps every point like the 3x3 homogeneous product and accepts no points.
+def test_transform_points(H):
+    points = np.random.default_rng(0).uniform(0, 1280, (50, 2))
+    expected = [homogeneous(H, point) for point in points]
+    assert np.allclose(transform_points(H, points), expected)
+    assert np.allclose(apply_homography(H, points[:1]).flatten(), expected[0])
+    assert transform_points(H, []).shape == (0, 2)
+
+# 2. Test if movement_homography returns columns in movement order with the court corners landing on the flat map corners.
+def test_movement_homography_columns(H):
+    movements = [
+        {'track_id': 1, 'timestamp': '0.10s', 'mid_point': [402, 180]},
+        {'track_id': 2, 'timestamp': '0.10s', 'mid_point': [1105, 650]},
+        {'track_id': 1, 'timestamp': '0.20s', 'mid_point': [640, 500]}
+    ]
+    transformed = movement_homography(movements, H)
+    assert isinstance(transformed, MovementColumns)
+    assert transformed.times.tolist() == [0.1, 0.1, 0.2]
+    assert transformed.timestamps == ['0.10s', '0.10s', '0.20s']
+    assert transformed.track_ids.tolist() == [1, 2, 1]
+    assert np.allclose(transformed.points[:2], [[0, 0], [640, 975]], atol=1e-3)
+    assert np.allclose(map_movements_to_court(movements, H), transformed.points)
+    assert transformed.trackOrder().tolist() == [1, 2]
+
+# 3. Test if accumulate_heatmap adds each weight to the square around int(position), clipped to the court.
+@pytest.mark.parametrize("radius", [0, 1, 3])
+def test_accumulate_heatmap(radius):
+    positions = [[0.9, 0.9], [-0.5, 4.2], [19.99, 29.5], [-2, 12], [22, 31], [10, 10]]
+    weights = [1, 2, 0.5, 1, 3, 1]
+    expected = np.zeros((30, 20), dtype=np.float32)
+    for (x, y), weight in zip(positions, weights):
+        x, y = int(x), int(y)
+        expected[max(y - radius, 0):max(y + radius + 1, 0), max(x - radius, 0):max(x + radius + 1, 0)] += weight
+
+    heatmap = accumulate_heatmap(np.array(positions), 20, 30, radius=radius, weights=np.array(weights))
+    assert heatmap.dtype == np.float32 and heatmap.shape == (30, 20)
+    assert np.allclose(heatmap, expected)
+    assert np.array_equal(accumulate_heatmap(positions, 20, 30, radius=radius),
+                          accumulate_heatmap(positions, 20, 30, radius=radius, weights=np.ones(6)))
+    assert accumulate_heatmap([], 20, 30, radius=radius).sum() == 0
+
+def record(timestamp, track_id, x, y=500):
+    return {'track_id': track_id, 'timestamp': timestamp,
+            'keypoints': {'LEFT_ANKLE': [x, y], 'RIGHT_ANKLE': [x + 20, y]}}
+
+# 4. Test if two detections in one frame are matched to both players, even when both are closest to player 1.
+def test_assign_track_ids_one_player_per_frame():
+    data = [
+        record('0.00s', 7, 100),
+        record('0.00s', 8, 600),
+        # Both near player 1, the one further right is the better match for player 2
+        record('0.04s', 8, 110),
+        record('0.04s', 7, 300),
+        record('0.08s', 7, 305),
+        record('0.08s', 8, 112)
+    ]
+    assert [r['track_id'] for r in assign_track_ids(data)] == [1, 2, 1, 2, 2, 1]
+
+# 5. Test if a detection without keypoints takes the player of the next detection that has them, within the look ahead.
+def test_assign_track_ids_look_ahead():
+    empty = {'track_id': 9, 'timestamp': '0.08s', 'keypoints': {'LEFT_ANKLE': [0, 0]}}
+    data = [record('0.00s', 7, 100), record('0.04s', 8, 600), empty, record('0.12s', 8, 590)]
+    assert [r['track_id'] for r in assign_track_ids(data)] == [1, 2, 2, 2]
+
+    # The first of 11 detections without keypoints is one row too far from the next one with them
+    empties = [dict(empty, timestamp=f'{0.08 + 0.04 * i:.2f}s') for i in range(11)]
+    data = assign_track_ids([record('0.00s', 7, 100), record('0.04s', 8, 600)] + empties + [record('0.52s', 8, 590)])
+    assert data[2]['track_id'] is None
+    assert [r['track_id'] for r in data[3:]] == [2] * 11
+
+# 6. Test if the columnar assignment gives the same players as the record based one.
+def test_assign_player_ids_columns_matches_records():
+    with open(TEST_DATA, 'rb') as f:
+        data = msgpack.unpackb(f.read())
+    from_records = [r['track_id'] or 0 for r in assign_track_ids(data)]
+    assert assign_player_ids_columns(load_pose_columns(TEST_DATA)).tolist() == from_records
+
+# 7. Test if a player's ankles are only compared with that player's previous record.
+def test_extract_significant_movements_per_player():
+    data = [
+        record('0.00s', 1, 100),
+        record('0.00s', 2, 600),
+        record('0.04s', 1, 102),
+        record('0.04s', 2, 640),
+        {'track_id': 1, 'timestamp': '0.08s', 'keypoints': {'LEFT_ANKLE': [130, 510]}},
+        record('0.08s', None, 900)
+    ]
+    movements = extract_significant_movements(data)
+    assert isinstance(movements, MovementColumns)
+    assert movements.timestamps == ['0.04s', '0.08s']
+    assert movements.track_ids.tolist() == [2, 1]
+    assert movements.points.tolist() == [[650, 500], [130, 510]]
+
+# 8. Test if start_time and end_time keep only the records inside the window, ends included.
+def test_extract_significant_movements_window():
+    data = [record(f'{i * 0.5:.2f}s', 1, 100 + 10 * i) for i in range(10)]
+    movements = extract_significant_movements(data, start_time=1.0, end_time=3.0)
+    # The first record in the window has nothing earlier in the window to move from
+    assert movements.times.tolist() == [1.5, 2.0, 2.5, 3.0]
+    assert extract_significant_movements(data, start_time=5.0).times.tolist() == []
+
+# 9. Test if the columnar movements match the record based ones.
+def test_extract_significant_movements_columns_matches_records():
+    with open(TEST_DATA, 'rb') as f:
+        data = assign_track_ids(msgpack.unpackb(f.read()))
+    columns = load_pose_columns(TEST_DATA)
+    from_records = extract_significant_movements(data)
+    from_columns = extract_significant_movements_columns(columns, assign_player_ids_columns(columns))
+    assert from_columns.timestamps == from_records.timestamps
+    assert from_columns.track_ids.tolist() == from_records.track_ids.tolist()
+    assert np.allclose(from_columns.points, from_records.points)
+
+# 10. Test if a window found through the pose index gives the same movements as the one found by time.
+def test_extract_significant_movements_columns_index_window():
+    columns = load_pose_columns(TEST_DATA)
+    player_ids = assign_player_ids_columns(columns)
+    start, end = np.quantile(columns.times, [0.25, 0.6])
+    byTime = extract_significant_movements_columns(columns, player_ids, start_time=start, end_time=end)
+    byIndex = extract_significant_movements_columns(columns, player_ids, start_time=start, end_time=end,
+                                                    index=build_pose_index(columns))
+    assert len(byIndex) > 0
+    assert byIndex.timestamps == byTime.timestamps
+    assert byIndex.track_ids.tolist() == byTime.track_ids.tolist()
+    assert np.allclose(byIndex.points, byTime.points)
+    assert ((byIndex.times >= start) & (byIndex.times <= end)).all()
+
+# 11. Test if the columns of a loaded window hold only that window's records, in time order.
+def test_load_pose_window_for_movements(tmp_path):
+    dataPath = str(tmp_path / 'match.msgpack')
+    with open(TEST_DATA, 'rb') as source, open(dataPath, 'wb') as f:
+        f.write(source.read())
+    columns = load_pose_columns(dataPath)
+    start, end = np.quantile(columns.times, [0.25, 0.6])
+    window = load_pose_window(dataPath, start, end)
+    assert len(window) == np.count_nonzero((columns.times >= start) & (columns.times <= end))
+    assert (np.diff(window.times) >= 0).all()
+    movements = extract_significant_movements_columns(window, assign_player_ids_columns(window))
+    assert ((movements.times >= start) & (movements.times <= end)).all()
+
+# 12. Test if a keypoint on the frame edge (one coordinate 0) is used, and a third detection in a frame is left out.
+def test_assign_track_ids_edge_keypoints():
+    edge = lambda timestamp, x, y: {'track_id': None, 'timestamp': timestamp, 'keypoints': {'LEFT_ANKLE': [x, y]}}
+    data = [
+        edge('0.00s', 0, 500),
+        edge('0.00s', 600, 500),
+        edge('0.04s', 600, 498),
+        edge('0.04s', 1000, 0),
+        edge('0.04s', 0, 503)
+    ]
+    assert [r['track_id'] for r in assign_track_ids(data)] == [1, 2, 2, None, 1]
@@ -0,0 +1,75 @@
+import sys
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import modelRegistry
+from modelRegistry import (
+    get_model,
+    export_model,
+    getExportPath,
+    reset_tracking,
+    UnknownModelFormatError
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    modelRegistry._models.clear()
+    yield
+    modelRegistry._models.clear()
+
+@pytest.fixture
+def weights(tmp_path):
+    model_path = tmp_path / 'yolov8n.pt'
+    model_path.write_bytes(b'weights')
+    return str(model_path)
+
+# 1. Test if get_model loads a model once and hands the same instance to every later caller.
+def test_get_model_is_cached(weights):
+    with patch('modelRegistry.YOLO') as mock_YOLO:
+        first = get_model(weights, 'pytorch')
+        second = get_model(weights, 'pytorch')
+    mock_YOLO.assert_called_once_with(weights)
+    assert first is second
+    with pytest.raises(UnknownModelFormatError):
+        get_model(weights, 'tensorrt')
+
+# 2. Test if an export at least as new as the weights is reused instead of exported again.
+def test_export_model_reuses_export(weights):
+    model = MagicMock()
+    model.export.return_value = getExportPath(weights, 'onnx')
+    assert export_model(model, weights, 'onnx') == getExportPath(weights, 'onnx')
+    model.export.assert_called_once_with(format='onnx', dynamic=True)
+
+    open(getExportPath(weights, 'onnx'), 'wb').close()
+    model.export.reset_mock()
+    assert export_model(model, weights, 'onnx') == getExportPath(weights, 'onnx')
+    model.export.assert_not_called()
+
+# 3. Test if an exported model is loaded with the task of the weights, and the weights are used when exporting fails.
+def test_get_model_exported_and_fallback(weights):
+    pytorch_model = MagicMock(task='pose')
+    pytorch_model.export.return_value = getExportPath(weights, 'onnx')
+    with patch('modelRegistry.YOLO', side_effect=[pytorch_model, 'onnx model']) as mock_YOLO:
+        assert get_model(weights, 'onnx') == 'onnx model'
+    mock_YOLO.assert_called_with(getExportPath(weights, 'onnx'), task='pose')
+
+    pytorch_model.export.side_effect = ImportError('openvino is not installed')
+    with patch('modelRegistry.YOLO', return_value=pytorch_model):
+        assert get_model(weights, 'openvino') is pytorch_model
+
+# 4. Test if reset_tracking resets every tracker and accepts a model that has not tracked yet.
+def test_reset_tracking():
+    model = MagicMock()
+    model.predictor.trackers = [MagicMock(), MagicMock()]
+    reset_tracking(model)
+    for tracker in model.predictor.trackers:
+        tracker.reset.assert_called_once()
+
+    model.predictor = None
+    reset_tracking(model)
@@ -0,0 +1,180 @@
+import sys
+import os
+import msgpack
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import pytest
+import numpy as np
+
+from poseStore import (
+    KEYPOINT_NAMES,
+    PoseStoreError,
+    framesToColumns,
+    write_pose_store,
+    load_pose_store,
+    load_pose_columns,
+    find_pose_store,
+    getPoseStorePath,
+    PoseDataWriter,
+    iter_pose_records,
+    count_pose_records,
+    build_pose_index,
+    load_pose_index,
+    load_pose_window,
+    getPoseIndexPath
+)
+from unittest.mock import patch
+
+SAMPLE_FRAMES = [
+    {'track_id': 1, 'timestamp': '0.00s', 'keypoints': {'LEFT_WRIST': [10, 20], 'HIP': [100, 200]}},
+    {'track_id': 2, 'timestamp': '0.00s', 'keypoints': {'HEAD': [300, 40]}},
+    {'track_id': 1, 'timestamp': '0.04s', 'keypoints': {'LEFT_WRIST': [12, 21], 'HIP': [101, 200]}, 'interpolated': True},
+]
+
+# 1. Test if framesToColumns builds the time, track id, keypoint and validity arrays.
+def test_framesToColumns_builds_arrays():
+    columns = framesToColumns(SAMPLE_FRAMES)
+
+    assert columns.times.tolist() == [0.0, 0.0, 0.04]
+    assert columns.track_ids.tolist() == [1, 2, 1]
+    assert columns.keypoints.shape == (3, len(KEYPOINT_NAMES), 2)
+    assert columns.keypoints.dtype == np.int16
+    wrist = columns.keypointIndex('LEFT_WRIST')
+    assert columns.keypoints[0, wrist].tolist() == [10, 20]
+    assert columns.valid[:, wrist].tolist() == [True, False, True]
+    assert columns.interpolated.tolist() == [False, False, True]
+
+# 2. Test if a written store loads back memory mapped with the same contents.
+def test_write_and_load_pose_store_round_trip(tmp_path):
+    store_path = str(tmp_path / 'match123.pose')
+    columns = framesToColumns(SAMPLE_FRAMES)
+
+    write_pose_store(store_path, columns)
+    loaded = load_pose_store(store_path)
+
+    assert isinstance(loaded.keypoints, np.memmap)
+    assert loaded.keypointNames == KEYPOINT_NAMES
+    for name in ['times', 'track_ids', 'keypoints', 'valid', 'interpolated']:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(columns, name))
+    assert list(loaded.records()) == SAMPLE_FRAMES
+
+# 3. Test if an empty match can be written and loaded.
+def test_pose_store_handles_empty_data(tmp_path):
+    store_path = str(tmp_path / 'empty.pose')
+    write_pose_store(store_path, framesToColumns([]))
+    loaded = load_pose_store(store_path)
+    assert len(loaded) == 0
+    assert loaded.keypoints.shape == (0, len(KEYPOINT_NAMES), 2)
+
+# 4. Test if load_pose_columns prefers the .pose store and falls back to the legacy msgpack.
+def test_load_pose_columns_fast_path_and_fallback(tmp_path):
+    data_path = str(tmp_path / 'match123.msgpack')
+    with open(data_path, 'wb') as f:
+        f.write(msgpack.packb(SAMPLE_FRAMES, use_bin_type=True))
+
+    assert find_pose_store(data_path) is None
+    legacy = load_pose_columns(data_path)
+    assert not isinstance(legacy.keypoints, np.memmap)
+    assert legacy.track_ids.tolist() == [1, 2, 1]
+
+    write_pose_store(getPoseStorePath(data_path), legacy)
+    assert find_pose_store(data_path) == str(tmp_path / 'match123.pose')
+    mapped = load_pose_columns(data_path)
+    assert isinstance(mapped.keypoints, np.memmap)
+    np.testing.assert_array_equal(mapped.keypoints, legacy.keypoints)
+
+# 5. Test if loading a file that is not a pose store raises PoseStoreError.
+def test_load_pose_store_rejects_other_files(tmp_path):
+    bad_path = str(tmp_path / 'bad.pose')
+    with open(bad_path, 'wb') as f:
+        f.write(b'not a pose store')
+    with pytest.raises(PoseStoreError):
+        load_pose_store(bad_path)
+
+# 6. Test if PoseDataWriter leaves a complete legacy msgpack array on disk after every flush.
+def test_PoseDataWriter_file_is_valid_after_each_flush(tmp_path):
+    data_path = str(tmp_path / 'match123.msgpack')
+    writer = PoseDataWriter(data_path, flushEvery=2)
+
+    writer.extend(SAMPLE_FRAMES[:2])
+    writer.framesDone()
+    # Not flushed yet, the file is still an empty array
+    with open(data_path, 'rb') as f:
+        assert msgpack.unpack(f, raw=False) == []
+
+    writer.framesDone()
+    with open(data_path, 'rb') as f:
+        assert msgpack.unpack(f, raw=False) == SAMPLE_FRAMES[:2]
+
+    writer.extend(SAMPLE_FRAMES[2:])
+    writer.close()
+    with open(data_path, 'rb') as f:
+        assert msgpack.unpack(f, raw=False) == SAMPLE_FRAMES
+    assert writer.count == 3
+
+# 7. Test if iter_pose_records streams both streamed and legacy files record by record.
+def test_iter_pose_records_reads_streamed_and_legacy_files(tmp_path):
+    streamed_path = str(tmp_path / 'streamed.msgpack')
+    with PoseDataWriter(streamed_path) as writer:
+        writer.extend(SAMPLE_FRAMES)
+
+    legacy_path = str(tmp_path / 'legacy.msgpack')
+    with open(legacy_path, 'wb') as f:
+        f.write(msgpack.packb(SAMPLE_FRAMES, use_bin_type=True))
+
+    for path in [streamed_path, legacy_path]:
+        records = iter_pose_records(path)
+        assert next(records) == SAMPLE_FRAMES[0]
+        assert list(records) == SAMPLE_FRAMES[1:]
+        assert count_pose_records(path) == 3
+
+# Two tracks, records slightly out of time order as chunk merges can leave them
+INDEX_FRAMES = [
+    {'track_id': 5, 'timestamp': f'{time:.2f}s', 'keypoints': {'HIP': [i + 1, 1]}}
+    for i, time in enumerate([0.0, 0.08, 0.04, 0.12, 0.16])
+] + [
+    {'track_id': 2, 'timestamp': f'{time:.2f}s', 'keypoints': {'HIP': [i + 1, 2]}}
+    for i, time in enumerate([0.04, 0.08, 0.2])
+]
+
+# 8. Test if PoseIndex answers window and nearest queries per track and over every track.
+def test_PoseIndex_window_and_nearest():
+    index = build_pose_index(framesToColumns(INDEX_FRAMES))
+    assert index.tracks.tolist() == [2, 5]
+    assert index.window(0.04, 0.12, track=5).tolist() == [2, 1, 3]
+    assert index.window(0.04, 0.08).tolist() == [2, 5, 1, 6]
+    assert index.window(start=0.15, track=2).tolist() == [7]
+    assert index.window(track=9).tolist() == []
+    assert index.nearest(0.07, track=5) == 1
+    assert index.nearest(0.06, track=5) == 2
+    assert index.nearest(1.0) == 7
+    assert index.nearest(0.0, track=9) is None
+
+# 9. Test if the index is saved next to the pose data and only rebuilt when the data changes.
+def test_load_pose_index_is_saved_and_reused(tmp_path):
+    data_path = str(tmp_path / 'match123.msgpack')
+    with open(data_path, 'wb') as f:
+        f.write(msgpack.packb(INDEX_FRAMES, use_bin_type=True))
+    index = load_pose_index(data_path)
+    assert os.path.exists(getPoseIndexPath(data_path))
+
+    with patch('poseStore.build_pose_index') as mock_build:
+        saved = load_pose_index(data_path)
+    mock_build.assert_not_called()
+    assert saved.trackOrder.tolist() == index.trackOrder.tolist()
+
+    write_pose_store(getPoseStorePath(data_path), framesToColumns(INDEX_FRAMES[:3]))
+    assert len(load_pose_index(data_path)) == 3
+
+# 10. Test if load_pose_window reads only the records of the window and track asked for.
+def test_load_pose_window(tmp_path):
+    data_path = str(tmp_path / 'match123.msgpack')
+    write_pose_store(getPoseStorePath(data_path), framesToColumns(INDEX_FRAMES))
+    window = load_pose_window(data_path, 0.05, 0.2, track=5)
+    assert window.times.tolist() == [0.08, 0.12, 0.16]
+    assert window.track_ids.tolist() == [5, 5, 5]
+    assert window.keypoints[:, window.keypointIndex('HIP'), 0].tolist() == [2, 4, 5]
+    assert len(load_pose_window(data_path)) == len(INDEX_FRAMES)
@@ -24,6 +24,12 @@ from poseEstimation import (
     load_pose_estimation_data,
     processDetection,
     videoWriter,
+    inferBatch,
+    interpolateRecords,
+    FrameSampler,
+    getChunkRanges,
+    matchOverlapTracks,
+    mergeChunks,
     main
 )
 
@@ -55,10 +61,10 @@ def test_initialiseVideoCapture_invalid_video():
 def test_process_video_initializes_yolo_correctly():
     video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
     
-    with patch('poseEstimation.YOLO') as mock_YOLO:
+    with patch('poseEstimation.get_model') as mock_get_model:
         # Mock the YOLO model initialization
         mock_model_instance = MagicMock()
-        mock_YOLO.return_value = mock_model_instance
+        mock_get_model.return_value = mock_model_instance
         
         # Mock initialiseVideoCapture to return a valid VideoCapture object
         with patch('poseEstimation.initialiseVideoCapture') as mock_init_video:
@@ -78,8 +84,8 @@ def test_process_video_initializes_yolo_correctly():
                 models_dir = os.path.join(script_dir, '..', 'models')
                 expected_model_path = os.path.join(models_dir, 'yolov8s-pose.pt')
                 
-                # Assert YOLO was initialized with the correct path
-                mock_YOLO.assert_called_with(expected_model_path)
+                # Assert the model was loaded from the correct path
+                mock_get_model.assert_called_with(expected_model_path)
                 
                 # Optionally, assert that the model was used in videoWriter
                 mock_video_writer.assert_called_with(
@@ -96,7 +102,7 @@ def test_process_video_initializes_yolo_correctly():
 def test_process_video_creates_output_directories():
     video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
 
-    with patch('poseEstimation.YOLO') as mock_YOLO, \
+    with patch('poseEstimation.get_model') as mock_get_model, \
          patch('poseEstimation.initialiseVideoCapture') as mock_init_video, \
          patch('poseEstimation.videoWriter') as mock_video_writer, \
          patch('os.path.exists') as mock_exists, \
@@ -104,7 +110,7 @@ def test_process_video_creates_output_directories():
 
         # Mock the YOLO model
         mock_model_instance = MagicMock()
-        mock_YOLO.return_value = mock_model_instance
+        mock_get_model.return_value = mock_model_instance
 
         # Mock VideoCapture
         mock_cap = MagicMock()
@@ -400,7 +406,7 @@ def test_main_with_valid_arguments(capsys):
 def test_process_video_handles_empty_video():
     video_path = os.path.join(TEST_DATA_FOLDER, 'empty_video.mp4')
     
-    with patch('poseEstimation.YOLO') as mock_YOLO, \
+    with patch('poseEstimation.get_model') as mock_get_model, \
          patch('poseEstimation.initialiseVideoCapture') as mock_init_video, \
          patch('poseEstimation.videoWriter') as mock_video_writer, \
          patch('os.path.exists') as mock_exists, \
@@ -408,7 +414,7 @@ def test_process_video_handles_empty_video():
         
         # Mock the YOLO model
         mock_model_instance = MagicMock()
-        mock_YOLO.return_value = mock_model_instance
+        mock_get_model.return_value = mock_model_instance
         
         # Mock VideoCapture to simulate empty video
         mock_cap = MagicMock()
@@ -445,7 +451,7 @@ def test_process_video_with_various_resolutions_and_formats(resolution, format_e
     video_filename = f'video_{resolution[0]}x{resolution[1]}.{format_ext}'
     video_path = os.path.join(TEST_DATA_FOLDER, video_filename)
     
-    with patch('poseEstimation.YOLO') as mock_YOLO, \
+    with patch('poseEstimation.get_model') as mock_get_model, \
          patch('poseEstimation.initialiseVideoCapture') as mock_init_video, \
          patch('poseEstimation.videoWriter') as mock_video_writer, \
          patch('os.path.exists') as mock_exists, \
@@ -453,7 +459,7 @@ def test_process_video_with_various_resolutions_and_formats(resolution, format_e
         
         # Mock the YOLO model
         mock_model_instance = MagicMock()
-        mock_YOLO.return_value = mock_model_instance
+        mock_get_model.return_value = mock_model_instance
         
         # Mock VideoCapture
         mock_cap = MagicMock()
@@ -478,3 +484,251 @@ def test_process_video_with_various_resolutions_and_formats(resolution, format_e
             [0]
         )
         assert frame_data == [{'track_id': 1, 'timestamp': '1.00s', 'keypoints': {'HIP': [320, 240]}}], "process_video should return correct frameData for various resolutions and formats."
+
+# 14. Test if videoWriter batches frames for inference and still processes them one at a time in order.
+def test_videoWriter_batches_frames_in_order():
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    mock_model = MagicMock()
+
+    mock_cap = MagicMock()
+    mock_cap.get.side_effect = lambda prop: {
+        cv2.CAP_PROP_FRAME_WIDTH: 640,
+        cv2.CAP_PROP_FRAME_HEIGHT: 480,
+        cv2.CAP_PROP_FPS: 30
+    }.get(prop, 0)
+
+    frames = [np.full((480, 640, 3), i, dtype=np.uint8) for i in range(3)]
+    mock_cap.read.side_effect = [(True, frame) for frame in frames] + [(False, None)]
+
+    with patch('poseEstimation.getDetection') as mock_get_detection, \
+         patch('poseEstimation.getFrameTimestamp', side_effect=['0.00s', '0.03s', '0.07s']), \
+         patch('poseEstimation.processDetection') as mock_process_detection, \
+         patch('cv2.VideoWriter') as mock_VideoWriter, \
+         patch('os.makedirs'):
+
+        results = [MagicMock(name=f'result{i}') for i in range(3)]
+        mock_get_detection.side_effect = [results[:2], results[2:]]
+        mock_out = MagicMock()
+        mock_VideoWriter.return_value = mock_out
+
+        frame_data = videoWriter(mock_cap, video_path, mock_model, 0.80, [0], batchSize=2)
+
+        # One forward pass for the full batch and one for the remaining frame
+        assert mock_get_detection.call_count == 2
+        assert [len(call.args[1]) for call in mock_get_detection.call_args_list] == [2, 1]
+
+        # Each result is handed to processDetection with its own frame and timestamp
+        processed = [(call.args[0][0], call.args[1]) for call in mock_process_detection.call_args_list]
+        assert processed == list(zip(results, ['0.00s', '0.03s', '0.07s']))
+        written = [call.args[0] for call in mock_out.write.call_args_list]
+        assert all(w is f for w, f in zip(written, frames)) and len(written) == 3
+        mock_out.release.assert_called_once()
+
+# 15. Test if the pipelined videoWriter keeps frame and frameData order identical to the sequential loop.
+@pytest.mark.parametrize("batchSize", [1, 2, 4])
+def test_videoWriter_pipelined_matches_sequential_order(batchSize):
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    frameCount = 7
+    timestamps = [f'{i / 30:.2f}s' for i in range(frameCount)]
+
+    def run(pipelined):
+        mock_cap = MagicMock()
+        mock_cap.get.side_effect = lambda prop: {
+            cv2.CAP_PROP_FRAME_WIDTH: 640,
+            cv2.CAP_PROP_FRAME_HEIGHT: 480,
+            cv2.CAP_PROP_FPS: 30
+        }.get(prop, 0)
+        frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(frameCount)]
+        mock_cap.read.side_effect = [(True, frame) for frame in frames] + [(False, None)]
+
+        def fake_detection(model, batch, confThresh, modelClass):
+            return [int(frame[0, 0, 0]) for frame in batch]
+
+        def fake_process(detection, frameTimestamp, frameData, frame):
+            frameData.append({'track_id': detection[0], 'timestamp': frameTimestamp, 'keypoints': {}})
+
+        with patch('poseEstimation.getDetection', side_effect=fake_detection), \
+             patch('poseEstimation.getFrameTimestamp', side_effect=timestamps), \
+             patch('poseEstimation.processDetection', side_effect=fake_process), \
+             patch('cv2.VideoWriter') as mock_VideoWriter, \
+             patch('os.makedirs'):
+            mock_out = MagicMock()
+            mock_VideoWriter.return_value = mock_out
+            frame_data = videoWriter(mock_cap, video_path, MagicMock(), 0.80, [0],
+                                     batchSize=batchSize, pipelined=pipelined, queueSize=2)
+            written = [int(call.args[0][0, 0, 0]) for call in mock_out.write.call_args_list]
+            mock_out.release.assert_called_once()
+        return frame_data, written
+
+    assert run(True) == run(False)
+    assert run(True)[1] == list(range(frameCount))
+
+# 16. Test if an inference error in the pipeline is raised instead of hanging the worker threads.
+def test_videoWriter_pipelined_raises_inference_error():
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    mock_cap = MagicMock()
+    mock_cap.get.return_value = 30
+    mock_cap.read.return_value = (True, np.zeros((4, 4, 3), dtype=np.uint8))
+
+    with patch('poseEstimation.getDetection', side_effect=RuntimeError("inference failed")), \
+         patch('poseEstimation.getFrameTimestamp', return_value='0.00s'), \
+         patch('cv2.VideoWriter'), \
+         patch('os.makedirs'):
+        with pytest.raises(RuntimeError, match="inference failed"):
+            videoWriter(mock_cap, video_path, MagicMock(), 0.80, [0], pipelined=True, queueSize=2)
+
+# 17. Test if stride mode only infers every Nth frame and fills the skipped frames with flagged interpolated keypoints.
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_videoWriter_stride_interpolates_skipped_frames(pipelined):
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    mock_cap = MagicMock()
+    mock_cap.get.side_effect = lambda prop: {cv2.CAP_PROP_FPS: 30}.get(prop, 0)
+    frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(5)]
+    mock_cap.read.side_effect = [(True, frame) for frame in frames] + [(False, None)]
+    timestamps = ['0.00s', '0.10s', '0.20s', '0.30s', '0.40s']
+
+    def fake_detection(model, batch, confThresh, modelClass):
+        return [int(frame[0, 0, 0]) for frame in batch]
+
+    # Player 1 walks 30 pixels right per inferred frame
+    def fake_process(detection, frameTimestamp, frameData, frame):
+        x = 100 + 15 * detection[0]
+        frameData.append({'track_id': 1, 'timestamp': frameTimestamp, 'keypoints': {'HIP': [x, 200]}})
+
+    with patch('poseEstimation.getDetection', side_effect=fake_detection) as mock_get_detection, \
+         patch('poseEstimation.getFrameTimestamp', side_effect=timestamps), \
+         patch('poseEstimation.processDetection', side_effect=fake_process), \
+         patch('cv2.VideoWriter') as mock_VideoWriter, \
+         patch('os.makedirs'):
+        mock_out = MagicMock()
+        mock_VideoWriter.return_value = mock_out
+        frame_data = videoWriter(mock_cap, video_path, MagicMock(), 0.80, [0], stride=2, pipelined=pipelined)
+
+    inferred_frames = [int(frame[0, 0, 0]) for call in mock_get_detection.call_args_list for frame in call.args[1]]
+    assert inferred_frames == [0, 2, 4]
+    assert [entry['timestamp'] for entry in frame_data] == timestamps
+    assert [entry['keypoints']['HIP'][0] for entry in frame_data] == [100, 115, 130, 145, 160]
+    assert [entry.get('interpolated', False) for entry in frame_data] == [False, True, False, True, False]
+    written = [int(call.args[0][0, 0, 0]) for call in mock_out.write.call_args_list]
+    assert written == [0, 1, 2, 3, 4]
+
+# 18. Test if interpolateRecords only interpolates tracks and keypoints present on both sides.
+def test_interpolateRecords_matches_tracks_and_keypoints():
+    previous = [
+        {'track_id': 1, 'timestamp': '1.00s', 'keypoints': {'HIP': [0, 0], 'HEAD': [10, 10]}},
+        {'track_id': 2, 'timestamp': '1.00s', 'keypoints': {'HIP': [50, 50]}}
+    ]
+    following = [{'track_id': 1, 'timestamp': '2.00s', 'keypoints': {'HIP': [100, 40]}}]
+
+    records = interpolateRecords(previous, following, 1.0, 2.0, '1.25s')
+
+    assert records == [{'track_id': 1, 'timestamp': '1.25s', 'keypoints': {'HIP': [25, 10]}, 'interpolated': True}]
+
+# 19. Test if adaptive sampling stretches the stride while players are still and drops it when they move fast.
+def test_FrameSampler_adaptive_stride():
+    def make_result(x):
+        result = MagicMock()
+        result.boxes.id.cpu.return_value.numpy.return_value = np.array([1])
+        result.boxes.xywhn.cpu.return_value.numpy.return_value = np.array([[x, 0.5, 0.1, 0.3]])
+        return result
+
+    sampler = FrameSampler(stride=1, adaptive=True, maxStride=4, motionThreshold=0.2)
+    assert sampler.shouldInfer()
+    sampler.update(make_result(0.5), '0.00s')
+    assert sampler.stride == 1  # No previous frame to compare against yet
+    sampler.update(make_result(0.5), '1.00s')
+    assert sampler.stride == 2
+    sampler.update(make_result(0.51), '2.00s')
+    assert sampler.stride == 4
+    sampler.update(make_result(0.51), '3.00s')
+    assert sampler.stride == 4  # Capped at maxStride
+    assert [sampler.shouldInfer() for _ in range(4)] == [False, False, False, True]
+    sampler.update(make_result(0.9), '4.00s')
+    assert sampler.stride == 1
+
+# 20. Test if getChunkRanges splits the frames evenly and falls back to fewer chunks for short videos.
+def test_getChunkRanges_splits_frames():
+    assert getChunkRanges(100, 4, 10) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    assert getChunkRanges(101, 2, 10) == [(0, 51), (51, 101)]
+    # Each chunk must be at least twice the overlap long
+    assert getChunkRanges(30, 4, 10) == [(0, 30)]
+    assert getChunkRanges(0, 4, 10) == [(0, None)]
+
+# 21. Test if matchOverlapTracks pairs each overlap track with the closest track from the previous chunk.
+def test_matchOverlapTracks_pairs_closest_tracks():
+    previous = [
+        {'track_id': 1, 'timestamp': '10.00s', 'keypoints': {'HIP': [100, 300], 'HEAD': [100, 100]}},
+        {'track_id': 2, 'timestamp': '10.00s', 'keypoints': {'HIP': [500, 300], 'HEAD': [500, 100]}},
+    ]
+    overlap = [
+        {'track_id': 1, 'timestamp': '10.00s', 'keypoints': {'HIP': [502, 301]}},
+        {'track_id': 2, 'timestamp': '10.00s', 'keypoints': {'HIP': [98, 300], 'HEAD': [101, 99]}},
+        {'track_id': 3, 'timestamp': '10.00s', 'keypoints': {'HIP': [900, 900]}},
+    ]
+    assert matchOverlapTracks(previous, overlap, maxDistance=50) == {1: 2, 2: 1}
+
+# 22. Test if mergeChunks keeps one id per player across chunks and gives unseen tracks fresh ids.
+def test_mergeChunks_reconciles_track_ids():
+    def record(track_id, timestamp, x):
+        return {'track_id': track_id, 'timestamp': timestamp, 'keypoints': {'HIP': [x, 200]}}
+
+    chunk1 = ([], [record(1, '0.00s', 100), record(2, '0.00s', 500), record(1, '1.00s', 110), record(2, '1.00s', 490)])
+    # ByteTrack restarted in chunk 2 so the same players come back with swapped ids plus a new one
+    chunk2 = ([record(1, '1.00s', 490), record(2, '1.00s', 110)],
+              [record(1, '2.00s', 480), record(2, '2.00s', 120), record(7, '2.00s', 300)])
+
+    merged = mergeChunks([chunk1, chunk2])
+
+    assert [(entry['timestamp'], entry['track_id']) for entry in merged] == [
+        ('0.00s', 1), ('0.00s', 2), ('1.00s', 1), ('1.00s', 2),
+        ('2.00s', 2), ('2.00s', 1), ('2.00s', 3)
+    ]
+
+# 23. Test if videoWriter hands finished records to the sink as it goes instead of keeping them.
+def test_videoWriter_streams_records_to_sink():
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    mock_cap = MagicMock()
+    mock_cap.get.side_effect = lambda prop: {cv2.CAP_PROP_FPS: 30}.get(prop, 0)
+    mock_cap.read.side_effect = [(True, np.zeros((4, 4, 3), dtype=np.uint8)) for _ in range(3)] + [(False, None)]
+
+    def fake_process(detection, frameTimestamp, frameData, frame):
+        frameData.append({'track_id': 1, 'timestamp': frameTimestamp, 'keypoints': {}})
+
+    streamed = []
+    sink = MagicMock()
+    sink.extend.side_effect = lambda records: streamed.extend(record['timestamp'] for record in records)
+    with patch('poseEstimation.getDetection', side_effect=lambda model, batch, c, m: [MagicMock() for _ in batch]), \
+         patch('poseEstimation.getFrameTimestamp', side_effect=['0.00s', '0.03s', '0.07s']), \
+         patch('poseEstimation.processDetection', side_effect=fake_process), \
+         patch('cv2.VideoWriter'), \
+         patch('os.makedirs'):
+        frame_data = videoWriter(mock_cap, video_path, MagicMock(), 0.80, [0], batchSize=2, sink=sink)
+
+    assert frame_data == []
+    assert streamed == ['0.00s', '0.03s', '0.07s']
+    assert sum(call.args[0] for call in sink.framesDone.call_args_list) == 3
+
+# 24. Test if a batch is run once it holds MAX_BATCH_FRAMES frames, however few of them are due for inference.
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_videoWriter_caps_buffered_frames(pipelined):
+    video_path = os.path.join(TEST_DATA_FOLDER, '66f93f9c728b890c58714882.mp4')
+    mock_cap = MagicMock()
+    mock_cap.get.side_effect = lambda prop: {cv2.CAP_PROP_FPS: 30}.get(prop, 0)
+    mock_cap.read.side_effect = [(True, np.full((4, 4, 3), i, dtype=np.uint8)) for i in range(20)] + [(False, None)]
+
+    def fake_process(detection, frameTimestamp, frameData, frame):
+        frameData.append({'track_id': 1, 'timestamp': frameTimestamp, 'keypoints': {'HIP': [0, 0]}})
+
+    with patch('poseEstimation.MAX_BATCH_FRAMES', 6), \
+         patch('poseEstimation.inferBatch', wraps=inferBatch) as mock_infer, \
+         patch('poseEstimation.getDetection', side_effect=lambda model, batch, c, m: [MagicMock() for _ in batch]), \
+         patch('poseEstimation.getFrameTimestamp', side_effect=[f'{i / 10:.2f}s' for i in range(20)]), \
+         patch('poseEstimation.processDetection', side_effect=fake_process), \
+         patch('cv2.VideoWriter'), \
+         patch('os.makedirs'):
+        frame_data = videoWriter(mock_cap, video_path, MagicMock(), 0.80, [0], batchSize=3, stride=4, pipelined=pipelined)
+
+    batchLengths = [len(call.args[1]) for call in mock_infer.call_args_list]
+    assert batchLengths == [6, 6, 6, 2]
+    # Frames 17 to 19 come after the last inferred frame, so they have nothing to interpolate towards
+    assert [entry['timestamp'] for entry in frame_data] == [f'{i / 10:.2f}s' for i in range(17)]
@@ -19,6 +19,9 @@ from velocity import (
     plotVelocityAndSave,
     getVideoPathFromDataPath,
     playVideo,
+    computeVelocities,
+    smoothVelocities,
+    WristColumns,
     main
 )
 
@@ -237,3 +240,70 @@ def test_main_wrist_keypoints_zero_and_nonzero():
         delta_t = extract_numeric_time('3s') - extract_numeric_time('1s')
         expected_velocity = calculateVelocity([2, 2], [1, 1], delta_t)
         assert wristDataList[1]['velocity'] == pytest.approx(expected_velocity)
+
+
+# Test 13: Test if computeVelocities never takes a difference across two players and matches calculateVelocity.
+def test_computeVelocities_grouped_by_track():
+    times = np.array([0.0, 0.0, 1.0, 1.0, 2.0])
+    track_ids = np.array([1, 2, 1, 2, 1])
+    points = np.array([[0, 0], [100, 100], [3, 4], [100, 110], [3, 4]], dtype=float)
+    velocities = computeVelocities(times, points, track_ids)
+    assert velocities[0] == 0
+    assert velocities[1] == 0
+    assert velocities[2] == pytest.approx(calculateVelocity([3, 4], [0, 0], 1.0))
+    assert velocities[3] == pytest.approx(10.0)
+    assert velocities[4] == pytest.approx(0.0)
+
+# Test 14: Test if computeVelocities marks duplicate timestamps as NaN instead of dividing by zero.
+def test_computeVelocities_duplicate_timestamps():
+    times = np.array([0.0, 1.0, 1.0, 2.0])
+    track_ids = np.array([1, 1, 1, 1])
+    points = np.array([[0, 0], [1, 0], [2, 0], [4, 0]], dtype=float)
+    velocities = computeVelocities(times, points, track_ids)
+    assert velocities[:2].tolist() == [0.0, 1.0]
+    assert np.isnan(velocities[2])
+    assert velocities[3] == pytest.approx(2.0)
+    assert computeVelocities(np.array([]), np.zeros((0, 2)), np.array([], dtype=int)).tolist() == []
+
+# Test 15: Test if smoothVelocities averages within each track and skips NaN samples.
+def test_smoothVelocities():
+    times = np.array([0.0, 1.0, 2.0, 0.0, 1.0])
+    track_ids = np.array([1, 1, 1, 2, 2])
+    velocities = np.array([0.0, 3.0, np.nan, 0.0, 10.0])
+    smoothed, acceleration = smoothVelocities(times, velocities, track_ids, window=3)
+    assert smoothed.tolist() == pytest.approx([1.5, 1.5, 3.0, 5.0, 5.0])
+    assert acceleration.tolist() == pytest.approx([0.0, 0.0, 1.5, 0.0, 0.0])
+
+# Test 16: Test if plotVelocityAndSave draws one line per track straight from WristColumns and indexing gives the old entries.
+def test_plotVelocityAndSave_columns():
+    times = np.array([0.0, 0.0, 1.0, 1.0, 2.0])
+    track_ids = np.array([2, 1, 2, 1, 2])
+    points = np.array([[0, 0], [5, 5], [3, 4], [5, 6], [6, 8]], dtype=float)
+    velocities = computeVelocities(times, points, track_ids)
+    wristData = WristColumns(times, [f"{t:.2f}s" for t in times], track_ids, points, velocities)
+    assert len(wristData) == 5
+    assert wristData[2] == {"track_id": 2, "timestamp": "1.00s", "wrist_point": [3.0, 4.0], "velocity": 5.0}
+    with patch('velocity.plt.plot') as mock_plot, \
+         patch('velocity.plt.savefig'), \
+         patch('velocity.getMatchIDFromVideo', return_value='test_match_id'), \
+         patch('os.makedirs'):
+        plotVelocityAndSave(wristData, "path/to/data.msgpack")
+    lines = {kwargs['label']: (args[0].tolist(), args[1].tolist()) for args, kwargs in mock_plot.call_args_list}
+    assert lines == {
+        "Player 1 velocity": ([0.0, 1.0], [0.0, 1.0]),
+        "Player 2 velocity": ([0.0, 1.0, 2.0], [0.0, 5.0, 5.0])
+    }
+
+# Test 17: Test if main accepts '-' for the smoothing window and either end of the time window.
+def test_main_dash_arguments():
+    wristArrays = (np.array([0.0, 1.0]), np.array([1, 1]), np.array([[0.0, 1.0], [1.0, 1.0]]), ["0.00s", "1.00s"])
+    for args, window in [(['-', '2.5', '-'], (2.5, None)), (['-', '-', '7'], (None, 7.0)), (['3', '-', '7'], (None, 7.0))]:
+        with patch('sys.argv', ['velocity.py', 'path/to/data.msgpack', 'left'] + args), \
+             patch('velocity.load_pose_window') as mock_window, \
+             patch('velocity.wristArraysFromColumns', return_value=wristArrays), \
+             patch('velocity.smoothVelocities', return_value=(None, None)) as mock_smooth, \
+             patch('velocity.plotVelocityAndSave') as mock_plot:
+            main()
+        mock_window.assert_called_once_with('path/to/data.msgpack', *window)
+        assert mock_smooth.called == (args[0] != '-')
+        mock_plot.assert_called_once()
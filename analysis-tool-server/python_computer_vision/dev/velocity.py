@@ -1,12 +1,11 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import json
 import re
 import sys
 import os
 import cv2
-import msgpack
 from poseEstimation import getMatchIDFromVideo 
+from poseStore import find_pose_store, load_pose_store, load_pose_window, iter_pose_records
 #from jointangles import getVideoPathFromDataPath
 
 def extract_numeric_time(timestamp):
@@ -22,11 +21,14 @@ def calculateVelocity(p1, p0, delta_t):
 
 
 def plotVelocityAndSave(wristDataList, dataPath):
-    times = [extract_numeric_time(entry["timestamp"]) for entry in wristDataList]
-    velocities = [entry["velocity"] for entry in wristDataList]
-
+    wristData = wristDataList if isinstance(wristDataList, WristColumns) else WristColumns.fromEntries(wristDataList)
     plt.figure(figsize=(10, 6))
-    plt.plot(times, velocities, label="Velocity")
+    # One line per player, velocities are only ever taken within a track
+    for trackId, rows in wristData.trackRows():
+        label = "Velocity" if trackId == 0 else f"Player {trackId} velocity"
+        plt.plot(wristData.times[rows], wristData.velocities[rows], label=label)
+        if wristData.smoothed is not None:
+            plt.plot(wristData.times[rows], wristData.smoothed[rows], label=label.replace("velocity", "smoothed"))
     plt.title("Velocity over Time")
     plt.xlabel("Time")
     plt.ylabel("Velocity")
@@ -78,36 +80,154 @@ def print_progress(current, total):
     print(percentage)
 
 
+# Wrist samples straight from the columnar store, only rows where the wrist was detected
+def wristArraysFromColumns(columns, keypointName):
+    k = columns.keypointIndex(keypointName)
+    rows = np.flatnonzero(columns.valid[:, k])
+    times = np.asarray(columns.times[rows], dtype=float)
+    timestamps = [f"{time:.2f}s" for time in times.tolist()]
+    return times, np.asarray(columns.track_ids[rows]), np.asarray(columns.keypoints[rows, k], dtype=float), timestamps
+
+# Same arrays from the legacy msgpack, records are decoded one at a time instead of unpacking the whole file
+def wristArraysFromRecords(records, keypointName):
+    times, track_ids, points, timestamps = [], [], [], []
+    for entry in records:
+        wrist_point = entry['keypoints'].get(keypointName)
+        if wrist_point is not None and wrist_point != [0, 0]:
+            times.append(float(entry['timestamp'].rstrip('s')))
+            track_ids.append(entry['track_id'])
+            points.append(wrist_point)
+            timestamps.append(entry['timestamp'])
+    return (np.array(times, dtype=float),
+            np.array(track_ids, dtype=int),
+            np.array(points, dtype=float).reshape(-1, 2),
+            timestamps)
+
+# Rows grouped by track, the stable sort keeps each track in recorded order
+def trackOrder(track_ids):
+    return np.argsort(track_ids, kind='stable')
+
+# Speed of every sample relative to the previous sample of the same track, in one pass.
+# The first sample of a track is 0 like the first entry always was, and a sample whose
+# timestamp does not move forward (duplicate frames) is NaN rather than a division by zero.
+# order is trackOrder(track_ids) when the caller already has it
+def computeVelocities(times, points, track_ids, order=None):
+    velocities = np.zeros(len(times))
+    if len(times) < 2:
+        return velocities
+    if order is None:
+        order = trackOrder(track_ids)
+    sortedTimes = times[order]
+    distances = np.linalg.norm(np.diff(points[order], axis=0), axis=1)
+    delta_t = np.diff(sortedTimes)
+    sameTrack = track_ids[order][1:] == track_ids[order][:-1]
+
+    sortedVelocities = np.zeros(len(times))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sortedVelocities[1:] = np.where(delta_t > 0, distances / delta_t, np.nan)
+    sortedVelocities[1:][~sameTrack] = 0
+    velocities[order] = sortedVelocities
+    return velocities
+
+# Centred moving average of the speed over window samples within each track, ignoring NaN gaps,
+# and the acceleration taken from the smoothed speed
+def smoothVelocities(times, velocities, track_ids, window=5, order=None):
+    smoothed = np.full(len(times), np.nan)
+    acceleration = np.zeros(len(times))
+    if order is None:
+        order = trackOrder(track_ids)
+    boundaries = np.flatnonzero(np.diff(track_ids[order])) + 1
+    for rows in np.split(order, boundaries):
+        values = velocities[rows]
+        known = ~np.isnan(values)
+        # Window sums from running totals, clipped at the ends of the track
+        positions = np.arange(len(rows))
+        lo = np.clip(positions - window // 2, 0, len(rows))
+        hi = np.clip(positions - window // 2 + window, 0, len(rows))
+        runningTotals = np.concatenate(([0], np.cumsum(np.where(known, values, 0))))
+        runningCounts = np.concatenate(([0], np.cumsum(known)))
+        totals = runningTotals[hi] - runningTotals[lo]
+        counts = runningCounts[hi] - runningCounts[lo]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            smoothed[rows] = totals / counts
+            if len(rows) > 1:
+                delta_t = np.diff(times[rows])
+                acceleration[rows[1:]] = np.where(delta_t > 0, np.diff(smoothed[rows]) / delta_t, np.nan)
+    return smoothed, acceleration
+
+# Wrist samples and their speeds as parallel arrays, track id 0 for samples without a track.
+# Indexing gives the entry dict the script used to build for every sample
+class WristColumns:
+    def __init__(self, times, timestamps, track_ids, points, velocities, smoothed=None, acceleration=None, order=None):
+        self.times = np.asarray(times, dtype=float)
+        self.timestamps = list(timestamps)
+        self.track_ids = np.asarray(track_ids, dtype=int)
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.velocities = np.asarray(velocities, dtype=float)
+        self.smoothed = None if smoothed is None else np.asarray(smoothed, dtype=float)
+        self.acceleration = None if acceleration is None else np.asarray(acceleration, dtype=float)
+        self.order = trackOrder(self.track_ids) if order is None else order
+
+    # From entry dicts as built by hand, entries without a track or wrist point get 0 and NaN
+    @classmethod
+    def fromEntries(cls, entries):
+        smoothed = [entry["smoothed_velocity"] for entry in entries] if entries and "smoothed_velocity" in entries[0] else None
+        return cls([extract_numeric_time(entry["timestamp"]) for entry in entries],
+                   [entry["timestamp"] for entry in entries],
+                   [entry.get("track_id") or 0 for entry in entries],
+                   [entry.get("wrist_point", [np.nan, np.nan]) for entry in entries],
+                   [entry["velocity"] for entry in entries],
+                   smoothed,
+                   None if smoothed is None else [entry["acceleration"] for entry in entries])
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        entry = {
+            "track_id": int(self.track_ids[i]),
+            "timestamp": self.timestamps[i],
+            "wrist_point": self.points[i].tolist(),
+            "velocity": float(self.velocities[i])
+        }
+        if self.smoothed is not None:
+            entry["smoothed_velocity"] = float(self.smoothed[i])
+            entry["acceleration"] = float(self.acceleration[i])
+        return entry
+
+    # (track id, rows) for every track, rows in recorded order
+    def trackRows(self):
+        boundaries = np.flatnonzero(np.diff(self.track_ids[self.order])) + 1
+        return [(int(self.track_ids[rows[0]]), rows) for rows in np.split(self.order, boundaries) if len(rows)]
+
 def main():
     dataPath = sys.argv[1]
     leftOrRight = sys.argv[2].upper() + "_WRIST"
+    # Optional smoothing window in samples, adds smoothed speed and acceleration. '-' leaves it out
+    # when a time window follows
+    smoothWindow = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != '-' else None
+    # Optional start and end time in seconds ('-' leaves that end open), only that part of the match
+    # is read through the pose index
+    start_time = float(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] != '-' else None
+    end_time = float(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] != '-' else None
     #videoPath = getVideoPathFromDataPath(dataPath)  
-    with open(dataPath, 'rb') as f:
-        data = msgpack.unpack(f, raw=False)
-
-    wristDataList = []
-    total_entries = len(data)  
-    processed_entries = 0   
-    for entry in data:
-        if leftOrRight in entry['keypoints']:
-            wrist_point = entry['keypoints'][leftOrRight]
-            if wrist_point != [0, 0]:
-                wristDataList.append({
-                    "track_id": entry['track_id'],
-                    "timestamp": entry['timestamp'],
-                    "wrist_point": wrist_point,
-                    "velocity": 0
-                })
-        processed_entries += 1
-        #print_progress(processed_entries, total_entries) 
-
-    for i in range(1, len(wristDataList)):
-        p1 = wristDataList[i]["wrist_point"]
-        p0 = wristDataList[i - 1]["wrist_point"]
-        delta_t = extract_numeric_time(wristDataList[i]["timestamp"]) - extract_numeric_time(wristDataList[i - 1]["timestamp"])
-        wristDataList[i]["velocity"] = calculateVelocity(p1, p0, delta_t)
-
-    plotVelocityAndSave(wristDataList,dataPath)
+    storePath = find_pose_store(dataPath)
+    if start_time is not None or end_time is not None:
+        times, track_ids, points, timestamps = wristArraysFromColumns(load_pose_window(dataPath, start_time, end_time), leftOrRight)
+    elif storePath:
+        times, track_ids, points, timestamps = wristArraysFromColumns(load_pose_store(storePath), leftOrRight)
+    else:
+        times, track_ids, points, timestamps = wristArraysFromRecords(iter_pose_records(dataPath), leftOrRight)
+
+    # One grouping by track serves the speeds, the smoothing and the plot
+    order = trackOrder(track_ids)
+    velocities = computeVelocities(times, points, track_ids, order)
+    smoothed, acceleration = None, None
+    if smoothWindow:
+        smoothed, acceleration = smoothVelocities(times, velocities, track_ids, smoothWindow, order)
+    wristData = WristColumns(times, timestamps, track_ids, points, velocities, smoothed, acceleration, order)
+
+    plotVelocityAndSave(wristData,dataPath)
 
 
 if __name__ == "__main__":
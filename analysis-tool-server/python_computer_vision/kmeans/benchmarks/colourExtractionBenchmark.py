@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+import json
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import cv2
+import numpy as np
+from PIL import Image
+from kmeansplayerselection import Clustering, readFrameWithTwoBBoxes
+
+# Compares the per video latency of picking the two shirt colours the old way (PIL crops and
+# scikit-learn KMeans on every pixel) against the sampled NumPy 2-means, the player detection is
+# shared by both and timed on its own
+# usage: python colourExtractionBenchmark.py [videoPath ...]
+DEFAULT_VIDEO = os.path.join(parent_dir, '..', '..', '__tests__', 'test_videos', 'test_video.mp4')
+REPEATS = 5
+
+# The crops exactly as cropPlayersOut made them before, the whole frame converted to PIL per player
+def legacyCropPlayersOut(results, firstFrame):
+    croppedImages = []
+    for result in results:
+        if len(result.boxes.xyxy) > 1:
+            for bbox in result.boxes.xyxy[:2].tolist():
+                x1, y1, x2, y2 = map(int, bbox)
+                pilImage = Image.fromarray(cv2.cvtColor(firstFrame, cv2.COLOR_BGR2RGB))
+                croppedImages.append(pilImage.crop((x1, y1, x2, y2)))
+    return croppedImages
+
+def timeColours(getPlayers, frame, result, fast):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        if fast:
+            croppedImages = getPlayers.cropPlayersOut([result], frame)
+        else:
+            croppedImages = legacyCropPlayersOut([result], frame)
+        colours = [getPlayers.kmeans(np.array(image), fast=fast).astype(int).tolist() for image in croppedImages[:2]]
+    return (time.perf_counter() - start) / REPEATS, colours
+
+def benchmarkVideo(getPlayers, videoPath):
+    start = time.perf_counter()
+    frame, result = readFrameWithTwoBBoxes(videoPath, getPlayers.model, [0], 0.6)
+    detectionSeconds = time.perf_counter() - start
+
+    legacySeconds, legacyColours = timeColours(getPlayers, frame, result, fast=False)
+    fastSeconds, fastColours = timeColours(getPlayers, frame, result, fast=True)
+    return {
+        'video': os.path.basename(videoPath),
+        'detectionSeconds': round(detectionSeconds, 3),
+        'legacyColourSeconds': round(legacySeconds, 4),
+        'fastColourSeconds': round(fastSeconds, 4),
+        'legacyTotalSeconds': round(detectionSeconds + legacySeconds, 3),
+        'fastTotalSeconds': round(detectionSeconds + fastSeconds, 3),
+        'colourSpeedup': round(legacySeconds / fastSeconds, 1),
+        'legacyColours': legacyColours,
+        'fastColours': fastColours
+    }
+
+def main():
+    videoPaths = sys.argv[1:] or [DEFAULT_VIDEO]
+    modelPath = os.path.join(parent_dir, 'models', 'yolov8n.pt')
+    getPlayers = Clustering(modelPath)
+    # The first run pays for loading scikit-learn and warming up the model
+    benchmarkVideo(getPlayers, videoPaths[0])
+    print(json.dumps([benchmarkVideo(getPlayers, videoPath) for videoPath in videoPaths], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import sys
 import os
 import cv2
-from ultralytics import YOLO
 import numpy as np
-from sklearn.cluster import KMeans
-from PIL import Image
 import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dev'))
+from modelRegistry import get_model
+
+# The shirt colour is taken from at most this many pixels of the top half of each player
+KMEANS_SAMPLE_PIXELS = 4096
+KMEANS_MAX_ITERATIONS = 20
+# Signature mode: frames sampled across the video, and how long picking the colours may take in total
+SIGNATURE_FRAMES = 8
+SIGNATURE_TIME_BUDGET = 5.0
+# Frames between the checks of the fallback search when none of the sampled frames had two players
+SIGNATURE_FALLBACK_STEP = 5
+# Bins per RGB channel of a player's colour histogram
+HISTOGRAM_BINS = 8
 
 ''' 
     **********************************************************************************************************************************************************************************
@@ -25,7 +37,7 @@ class PathDoesNotExistError(ApplicationError):
 
 class InvalidRequiredArgumentsError(ApplicationError):
     """Exception raised when two arguments have not been passed in."""
-    def __init__(self, arguments, message="Must have two passed in arguments."):
+    def __init__(self, arguments, message="Must have two passed in arguments, the mode 'signature' may follow."):
         self.arguments = arguments[1]  
         self.message = message
         super().__init__(f"{message}: Arguments Passed in {self.arguments}")
@@ -37,17 +49,26 @@ class FailedToCaptureFrame(ApplicationError):
         self.message = message
         super().__init__(f"{message}: {file}")
 
+class TimeBudgetExceededError(ApplicationError):
+    """Exception raised when no frame with two players was found before the time budget ran out."""
+    def __init__(self, file, message="No frame with two players found within the time budget."):
+        self.file = file
+        self.message = message
+        super().__init__(f"{message}: {file}")
+
 class Arguments:
-    def __init__(self, videoPath):
+    def __init__(self, videoPath, mode=None):
         self.videoPath = videoPath
+        self.mode = mode
 
     def printArguments(self):
         print(f"Video Path: {self.videoPath}")
+        print(f"Mode: {self.mode}")
 
 
     def checkArgumentLength(argv):
-        if len(argv) == 2:
-            args = Arguments(argv[1])
+        if len(argv) == 2 or (len(argv) == 3 and argv[2] == 'signature'):
+            args = Arguments(*argv[1:])
             #args.printArguments()
             return args
         else:
@@ -61,19 +82,68 @@ class Arguments:
     *************************************************************************** Detecting Two players ******************************************************************************************
     ********************************************************************************************************************************************************************************** 
 '''
-def readFrameWithTwoBBoxes(videoPath, model, classes, confThresh):
+# step > 1 only checks every step-th frame, the frames in between are skipped without being converted.
+# Raises TimeBudgetExceededError once the deadline (perf_counter) has passed
+def readFrameWithTwoBBoxes(videoPath, model, classes, confThresh, step=1, deadline=None):
     cap = cv2.VideoCapture(videoPath)
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.release()
-            raise FailedToCaptureFrame(videoPath)
-        
-        results = model.predict(frame, classes=classes, conf=confThresh, show=False,verbose=False)
-        for result in results:
-            if len(result.boxes.xyxy) >= 2:
-                cap.release()
-                return frame, result
+    try:
+        while True:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeBudgetExceededError(videoPath)
+            ret, frame = cap.read()
+            if not ret:
+                raise FailedToCaptureFrame(videoPath)
+
+            results = model.predict(frame, classes=classes, conf=confThresh, show=False,verbose=False)
+            for result in results:
+                if len(result.boxes.xyxy) >= 2:
+                    return frame, result
+            for _ in range(step - 1):
+                cap.grab()
+    finally:
+        cap.release()
+
+# Up to count frames spread evenly over the video. Stops early once the deadline (perf_counter) has
+# passed and at least one frame was read
+def sampleFrames(videoPath, count, deadline=None):
+    cap = cv2.VideoCapture(videoPath)
+    try:
+        frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frames = []
+        # Centres of count equal slices, so the first and last frames (often no play) are avoided
+        indexes = np.unique(((np.arange(count) + 0.5) * frameCount / count).astype(int)) if frameCount > 0 else []
+        # Decodes forward once with grab() and only converts the sampled frames with retrieve(), a seek
+        # per sample would decode from the keyframe before it again every time
+        position = 0
+        for frameNumber in indexes:
+            while position <= frameNumber:
+                if deadline is not None and frames and time.perf_counter() > deadline:
+                    return frames
+                if not cap.grab():
+                    return frames
+                position += 1
+            ret, frame = cap.retrieve()
+            if ret:
+                frames.append(frame)
+        return frames
+    finally:
+        cap.release()
+
+def boxesOverlap(bbox1, bbox2):
+    return bbox1[0] < bbox2[2] and bbox2[0] < bbox1[2] and bbox1[1] < bbox2[3] and bbox2[1] < bbox1[3]
+
+# One batched prediction over all the frames, keeps (frame, result) where two players were found
+# apart from each other, an overlapping pair would mix both shirts into each crop
+def framesWithTwoPlayers(frames, model, classes, confThresh):
+    if not frames:
+        return []
+    results = model.predict(frames, classes=classes, conf=confThresh, show=False, verbose=False)
+    found = []
+    for frame, result in zip(frames, results):
+        boxes = result.boxes.xyxy.tolist()
+        if len(boxes) >= 2 and not boxesOverlap(boxes[0], boxes[1]):
+            found.append((frame, result))
+    return found
  
 
 ''' 
@@ -84,10 +154,8 @@ def readFrameWithTwoBBoxes(videoPath, model, classes, confThresh):
 
 class Clustering:
     def __init__(self, modelPath):
-        if not os.path.exists(modelPath):
-            import subprocess
-            subprocess.run(['python', '-m', 'ultralytics', 'download', '--model', 'yolov8n.pt'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        self.model = YOLO(modelPath)
+        # Downloaded on first use and then kept loaded for every later request in the process
+        self.model = get_model(modelPath)
   
 
   # not used
@@ -99,23 +167,15 @@ class Clustering:
     
     def cropPlayersOut(self, results, firstFrame):
         croppedImages = []
+        # Converted once, the crops are views into this frame
+        rgbFrame = cv2.cvtColor(firstFrame, cv2.COLOR_BGR2RGB)
+        height, width = rgbFrame.shape[:2]
         for result in results:
             if len(result.boxes.xyxy) > 1:
-                bbox1 = result.boxes.xyxy[0].tolist()
-                if len(bbox1) == 4:
-                    x1, y1, x2, y2 = map(int, bbox1)
-                    pilImage = Image.fromarray(cv2.cvtColor(firstFrame, cv2.COLOR_BGR2RGB))
-                    croppedImage1 = pilImage.crop((x1, y1, x2, y2))
-                    #croppedImage1.save("bbox1_image.png") # wont need
-                    croppedImages.append(croppedImage1)
-
-                bbox2 = result.boxes.xyxy[1].tolist()
-                if len(bbox2) == 4:
-                    x1, y1, x2, y2 = map(int, bbox2)
-                    pilImage = Image.fromarray(cv2.cvtColor(firstFrame, cv2.COLOR_BGR2RGB))
-                    croppedImage2 = pilImage.crop((x1, y1, x2, y2))
-                    #croppedImage2.save("bbox2_image.png")
-                    croppedImages.append(croppedImage2)
+                for bbox in result.boxes.xyxy[:2].tolist():
+                    if len(bbox) == 4:
+                        x1, y1, x2, y2 = map(int, bbox)
+                        croppedImages.append(rgbFrame[max(y1, 0):min(y2, height), max(x1, 0):min(x2, width)])
         return croppedImages
 
     # maybe area to improve struggles with colours jeresy like black ect
@@ -131,7 +191,12 @@ class Clustering:
         enhancedImage = cv2.cvtColor(hsvImage, cv2.COLOR_HSV2RGB)
         return enhancedImage
 
-    def kmeans(self, image):
+    def kmeans(self, image, fast=True):
+        if fast:
+            return self.shirtColour(image)[0]
+
+        # scikit-learn on every pixel, what the colours used to be picked with
+        from sklearn.cluster import KMeans
         topHalfImage = image[0:int(image.shape[0]/2), :]
         enhancedImage = self.enhanceImageColours(topHalfImage)
         
@@ -139,29 +204,131 @@ class Clustering:
         #plt.imshow(enhancedImage)
         
         image2d = enhancedImage.reshape(-1, 3)
-        
+        corners = np.array([enhancedImage[0, 0], enhancedImage[0, -1], enhancedImage[-1, 0], enhancedImage[-1, -1]])
+
         kmeans = KMeans(n_clusters=2, random_state=0)
         kmeans.fit(image2d)
-        labels = kmeans.labels_
-
-        clusteredImage = labels.reshape(topHalfImage.shape[0], topHalfImage.shape[1])
-        #plt.imshow(clusteredImage)
-        
-        cornerCluster = [clusteredImage[0, 0], clusteredImage[0, -1], clusteredImage[-1, 0], clusteredImage[-1, -1]]
-        nonPlayerCluster = max(set(cornerCluster), key=cornerCluster.count)
-
-        playerCluster = 1 - nonPlayerCluster
+        centres = kmeans.cluster_centers_
+        cornerCluster = kmeans.predict(corners).tolist()
 
-        kmeans.cluster_centers_[playerCluster]
-        
+        playerCluster = shirtCluster(cornerCluster)
 
-        rgbColour = kmeans.cluster_centers_[playerCluster]
+        rgbColour = centres[playerCluster]
         #normalizedRgbColour = rgbColour / 255.0
         
         # flt, ax = plt.subplots(figsize=(2, 2)) 
         # ax.add_patch(plt.Rectangle((0, 0), 1, 1, color=normalizedRgbColour))
         # plt.show()  
         return rgbColour  
+
+    # Shirt colour of a player crop and the sampled pixels that went into it
+    def shirtColour(self, image):
+        if image.size == 0:
+            raise ValueError("Empty player crop")
+        # At least one row, a crop one pixel high has no top half otherwise
+        topHalfImage = image[0:max(int(image.shape[0]/2), 1), :]
+        enhancedImage = self.enhanceImageColours(topHalfImage)
+        pixels = samplePixels(enhancedImage.reshape(-1, 3))
+        corners = np.array([enhancedImage[0, 0], enhancedImage[0, -1], enhancedImage[-1, 0], enhancedImage[-1, -1]])
+
+        centres = twoMeans(pixels)
+        playerCluster = shirtCluster(nearestCentre(corners, centres).tolist())
+        playerPixels = pixels[nearestCentre(pixels, centres) == playerCluster]
+        # A single colour crop gives two equal centres and every pixel goes to the first one
+        return centres[playerCluster], playerPixels if len(playerPixels) else pixels
+
+    # Colour signatures of both players from frames across the whole video, within timeBudget seconds.
+    # Returns [(rgbColour, histogram), (rgbColour, histogram)] for player one and two, player one
+    # being the first box of the first usable frame
+    def colourSignatures(self, videoPath, classes, confThresh, frameCount=SIGNATURE_FRAMES, timeBudget=SIGNATURE_TIME_BUDGET):
+        deadline = time.perf_counter() + timeBudget
+        frames = sampleFrames(videoPath, frameCount, deadline)
+        found = framesWithTwoPlayers(frames, self.model, classes, confThresh)
+        if not found:
+            # Nothing usable in the sampled frames, fall back to the first frame with two players
+            # found before the deadline
+            found = [readFrameWithTwoBBoxes(videoPath, self.model, classes, confThresh,
+                                            step=SIGNATURE_FALLBACK_STEP, deadline=deadline)]
+
+        colours = []
+        pixels = []
+        for frame, result in found:
+            if colours and time.perf_counter() > deadline:
+                break
+            shirts = [self.shirtColour(crop) for crop in self.cropPlayersOut([result], frame)[:2]]
+            colours.append([colour for colour, _ in shirts])
+            pixels.append([playerPixels for _, playerPixels in shirts])
+
+        keep, swapped, centres = pairColours(np.array(colours))
+        signatures = []
+        for player in range(2):
+            histogram = np.zeros(HISTOGRAM_BINS ** 3)
+            for framePixels, swap in zip([pixels[i] for i in keep], swapped[keep]):
+                histogram += colourHistogram(framePixels[player ^ int(swap)])
+            signatures.append((centres[player], histogram / max(histogram.sum(), 1)))
+        return signatures
+
+
+# The corners of a crop are background, the cluster most of them are not in is the shirt
+def shirtCluster(cornerCluster):
+    nonPlayerCluster = max(set(cornerCluster), key=cornerCluster.count)
+    return 1 - nonPlayerCluster
+
+# colours is (frames, 2, 3), the two shirt colours found in each frame in box order. Works out which
+# box is which player in every frame, then drops frames that fit neither player (a mis-detection or
+# someone else on court). Returns the kept frames, whether each frame's boxes are swapped and the
+# median colour of each player
+def pairColours(colours, maxIterations=KMEANS_MAX_ITERATIONS):
+    centres = colours[0]
+    swapped = np.zeros(len(colours), dtype=bool)
+    keep = np.arange(len(colours))
+    for _ in range(maxIterations):
+        straight = np.linalg.norm(colours - centres, axis=2).sum(axis=1)
+        crossed = np.linalg.norm(colours[:, ::-1] - centres, axis=2).sum(axis=1)
+        newSwapped = crossed < straight
+        cost = np.minimum(straight, crossed)
+        # Median based so one bad frame cannot drag a player's colour
+        keep = np.flatnonzero(cost <= 3 * max(np.median(cost), 1))
+        ordered = np.where(newSwapped[:, None, None], colours[:, ::-1], colours)
+        centres = np.median(ordered[keep], axis=0)
+        if np.array_equal(newSwapped, swapped):
+            break
+        swapped = newSwapped
+    return keep, swapped, centres
+
+# Normalised HISTOGRAM_BINS^3 RGB histogram of (N, 3) uint8 pixels, flattened red major
+def colourHistogram(pixels):
+    binned = (pixels.astype(int) * HISTOGRAM_BINS) // 256
+    bins = (binned[:, 0] * HISTOGRAM_BINS + binned[:, 1]) * HISTOGRAM_BINS + binned[:, 2]
+    histogram = np.bincount(bins, minlength=HISTOGRAM_BINS ** 3).astype(float)
+    return histogram / max(histogram.sum(), 1)
+
+# Evenly spaced pixels, so big crops cost the same as small ones
+def samplePixels(pixels, maxPixels=KMEANS_SAMPLE_PIXELS):
+    step = max(1, -(-len(pixels) // maxPixels))
+    return pixels[::step]
+
+def nearestCentre(pixels, centres):
+    distances = ((pixels[:, None, :].astype(np.float32) - centres[None, :, :]) ** 2).sum(axis=2)
+    return np.argmin(distances, axis=1)
+
+# 2-means on (N, 3) uint8 pixels. Starts from the pixel furthest from the mean and the pixel
+# furthest from that one, so the same crop always gives the same colours
+def twoMeans(pixels, maxIterations=KMEANS_MAX_ITERATIONS):
+    pixels = pixels.astype(np.float32)
+    first = pixels[np.argmax(((pixels - pixels.mean(axis=0)) ** 2).sum(axis=1))]
+    second = pixels[np.argmax(((pixels - first) ** 2).sum(axis=1))]
+    centres = np.stack([first, second])
+    for _ in range(maxIterations):
+        labels = nearestCentre(pixels, centres)
+        counts = np.bincount(labels, minlength=2)
+        sums = np.stack([pixels[labels == k].sum(axis=0) for k in range(2)])
+        # A cluster that lost all its pixels keeps its centre
+        newCentres = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centres)
+        if np.allclose(newCentres, centres):
+            break
+        centres = newCentres
+    return centres
     
 
 def main():
@@ -178,6 +345,18 @@ def main():
     confThresh = 0.6 
     getPlayers = Clustering(modelPath)
 
+    if args.mode == 'signature':
+        (playerOneRGB, playerOneHistogram), (playerTwoRGB, playerTwoHistogram) = getPlayers.colourSignatures(args.videoPath, classes, confThresh)
+        players = {
+            "PlayerOne": playerOneRGB.astype(int).tolist(),
+            "PlayerTwo": playerTwoRGB.astype(int).tolist(),
+            "HistogramBins": HISTOGRAM_BINS,
+            "PlayerOneHistogram": np.round(playerOneHistogram, 5).tolist(),
+            "PlayerTwoHistogram": np.round(playerTwoHistogram, 5).tolist()
+        }
+        print(json.dumps(players, indent=2))
+        return
+
     firstFrame, firstFramePlayerDetected = readFrameWithTwoBBoxes(args.videoPath, getPlayers.model, classes, confThresh)
 
     croppedImages = getPlayers.cropPlayersOut([firstFramePlayerDetected], firstFrame)
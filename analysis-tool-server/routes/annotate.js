@@ -5,7 +5,8 @@ const { matchIdSchema } = require('../validators/match.schemas');
 const {
   annotationIdSchema,
   createAnnotationSchema,
-  updateAnnotationSchema
+  updateAnnotationSchema,
+  createAnnotationBatchSchema
 } = require('../validators/annotation.schemas');
 const annotationController = require('../controllers/annotate.controller');
 
@@ -18,6 +19,23 @@ router.post('/:match_id/new',
   annotationController.create
 );
 
+// route for creating many annotations in a match, players are located in one pass over the video
+router.post('/:match_id/batch',
+  handle(
+    validate.params(matchIdSchema),
+    validate.body(createAnnotationBatchSchema)
+  ),
+  annotationController.createBatch
+);
+
+// route for recalculating the player positions of every annotation in a match
+router.post('/:match_id/relocate',
+  handle(
+    validate.params(matchIdSchema)
+  ),
+  annotationController.relocateAll
+);
+
 // route for fetching annotations of an existing match
 router.get('/:match_id/all',
   handle(
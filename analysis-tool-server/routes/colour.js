@@ -1,6 +1,6 @@
 const express = require('express');
 const router = express.Router();
-const { spawn } = require('child_process');
+const pythonWorker = require('../lib/pythonWorker');
 const path = require('path');
 const fs = require('fs');
 const fsExtra = require('fs-extra');
@@ -19,19 +19,13 @@ const findVideoFileMatchID = async (match_id) => {
 router.get('/players/:videofilename', async (req, res) => {
   const match_id = req.params.videofilename;
   const videoFilePath = await findVideoFileMatchID(match_id);
+  // ?mode=signature samples frames across the whole video and also returns a colour histogram per player
+  const signature = req.query.mode === 'signature';
+  const args = signature ? [videoFilePath, 'signature'] : [videoFilePath];
 
-  const pythonScriptPath = path.join(__dirname, '../../analysis-tool-server/python_computer_vision/kmeans/kmeansplayerselection.py');
-
-  const pythonProcess = spawn('python', [pythonScriptPath, videoFilePath]);
-  let scriptOutput = '';
-
-
-  pythonProcess.stdout.on('data', (data) => {
-    scriptOutput += data.toString();
-  });
-
-  pythonProcess.on('close', async (code) => {
-    console.log(`child process exited with code ${code}`);
+  pythonWorker.run('kmeansplayerselection', args).then(({ code, stdout }) => {
+    const scriptOutput = stdout;
+    console.log(`kmeans job finished with code ${code}`);
     if (code === 0) {
       try {
         const startIndex = scriptOutput.indexOf('"PlayerOne"');
@@ -39,11 +33,15 @@ router.get('/players/:videofilename', async (req, res) => {
           const jsonString = `{${scriptOutput.substring(startIndex)}`;
           const jsonOutput = JSON.parse(jsonString);
 
-          const { PlayerOne, PlayerTwo } = jsonOutput;
+          const { PlayerOne, PlayerTwo, HistogramBins, PlayerOneHistogram, PlayerTwoHistogram } = jsonOutput;
 
          // await fsExtra.emptyDir(path.join(`${__dirname}../../tempstorage`));
 
-          res.status(200).json({ message: 'Process completed', PlayerOne, PlayerTwo });
+          if (signature) {
+            res.status(200).json({ message: 'Process completed', PlayerOne, PlayerTwo, HistogramBins, PlayerOneHistogram, PlayerTwoHistogram });
+          } else {
+            res.status(200).json({ message: 'Process completed', PlayerOne, PlayerTwo });
+          }
         } else {
           res.status(500).json({ message: 'Error: JSON output not found' });
         }
@@ -53,9 +51,7 @@ router.get('/players/:videofilename', async (req, res) => {
     } else {
       res.status(500).json({ message: 'Process failed', code: code });
     }
-  });
-
-  pythonProcess.on('error', (err) => {
+  }).catch((err) => {
     console.error(`Failed to start process: ${err}`);
     res.status(500).json({ message: 'Failed to start process', error: err });
   });
@@ -10,6 +10,7 @@ const mongoose = require('mongoose');
 
 
 const indexRouter = require('./routes/index');
+const pythonWorker = require('./lib/pythonWorker');
 
 const app = express();
 
@@ -70,4 +71,15 @@ app.use(function (err, req, res, next) {
   res.render('error');
 });
 
+// stop the python workers with the server, nodemon restarts it with SIGUSR2
+process.on('exit', pythonWorker.shutdown);
+['SIGINT', 'SIGTERM'].forEach((signal) => process.once(signal, () => {
+  pythonWorker.shutdown();
+  process.exit(0);
+}));
+process.once('SIGUSR2', () => {
+  pythonWorker.shutdown();
+  process.kill(process.pid, 'SIGUSR2');
+});
+
 module.exports = app;
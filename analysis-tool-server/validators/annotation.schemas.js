@@ -11,10 +11,14 @@ const annotationSchema = Joi.object({
 const annotationIdSchema = Joi.object({ annotation_id: joi.objectId().required() }).options({ stripUnknown: true });
 const createAnnotationSchema = annotationSchema.options({ presence: 'required' });
 const updateAnnotationSchema = annotationSchema.options({ presence: 'optional' }).empty('', null).default(undefined);
+const createAnnotationBatchSchema = Joi.object({
+  annotations: Joi.array().items(createAnnotationSchema).min(1).required()
+}).options({ stripUnknown: true, abortEarly: false });
 
 module.exports = {
   annotationSchema,
   createAnnotationSchema,
   updateAnnotationSchema,
+  createAnnotationBatchSchema,
   annotationIdSchema
 };